@@ -0,0 +1,279 @@
+### EC2 fleet launcher
+### Launches many instances with few API calls: every run_instances call asks for a whole batch (MinCount=1,
+### MaxCount=batch size) and the batches of the different subnets are sent concurrently. Capacity a subnet could
+### not provide is asked from the other subnets once more. Readiness is tracked by one poll loop that describes all
+### pending instances in a few calls, instead of one waiter (and its own describe calls) per instance.
+### Instances get their IAM role through an instance profile: pass a role made by create_ec2_role and the profile
+### is created (or reused) with ensure_instance_profile. The clients come from ../AWS_IAM/aws_iam_client.py, so
+### EC2 calls share its credentials, rate limiting and metrics. aws_ec2_fake.FakeEC2Client runs it all offline.
+### Usage: python aws_ec2.py ami-0b016c703b95ecbe4 t3.micro 20 subnet-aaa subnet-bbb [--role MyEC2Role]
+###        [--key-name cli-key] [--security-group sg-xxxx] [--tag Name=cli-ec2] [--no-wait]
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'AWS_IAM'))
+
+from aws_iam_client import get_client, get_iam_client
+from aws_iam_create_role import ensure_instance_profile
+from aws_iam_paginate import iter_pages
+
+# Largest MaxCount asked in one run_instances call
+DEFAULT_BATCH_SIZE = 100
+
+# Instance ids per describe_instances call while polling (values of one instance-id filter)
+DESCRIBE_CHUNK = 200
+
+# A new instance profile takes a few seconds to be visible to EC2; launches are retried this long
+PROFILE_PROPAGATION_TIMEOUT = 60
+PROFILE_RETRY_DELAY = 2
+
+# Errors meaning "this subnet cannot take more instances right now" (the batch is moved to another subnet)
+CAPACITY_CODES = frozenset(['InsufficientInstanceCapacity', 'InsufficientFreeAddressesInSubnet',
+                            'InsufficientCapacity', 'Unsupported'])
+
+# Instance states that will never become 'running' on their own
+FAILED_STATES = frozenset(['shutting-down', 'terminated', 'stopping', 'stopped'])
+
+
+def get_ec2_client(region=None):
+    """Return the shared EC2 client built from the .env credentials"""
+    return get_client('ec2', region=region)
+
+
+def plan_batches(count, subnets, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Spread `count` instances evenly over the subnets, in batches of at most `batch_size`
+
+    Returns:
+        list: (subnet_id, instances) tuples, one per run_instances call
+    """
+    if not subnets:
+        raise ValueError("At least one subnet is required")
+    batches = []
+    share, extra = divmod(count, len(subnets))
+    for index, subnet in enumerate(subnets):
+        remaining = share + (1 if index < extra else 0)
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            batches.append((subnet, size))
+            remaining -= size
+    return batches
+
+
+def _instance_profile_spec(instance_profile=None, role_name=None, iam=None):
+    """IamInstanceProfile parameter of run_instances, creating the profile of `role_name` if needed"""
+    if role_name:
+        instance_profile = ensure_instance_profile(role_name, instance_profile, iam=iam or get_iam_client())['arn']
+    if not instance_profile:
+        return None
+    return {'Arn': instance_profile} if instance_profile.startswith('arn:') else {'Name': instance_profile}
+
+
+def _is_profile_not_ready(error):
+    message = error.response['Error'].get('Message', '')
+    return error.response['Error']['Code'] == 'InvalidParameterValue' and 'iamInstanceProfile' in message
+
+
+def _run_batch(ec2, params, subnet, count, client_token):
+    """Launch up to `count` instances in one subnet with one run_instances call"""
+    result = {'subnet': subnet, 'requested': count, 'instances': [], 'error': None, 'capacity': False}
+    deadline = time.monotonic() + PROFILE_PROPAGATION_TIMEOUT
+    while True:
+        try:
+            response = ec2.run_instances(MinCount=1, MaxCount=count, SubnetId=subnet, ClientToken=client_token,
+                                         **params)
+            result['instances'] = [instance['InstanceId'] for instance in response['Instances']]
+            return result
+        except ClientError as e:
+            if _is_profile_not_ready(e) and time.monotonic() < deadline:
+                time.sleep(PROFILE_RETRY_DELAY)
+                continue
+            result['error'] = f"{e.response['Error']['Code']}: {e.response['Error'].get('Message', '')}"
+            result['capacity'] = e.response['Error']['Code'] in CAPACITY_CODES
+            return result
+
+
+def wait_for_running(instance_ids, ec2=None, timeout=600, poll_interval=5):
+    """
+    Wait until instances are running, with one poll loop for all of them
+
+    Every round describes only the instances still pending, DESCRIBE_CHUNK ids per call, through an
+    instance-id filter (so instances too new to be known to describe_instances yet just stay pending).
+
+    Args:
+        instance_ids (list): Instances to wait for
+        ec2: Optional EC2 client (defaults to the shared client from the .env credentials)
+        timeout (float): Give up after this many seconds
+        poll_interval (float): Seconds between two rounds
+
+    Returns:
+        dict: {'running': [ids], 'failed': {id: state or reason}, 'pending': [ids still pending at the timeout]}
+    """
+    if ec2 is None:
+        ec2 = get_ec2_client()
+
+    pending = list(dict.fromkeys(instance_ids))
+    running, failed = [], {}
+    deadline = time.monotonic() + timeout
+    while pending:
+        states = {}
+        for start in range(0, len(pending), DESCRIBE_CHUNK):
+            filters = [{'Name': 'instance-id', 'Values': pending[start:start + DESCRIBE_CHUNK]}]
+            for page in iter_pages(ec2.describe_instances, prefetch=False, token_key='NextToken', Filters=filters):
+                for reservation in page.get('Reservations', []):
+                    for instance in reservation.get('Instances', []):
+                        states[instance['InstanceId']] = instance
+
+        still_pending = []
+        for instance_id in pending:
+            instance = states.get(instance_id)
+            state = instance['State']['Name'] if instance else 'pending'
+            if state == 'running':
+                running.append(instance_id)
+            elif state in FAILED_STATES:
+                failed[instance_id] = instance.get('StateReason', {}).get('Message') or state
+            else:
+                still_pending.append(instance_id)
+        pending = still_pending
+
+        if not pending or time.monotonic() + poll_interval > deadline:
+            break
+        time.sleep(poll_interval)
+
+    return {'running': running, 'failed': failed, 'pending': pending}
+
+
+def launch_fleet(image_id, instance_type, count, subnets, role_name=None, instance_profile=None, key_name=None,
+                 security_group_ids=None, tags=None, batch_size=DEFAULT_BATCH_SIZE, max_workers=10, wait=True,
+                 timeout=600, poll_interval=5, ec2=None, iam=None):
+    """
+    Launch `count` instances spread over several subnets
+
+    Args:
+        image_id (str): AMI id
+        instance_type (str): e.g. 't3.micro'
+        count (int): Instances wanted in total
+        subnets (list): Subnet ids to spread the instances over
+        role_name (str): Optional role made by create_ec2_role; its instance profile is created if missing
+        instance_profile (str): Optional instance profile name or ARN (the profile name to use with role_name)
+        key_name (str): Optional key pair for SSH
+        security_group_ids (list): Optional security groups
+        tags (dict): Optional instance tags, e.g. {'Name': 'cli-ec2'}
+        batch_size (int): Largest MaxCount of one run_instances call
+        max_workers (int): run_instances calls in flight at the same time
+        wait (bool): Wait until the instances are running
+        timeout (float): Seconds to wait for them
+        poll_interval (float): Seconds between two readiness polls
+        ec2: Optional EC2 client (defaults to the shared client from the .env credentials)
+        iam: Optional IAM client used for the instance profile
+
+    Returns:
+        dict: {'fleet_id', 'instances', 'batches', 'shortfall', 'running', 'failed', 'pending'}
+
+    Raises:
+        ValueError: If no subnet is given or the .env credentials are missing
+    """
+    if ec2 is None:
+        ec2 = get_ec2_client()
+
+    params = {'ImageId': image_id, 'InstanceType': instance_type}
+    profile = _instance_profile_spec(instance_profile, role_name, iam)
+    if profile:
+        params['IamInstanceProfile'] = profile
+    if key_name:
+        params['KeyName'] = key_name
+    if security_group_ids:
+        params['SecurityGroupIds'] = list(security_group_ids)
+
+    # The fleet id tags every instance and makes the ClientToken of each batch, so a retried call never
+    # launches the same batch twice
+    fleet_id = uuid.uuid4().hex[:12]
+    instance_tags = dict(tags or {}, **{'aws-ec2-fleet': fleet_id})
+    params['TagSpecifications'] = [{'ResourceType': 'instance',
+                                    'Tags': [{'Key': k, 'Value': v} for k, v in instance_tags.items()]}]
+
+    batches = plan_batches(count, subnets, batch_size)
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        def run(batches_to_run, offset):
+            return list(executor.map(lambda item: _run_batch(ec2, params, item[1][0], item[1][1],
+                                                             f"{fleet_id}-{offset + item[0]}"),
+                                     enumerate(batches_to_run)))
+
+        results.extend(run(batches, 0))
+
+        # Ask the subnets that had room for what the others could not take, once (other errors, e.g. a bad
+        # AMI, would only fail again)
+        launched = sum(len(r['instances']) for r in results)
+        full = {r['subnet'] for r in results if r['error'] or len(r['instances']) < r['requested']}
+        spare = [subnet for subnet in subnets if subnet not in full]
+        only_capacity = all(r['capacity'] for r in results if r['error'])
+        if launched < count and spare and only_capacity:
+            results.extend(run(plan_batches(count - launched, spare, batch_size), len(results)))
+
+    instances = [instance_id for r in results for instance_id in r['instances']]
+    report = {'fleet_id': fleet_id, 'instances': instances, 'batches': results,
+              'shortfall': count - len(instances), 'running': [], 'failed': {}, 'pending': instances}
+    print(f"🚀 Fleet {fleet_id}: launched {len(instances)}/{count} instances in {len(results)} run_instances calls")
+    for r in results:
+        if r['error']:
+            print(f"   ❌ {r['subnet']}: {r['error']}")
+
+    if wait and instances:
+        report.update(wait_for_running(instances, ec2, timeout, poll_interval))
+        print(f"✅ {len(report['running'])} running, {len(report['failed'])} failed, "
+              f"{len(report['pending'])} still pending")
+    return report
+
+
+def terminate_fleet(instance_ids, ec2=None, chunk_size=1000):
+    """Terminate instances with as few terminate_instances calls as possible"""
+    if ec2 is None:
+        ec2 = get_ec2_client()
+    terminated = []
+    for start in range(0, len(instance_ids), chunk_size):
+        response = ec2.terminate_instances(InstanceIds=instance_ids[start:start + chunk_size])
+        terminated.extend(change['InstanceId'] for change in response['TerminatingInstances'])
+    return terminated
+
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Launch a fleet of EC2 instances over several subnets")
+    parser.add_argument('image_id')
+    parser.add_argument('instance_type')
+    parser.add_argument('count', type=int)
+    parser.add_argument('subnets', nargs='+')
+    parser.add_argument('--role', help="EC2 role (see create_ec2_role); its instance profile is created if missing")
+    parser.add_argument('--instance-profile', help="Instance profile name or ARN")
+    parser.add_argument('--key-name', help="Key pair for SSH")
+    parser.add_argument('--security-group', action='append', default=[], help="Security group id (repeatable)")
+    parser.add_argument('--tag', action='append', default=[], help="Key=Value instance tag (repeatable)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Largest MaxCount per call")
+    parser.add_argument('--region', help="Region (default: AWS_DEFAULT_REGION from .env)")
+    parser.add_argument('--no-wait', action='store_true', help="Do not wait for the instances to be running")
+    args = parser.parse_args()
+
+    try:
+        fleet = launch_fleet(args.image_id, args.instance_type, args.count, args.subnets, role_name=args.role,
+                             instance_profile=args.instance_profile, key_name=args.key_name,
+                             security_group_ids=args.security_group,
+                             tags=dict(tag.split('=', 1) for tag in args.tag),
+                             batch_size=args.batch_size, wait=not args.no_wait, ec2=get_ec2_client(args.region))
+    except ValueError as e:
+        print(f"❌ Configuration error: {e}")
+        exit(1)
+    except ClientError as e:
+        print(f"❌ Error launching the fleet: {e}")
+        exit(1)
+
+    for instance_id in fleet['instances']:
+        print(f"   - {instance_id}")
+    exit(0 if not fleet['shortfall'] and not fleet['failed'] else 1)
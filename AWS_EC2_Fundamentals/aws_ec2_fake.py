@@ -0,0 +1,188 @@
+### In-process EC2 stand-in
+### A small fake of the boto3 EC2 client, enough to run aws_ec2.py offline: run_instances (with MinCount/MaxCount,
+### ClientToken and a per-subnet capacity), paginated describe_instances and terminate_instances. Instances start
+### 'pending' and become 'running' `boot_time` seconds after launch. If given the FakeIAMClient, launching with an
+### instance profile fails the way EC2 does until the profile exists, carries a role and `profile_delay` has passed.
+
+import collections
+import datetime
+import itertools
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+FAKE_ACCOUNT_ID = '123456789012'
+
+
+def _client_error(code, message, operation_name):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation_name)
+
+
+class FakeEC2Client:
+    """
+    Thread-safe in-memory replacement for boto3.client('ec2')
+
+    Args:
+        latency (float): Seconds every call sleeps, to simulate the network round trip
+        boot_time (float): Seconds an instance stays 'pending'
+        subnet_capacity (int | dict): Instances a subnet can hold (one number for all, or per subnet id)
+        iam: Optional FakeIAMClient whose instance profiles are checked by run_instances
+        profile_delay (float): Seconds after its creation before an instance profile is usable by EC2
+    """
+
+    def __init__(self, latency=0.0, boot_time=0.0, subnet_capacity=None, iam=None, profile_delay=0.0):
+        self.latency = latency
+        self.boot_time = boot_time
+        self.subnet_capacity = subnet_capacity
+        self.iam = iam
+        self.profile_delay = profile_delay
+        self.calls = collections.Counter()
+        self.instances = {}
+        self._launched_at = {}
+        self._client_tokens = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _round_trip(self, operation_name):
+        with self._lock:
+            self.calls[operation_name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _capacity(self, subnet_id):
+        if isinstance(self.subnet_capacity, dict):
+            return self.subnet_capacity.get(subnet_id, 0)
+        return self.subnet_capacity
+
+    def _state(self, instance_id):
+        instance = self.instances[instance_id]
+        booted = time.monotonic() - self._launched_at[instance_id] >= self.boot_time
+        if instance['State']['Name'] == 'pending' and booted:
+            instance['State'] = {'Code': 16, 'Name': 'running'}
+        return instance['State']['Name']
+
+    def _check_instance_profile(self, spec):
+        if self.iam is None:
+            return {'Arn': spec.get('Arn') or f"arn:aws:iam::{FAKE_ACCOUNT_ID}:instance-profile/{spec['Name']}"}
+        name = spec.get('Name') or spec['Arn'].rsplit('/', 1)[-1]
+        field = 'name' if 'Name' in spec else 'arn'
+        profile = self.iam.instance_profiles.get(name)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if (profile is None or not profile['Roles']
+                or (now - profile['CreateDate']).total_seconds() < self.profile_delay):
+            raise _client_error('InvalidParameterValue',
+                                f"Value ({spec.get('Name') or spec.get('Arn')}) for parameter "
+                                f"iamInstanceProfile.{field} is invalid. Invalid IAM Instance Profile {field}",
+                                'RunInstances')
+        return {'Arn': profile['Arn'], 'Id': profile['InstanceProfileId']}
+
+    def run_instances(self, ImageId, InstanceType, MinCount, MaxCount, SubnetId='subnet-default',
+                      IamInstanceProfile=None, TagSpecifications=None, ClientToken=None, KeyName=None,
+                      SecurityGroupIds=None, **kwargs):
+        self._round_trip('RunInstances')
+        if MinCount < 1 or MaxCount < MinCount:
+            raise _client_error('InvalidParameterValue', "MinCount must be at least 1 and at most MaxCount",
+                                'RunInstances')
+        profile = self._check_instance_profile(IamInstanceProfile) if IamInstanceProfile else None
+        tags = [tag for spec in TagSpecifications or [] if spec.get('ResourceType') == 'instance'
+                for tag in spec.get('Tags', [])]
+
+        with self._lock:
+            # A retried call with the same ClientToken returns the original reservation
+            if ClientToken and ClientToken in self._client_tokens:
+                return self._client_tokens[ClientToken]
+
+            count = MaxCount
+            capacity = self._capacity(SubnetId)
+            if capacity is not None:
+                used = sum(1 for i in self.instances.values()
+                           if i['SubnetId'] == SubnetId and i['State']['Name'] in ('pending', 'running'))
+                count = min(MaxCount, capacity - used)
+                # Like EC2: launch as many as possible between MinCount and MaxCount, or nothing
+                if count < MinCount:
+                    raise _client_error('InsufficientInstanceCapacity',
+                                        f"We currently do not have sufficient {InstanceType} capacity in "
+                                        f"{SubnetId}.", 'RunInstances')
+
+            launched = []
+            for index in range(count):
+                number = next(self._ids)
+                instance = {
+                    'InstanceId': f"i-{number:017x}",
+                    'ImageId': ImageId,
+                    'InstanceType': InstanceType,
+                    'AmiLaunchIndex': index,
+                    'State': {'Code': 0, 'Name': 'pending'},
+                    'SubnetId': SubnetId,
+                    'PrivateIpAddress': f"10.0.{number // 250 % 250}.{number % 250 + 4}",
+                    'LaunchTime': datetime.datetime.now(datetime.timezone.utc),
+                    'Tags': [dict(tag) for tag in tags]
+                }
+                if KeyName:
+                    instance['KeyName'] = KeyName
+                if SecurityGroupIds:
+                    instance['SecurityGroups'] = [{'GroupId': group_id} for group_id in SecurityGroupIds]
+                if profile:
+                    instance['IamInstanceProfile'] = dict(profile)
+                self.instances[instance['InstanceId']] = instance
+                self._launched_at[instance['InstanceId']] = time.monotonic()
+                launched.append(dict(instance))
+
+            response = {'ReservationId': f"r-{number:017x}", 'OwnerId': FAKE_ACCOUNT_ID, 'Groups': [],
+                        'Instances': launched}
+            if ClientToken:
+                self._client_tokens[ClientToken] = response
+        return response
+
+    def describe_instances(self, InstanceIds=None, Filters=None, MaxResults=None, NextToken=None, **kwargs):
+        self._round_trip('DescribeInstances')
+        with self._lock:
+            if InstanceIds:
+                missing = [i for i in InstanceIds if i not in self.instances]
+                if missing:
+                    raise _client_error('InvalidInstanceID.NotFound',
+                                        f"The instance IDs '{', '.join(missing)}' do not exist", 'DescribeInstances')
+                matching = list(InstanceIds)
+            else:
+                matching = sorted(self.instances)
+
+            for f in Filters or []:
+                values = set(f['Values'])
+                if f['Name'] == 'instance-id':
+                    matching = [i for i in matching if i in values]
+                elif f['Name'] == 'instance-state-name':
+                    matching = [i for i in matching if self._state(i) in values]
+                elif f['Name'] == 'subnet-id':
+                    matching = [i for i in matching if self.instances[i]['SubnetId'] in values]
+                elif f['Name'].startswith('tag:'):
+                    key = f['Name'][4:]
+                    matching = [i for i in matching
+                                if any(t['Key'] == key and t['Value'] in values for t in self.instances[i]['Tags'])]
+
+            start = int(NextToken) if NextToken else 0
+            end = start + MaxResults if MaxResults else len(matching)
+            for instance_id in matching[start:end]:
+                self._state(instance_id)
+            # One reservation per instance keeps the fake simple; callers have to walk every reservation anyway
+            page = {'Reservations': [{'ReservationId': f"r-{instance_id[2:]}", 'OwnerId': FAKE_ACCOUNT_ID,
+                                      'Instances': [dict(self.instances[instance_id])]}
+                                     for instance_id in matching[start:end]]}
+        if end < len(matching):
+            page['NextToken'] = str(end)
+        return page
+
+    def terminate_instances(self, InstanceIds):
+        self._round_trip('TerminateInstances')
+        with self._lock:
+            missing = [i for i in InstanceIds if i not in self.instances]
+            if missing:
+                raise _client_error('InvalidInstanceID.NotFound',
+                                    f"The instance IDs '{', '.join(missing)}' do not exist", 'TerminateInstances')
+            changes = []
+            for instance_id in InstanceIds:
+                previous = self.instances[instance_id]['State']
+                self.instances[instance_id]['State'] = {'Code': 48, 'Name': 'terminated'}
+                changes.append({'InstanceId': instance_id, 'PreviousState': dict(previous),
+                                'CurrentState': {'Code': 48, 'Name': 'terminated'}})
+        return {'TerminatingInstances': changes}
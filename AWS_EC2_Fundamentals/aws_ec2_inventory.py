@@ -0,0 +1,444 @@
+### Columnar EC2 inventory
+### Flattens describe_instances pages, one instance at a time while they stream in, into flat typed arrays instead
+### of keeping tens of thousands of nested dicts around. Text fields (type, state, AZ, subnet, tags, ...) are
+### dictionary encoded: each distinct string is stored once and rows hold a 4-byte code. Every column also keeps
+### the rows of each value grouped together, so a condition is evaluated once per distinct value and the matching
+### rows of several conditions are combined with set intersections, never by walking the instances one by one.
+### Snapshots are one binary file of raw arrays; load() memory-maps it, so even a big fleet reloads instantly.
+### Usage: python aws_ec2_inventory.py snapshot.ec2inv                          (take a snapshot of the account)
+###        python aws_ec2_inventory.py snapshot.ec2inv --state running --type 'm5.*' --subnet subnet-aaa --days 30
+
+import argparse
+import datetime
+import fnmatch
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'AWS_IAM'))
+
+from aws_iam_client import get_client
+from aws_iam_paginate import iter_pages
+
+SNAPSHOT_MAGIC = b'EC2INV\x00\x01'
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Dictionary-encoded columns and how to read them from a describe_instances instance
+STRING_COLUMNS = {
+    'instance_id': lambda i: i['InstanceId'],
+    'instance_type': lambda i: i.get('InstanceType'),
+    'state': lambda i: i.get('State', {}).get('Name'),
+    'availability_zone': lambda i: i.get('Placement', {}).get('AvailabilityZone'),
+    'subnet_id': lambda i: i.get('SubnetId'),
+    'vpc_id': lambda i: i.get('VpcId'),
+    'image_id': lambda i: i.get('ImageId'),
+    'key_name': lambda i: i.get('KeyName'),
+    'instance_profile': lambda i: i.get('IamInstanceProfile', {}).get('Arn'),
+    'private_ip': lambda i: i.get('PrivateIpAddress'),
+}
+
+# Tag columns are named 'tag:<Key>', like the describe_instances filters
+TAG_PREFIX = 'tag:'
+
+# Launch time of instances without one: sorts last and never matches an age condition
+UNKNOWN_TIME = float('inf')
+
+
+def _epoch(value):
+    if value is None:
+        return UNKNOWN_TIME
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+
+class _ColumnBuilder:
+    """Collects one dictionary-encoded column while instances are ingested"""
+
+    def __init__(self, rows=0):
+        self.values = [None]
+        self.index = {None: 0}
+        # Rows ingested before the column appeared (e.g. a tag key first seen later) have no value
+        self.codes = array('I', [0]) * rows
+
+    def add(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def build(self):
+        # Rows grouped by code (a stable sort, so each group stays in row order) and where each group starts
+        codes = self.codes
+        rows = array('I', sorted(range(len(codes)), key=codes.__getitem__))
+        counts = Counter(codes)
+        offsets = array('I', [0])
+        for code in range(len(self.values)):
+            offsets.append(offsets[-1] + counts.get(code, 0))
+        return _Column(self.values, codes, rows, offsets)
+
+
+class _Column:
+    """
+    A dictionary-encoded column
+
+    Attributes:
+        values (list): Distinct values, code 0 is None (missing)
+        codes: Code of every row (array or memoryview of unsigned ints)
+        rows: Row numbers grouped by code
+        offsets: rows[offsets[c]:offsets[c + 1]] are the rows with code c
+    """
+
+    def __init__(self, values, codes, rows, offsets):
+        self.values = values
+        self.codes = codes
+        self.rows = rows
+        self.offsets = offsets
+        self._index = {value: code for code, value in enumerate(values)}
+
+    def matching_codes(self, condition):
+        """
+        Codes of the values accepted by a condition
+
+        Args:
+            condition: A value, a list/tuple/set of values, a glob pattern string with * or ?, a callable
+                value -> bool (called once per distinct value), or None for rows without a value
+        """
+        if callable(condition):
+            return [code for code, value in enumerate(self.values) if value is not None and condition(value)]
+        if isinstance(condition, (list, tuple, set, frozenset)):
+            return sorted({self._index[v] for v in condition if v in self._index})
+        if isinstance(condition, str) and any(c in condition for c in '*?['):
+            return [code for code, value in enumerate(self.values)
+                    if value is not None and fnmatch.fnmatchcase(value, condition)]
+        code = self._index.get(condition)
+        return [] if code is None else [code]
+
+    def count(self, codes):
+        return sum(self.offsets[code + 1] - self.offsets[code] for code in codes)
+
+    def rows_of(self, codes):
+        matched = set()
+        for code in codes:
+            matched.update(self.rows[self.offsets[code]:self.offsets[code + 1]])
+        return matched
+
+
+class EC2Inventory:
+    """
+    Columnar, read-only snapshot of the instances of an account
+
+    Build one with take_inventory() or build_inventory(pages), query it with select()/query()/count(),
+    and save()/load() it to skip describe_instances next time.
+
+    Attributes:
+        columns (dict): Column name -> dictionary-encoded column (STRING_COLUMNS and one per tag key)
+        launch_times: Launch time of every row in Unix seconds (UNKNOWN_TIME when unknown)
+        taken_at (float): Unix time the instances were described
+    """
+
+    def __init__(self, columns, launch_times, time_order=None, taken_at=None):
+        self.columns = columns
+        self.launch_times = launch_times
+        # Rows sorted by launch time, so age conditions are two binary searches
+        self.time_order = time_order if time_order is not None else array(
+            'I', sorted(range(len(launch_times)), key=launch_times.__getitem__))
+        self.taken_at = taken_at or time.time()
+        self._mmap = None
+        self._views = []
+
+    def __len__(self):
+        return len(self.launch_times)
+
+    def tag_keys(self):
+        return sorted(name[len(TAG_PREFIX):] for name in self.columns if name.startswith(TAG_PREFIX))
+
+    # Queries
+
+    def _launched_rows(self, after, before):
+        times, order = self.launch_times, self.time_order
+
+        def first_at_or_after(value):
+            low, high = 0, len(order)
+            while low < high:
+                middle = (low + high) // 2
+                if times[order[middle]] < value:
+                    low = middle + 1
+                else:
+                    high = middle
+            return low
+
+        start = first_at_or_after(_epoch(after)) if after is not None else 0
+        end = first_at_or_after(min(_epoch(before), UNKNOWN_TIME) if before is not None else UNKNOWN_TIME)
+        return set(order[start:end])
+
+    def select(self, tags=None, launched_after=None, launched_before=None, **conditions):
+        """
+        Return the row numbers matching every condition, in ascending order
+
+        Args:
+            tags (dict): Tag key -> condition, e.g. {'Team': 'web'}
+            launched_after: datetime, ISO string or Unix time
+            launched_before: datetime, ISO string or Unix time (e.g. time.time() - 30 * 86400 for "older than 30 days")
+            **conditions: Column name -> condition (see _Column.matching_codes), e.g. state='running',
+                instance_type='m5.*', subnet_id=['subnet-a', 'subnet-b']
+
+        Raises:
+            ValueError: If a column does not exist
+        """
+        wanted = list(conditions.items()) + [(TAG_PREFIX + key, value) for key, value in (tags or {}).items()]
+        matches = []
+        for name, condition in wanted:
+            column = self.columns.get(name)
+            if column is None:
+                if name.startswith(TAG_PREFIX):
+                    # No instance has this tag key at all
+                    return []
+                raise ValueError(f"Unknown column '{name}' (columns: {', '.join(sorted(self.columns))})")
+            codes = column.matching_codes(condition)
+            matches.append((column.count(codes), column, codes))
+
+        # Start from the most selective condition so the intersections stay small
+        matches.sort(key=lambda match: match[0])
+        rows = None
+        for _, column, codes in matches:
+            candidate = column.rows_of(codes)
+            rows = candidate if rows is None else rows & candidate
+            if not rows:
+                return []
+        if launched_after is not None or launched_before is not None:
+            launched = self._launched_rows(launched_after, launched_before)
+            rows = launched if rows is None else rows & launched
+        if rows is None:
+            return list(range(len(self)))
+        return sorted(rows)
+
+    def count(self, **conditions):
+        """Number of instances matching select(**conditions)"""
+        return len(self.select(**conditions))
+
+    def row(self, row):
+        """One instance as a flat dict"""
+        item = {}
+        for name, column in self.columns.items():
+            value = column.values[column.codes[row]]
+            if name.startswith(TAG_PREFIX):
+                if value is not None:
+                    item.setdefault('tags', {})[name[len(TAG_PREFIX):]] = value
+            else:
+                item[name] = value
+        launch_time = self.launch_times[row]
+        item['launch_time'] = launch_time if launch_time != UNKNOWN_TIME else None
+        return item
+
+    def query(self, **conditions):
+        """Instances matching select(**conditions), as flat dicts"""
+        return [self.row(row) for row in self.select(**conditions)]
+
+    def group_count(self, column_name, rows=None):
+        """
+        Instances per value of a column, e.g. group_count('instance_type')
+
+        Args:
+            column_name (str): Column to group by ('tag:<Key>' for a tag)
+            rows (list): Only count these rows (e.g. from select()); all rows by default
+        """
+        column = self.columns[column_name]
+        if rows is None:
+            return {column.values[code]: column.offsets[code + 1] - column.offsets[code]
+                    for code in range(len(column.values)) if column.offsets[code + 1] > column.offsets[code]}
+        counts = Counter(column.codes[row] for row in rows)
+        return {column.values[code]: count for code, count in counts.items()}
+
+    # Saving and loading
+
+    def save(self, file_path):
+        """
+        Write the inventory as one binary file: a JSON header (distinct values and array offsets) then the raw arrays
+        """
+        sections, header_columns = [], {}
+
+        def add(values):
+            data = values.tobytes() if isinstance(values, array) else bytes(values)
+            offset = sum(len(s) for s in sections)
+            sections.append(data + b'\x00' * (-len(data) % 8))
+            return [offset, len(data)]
+
+        for name, column in self.columns.items():
+            header_columns[name] = {'values': column.values, 'codes': add(column.codes), 'rows': add(column.rows),
+                                    'offsets': add(column.offsets)}
+        header = {
+            'version': SNAPSHOT_FORMAT_VERSION,
+            'byteorder': sys.byteorder,
+            'itemsize': array('I').itemsize,
+            'taken_at': self.taken_at,
+            'rows': len(self),
+            'columns': header_columns,
+            'launch_times': add(self.launch_times),
+            'time_order': add(self.time_order),
+        }
+        header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        header_bytes += b' ' * (-(len(header_bytes) + 16) % 8)
+
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(len(header_bytes).to_bytes(8, 'little'))
+            f.write(header_bytes)
+            for section in sections:
+                f.write(section)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Memory-map an inventory written by save()
+
+        The arrays are not read or copied: the operating system pages in only what queries touch.
+        Call close() (or use `with`) to unmap the file.
+        """
+        with open(file_path, 'rb') as f:
+            if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise ValueError(f"{file_path} is not an EC2 inventory snapshot")
+            header_length = int.from_bytes(f.read(8), 'little')
+            header = json.loads(f.read(header_length))
+            if header.get('version') != SNAPSHOT_FORMAT_VERSION:
+                raise ValueError(f"Unsupported snapshot version: {header.get('version')}")
+            if header['byteorder'] != sys.byteorder or header['itemsize'] != array('I').itemsize:
+                raise ValueError(f"{file_path} was written on a platform with another byte order or int size")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        data = memoryview(mapped)[len(SNAPSHOT_MAGIC) + 8 + header_length:]
+        views = [data]
+
+        def view(section, typecode):
+            offset, length = section
+            views.append(data[offset:offset + length].cast(typecode))
+            return views[-1]
+
+        columns = {name: _Column(spec['values'], view(spec['codes'], 'I'), view(spec['rows'], 'I'),
+                                 view(spec['offsets'], 'I'))
+                   for name, spec in header['columns'].items()}
+        inventory = cls(columns, view(header['launch_times'], 'd'), view(header['time_order'], 'I'),
+                        header['taken_at'])
+        inventory._mmap = mapped
+        inventory._views = views
+        return inventory
+
+    def close(self):
+        """Unmap a loaded snapshot (the inventory cannot be queried afterwards)"""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def iter_instances(pages):
+    """Yield every instance of describe_instances pages (reservations flattened)"""
+    for page in pages:
+        for reservation in page.get('Reservations', []):
+            yield from reservation.get('Instances', [])
+
+
+def build_inventory(instances, taken_at=None):
+    """
+    Build an EC2Inventory from instance dicts (e.g. iter_instances(pages)), one at a time
+
+    Nothing but the columns is kept, so the pages can be streamed straight from describe_instances.
+    """
+    builders = {name: _ColumnBuilder() for name in STRING_COLUMNS}
+    launch_times = array('d')
+    rows = 0
+    for instance in instances:
+        for name, read in STRING_COLUMNS.items():
+            builders[name].add(read(instance))
+        tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
+        for key, value in tags.items():
+            name = TAG_PREFIX + key
+            if name not in builders:
+                builders[name] = _ColumnBuilder(rows)
+            builders[name].add(value)
+        rows += 1
+        # Tag columns this instance has no value for
+        for name, builder in builders.items():
+            if len(builder.codes) < rows:
+                builder.codes.append(0)
+        launch_times.append(_epoch(instance.get('LaunchTime')))
+
+    return EC2Inventory({name: builder.build() for name, builder in builders.items()}, launch_times,
+                        taken_at=taken_at)
+
+
+def take_inventory(ec2=None, filters=None, page_size=1000):
+    """
+    Describe every instance of the account (or those matching `filters`) into an EC2Inventory
+
+    Args:
+        ec2: Optional EC2 client (defaults to the shared client from the .env credentials)
+        filters (list): Optional describe_instances filters
+        page_size (int): Instances per call (EC2 allows up to 1000)
+    """
+    if ec2 is None:
+        ec2 = get_client('ec2')
+    params = {'MaxResults': page_size}
+    if filters:
+        params['Filters'] = filters
+    taken_at = time.time()
+    return build_inventory(iter_instances(iter_pages(ec2.describe_instances, token_key='NextToken', **params)),
+                           taken_at=taken_at)
+
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot and query the EC2 instances of an account")
+    parser.add_argument('snapshot', help="Snapshot file (taken when it does not exist or with --refresh)")
+    parser.add_argument('--refresh', action='store_true', help="Describe the instances again")
+    parser.add_argument('--state', help="e.g. running")
+    parser.add_argument('--type', help="Instance type or pattern, e.g. 'm5.*'")
+    parser.add_argument('--subnet', help="Subnet id")
+    parser.add_argument('--az', help="Availability zone")
+    parser.add_argument('--tag', action='append', default=[], help="Key=Value tag condition (repeatable)")
+    parser.add_argument('--days', type=float, help="Only instances launched more than this many days ago")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.refresh or not os.path.exists(args.snapshot):
+        print("📸 Describing the EC2 instances...")
+        try:
+            take_inventory().save(args.snapshot)
+        except ValueError as e:
+            print(f"❌ Configuration error: {e}")
+            exit(1)
+
+    with EC2Inventory.load(args.snapshot) as inventory:
+        conditions = {'state': args.state, 'instance_type': args.type, 'subnet_id': args.subnet,
+                      'availability_zone': args.az}
+        conditions = {name: value for name, value in conditions.items() if value is not None}
+        matched = inventory.select(tags=dict(tag.split('=', 1) for tag in args.tag),
+                                   launched_before=time.time() - args.days * 86400 if args.days else None,
+                                   **conditions)
+        print(f"📊 {len(matched)} of {len(inventory)} instances match "
+              f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+        for row in matched[:50]:
+            item = inventory.row(row)
+            print(f"   - {item['instance_id']} {item['instance_type']} {item['state']} {item['subnet_id']}")
+        if len(matched) > 50:
+            print(f"   ... and {len(matched) - 50} more")
@@ -0,0 +1,248 @@
+### Cross-account fan-out
+### Runs the same IAM work in many AWS accounts at once. The .env credentials assume a deployment role in every
+### target account (OrganizationAccountAccessRole by default). The assumed-role credentials are pooled and
+### refreshed in the background before they expire, and every account gets its own rate limiter because IAM
+### limits are per account. The per-account results are collected into one report.
+### Usage: python aws_iam_accounts.py AuditRole 999999999999 111111111111 222222222222 [--policy ARN] [--workers 10]
+
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from aws_iam_client import get_client_with_credentials, get_credentials, get_sts_client, release_clients
+from aws_iam_create_role import attach_policies_concurrently
+from aws_iam_credentials import TemporaryCredentials, key_id
+from aws_iam_templates import account_trust_policy
+from aws_iam_throttle import AdaptiveRateLimiter, set_rate_limiter
+
+DEFAULT_DEPLOYMENT_ROLE = 'OrganizationAccountAccessRole'
+
+# Status values of the per-account report
+ACCOUNT_OK = 'ok'
+ACCOUNT_FAILED = 'failed'
+
+
+class AssumedRoleSessionPool:
+    """
+    Assumed-role credentials and clients per target account, reused until they expire
+
+    Args:
+        deployment_role (str): Role name assumed in every target account
+        session_name (str): RoleSessionName shown in the target accounts' CloudTrail
+        duration (int): Seconds the assumed-role credentials are valid
+        external_id (str): Optional ExternalId required by the deployment role's trust policy
+        per_account_tps (float): If set, IAM calls per second allowed in each account (starting and maximum rate);
+            otherwise each account gets a default AdaptiveRateLimiter
+        use_disk (bool): Also share the credentials with other runs through the aws_iam_credentials disk cache
+        sts: Optional STS client of the source account (defaults to the shared client from the .env credentials)
+    """
+
+    def __init__(self, deployment_role=DEFAULT_DEPLOYMENT_ROLE, session_name='aws-iam-fanout', duration=3600,
+                 external_id=None, per_account_tps=None, use_disk=False, sts=None):
+        self.deployment_role = deployment_role
+        self.session_name = session_name
+        self.duration = duration
+        self.external_id = external_id
+        self.per_account_tps = per_account_tps
+        self.use_disk = use_disk
+        self._sts = sts
+        self._credentials = {}
+        self._lock = threading.Lock()
+
+    def role_arn(self, account_id):
+        return f"arn:aws:iam::{account_id}:role/{self.deployment_role}"
+
+    def credentials(self, account_id):
+        """Return the (cached) TemporaryCredentials of an account; STS is only called on first use"""
+        with self._lock:
+            credentials = self._credentials.get(account_id)
+            if credentials is not None:
+                return credentials
+
+            if self._sts is None:
+                self._sts = get_sts_client()
+            sts = self._sts
+            params = {'RoleArn': self.role_arn(account_id), 'RoleSessionName': self.session_name,
+                      'DurationSeconds': self.duration}
+            if self.external_id:
+                params['ExternalId'] = self.external_id
+
+            cache_key = None
+            if self.use_disk:
+                cache_key = f"assumed-{key_id(get_credentials()[0] or '')}-{account_id}-{self.deployment_role}"
+            credentials = TemporaryCredentials(lambda: sts.assume_role(**params)['Credentials'], cache_key=cache_key)
+            self._credentials[account_id] = credentials
+            if self.per_account_tps:
+                set_rate_limiter(f"iam:{account_id}", AdaptiveRateLimiter(
+                    rate=self.per_account_tps, burst=self.per_account_tps, max_rate=self.per_account_tps))
+            return credentials
+
+    def client(self, account_id, service_name='iam'):
+        """Return a client of `service_name` in the target account, with that account's own rate limiter"""
+        credentials = self.credentials(account_id)
+        # Fetch the credentials now, so a failing assume_role is reported for this account
+        credentials.get()
+        return get_client_with_credentials(service_name, credentials, rate_limit_key=f"{service_name}:{account_id}")
+
+    def close(self):
+        """Stop the background refreshes and drop the clients built on the pooled credentials"""
+        with self._lock:
+            for credentials in self._credentials.values():
+                credentials.close()
+                release_clients(credentials)
+            self._credentials.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def fan_out(accounts, work, get_client=None, max_workers=10):
+    """
+    Run `work(iam, account_id)` in every account concurrently
+
+    Args:
+        accounts (list): Target account ids
+        work (callable): Called with the account's IAM client and id; its return value goes into the report
+        get_client (callable): account_id -> IAM client (e.g. AssumedRoleSessionPool().client)
+        max_workers (int): Accounts worked on at the same time
+
+    Returns:
+        list: One {'account', 'status', 'result', 'error', 'seconds'} per account, in the order given
+    """
+    if get_client is None:
+        with AssumedRoleSessionPool() as pool:
+            return fan_out(accounts, work, pool.client, max_workers)
+
+    def run(account_id):
+        start = time.perf_counter()
+        report = {'account': account_id, 'status': ACCOUNT_OK, 'result': None, 'error': None}
+        try:
+            report['result'] = work(get_client(account_id), account_id)
+        except ClientError as e:
+            report['status'] = ACCOUNT_FAILED
+            report['error'] = f"{e.response['Error']['Code']}: {e.response['Error'].get('Message', '')}"
+        except Exception as e:
+            report['status'] = ACCOUNT_FAILED
+            report['error'] = str(e)
+        report['seconds'] = time.perf_counter() - start
+        return report
+
+    if not accounts:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(accounts)))) as executor:
+        return list(executor.map(run, accounts))
+
+
+def _canonical(document):
+    """Trust policies compare equal regardless of key order, or whether IAM returned them URL-encoded or decoded"""
+    if isinstance(document, str):
+        document = json.loads(urllib.parse.unquote(document))
+    return json.dumps(document, sort_keys=True, separators=(',', ':'))
+
+
+def deploy_role(iam, role_name, trust_policy, description=None, policy_arns=None, update_trust=True):
+    """
+    Create a role (or bring the trust policy of an existing one up to date) and attach managed policies
+
+    Returns:
+        dict: {'role', 'status': created|updated|unchanged, 'arn', 'policies': [...attach results]}
+    """
+    params = {'RoleName': role_name, 'AssumeRolePolicyDocument': json.dumps(trust_policy)}
+    if description:
+        params['Description'] = description
+
+    try:
+        response = iam.create_role(**params)
+        status, arn = 'created', response['Role']['Arn']
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'EntityAlreadyExists':
+            raise
+        role = iam.get_role(RoleName=role_name)['Role']
+        arn, status = role['Arn'], 'unchanged'
+        if update_trust and _canonical(role['AssumeRolePolicyDocument']) != _canonical(trust_policy):
+            iam.update_assume_role_policy(RoleName=role_name, PolicyDocument=json.dumps(trust_policy))
+            status = 'updated'
+
+    policies = attach_policies_concurrently(iam, role_name, policy_arns) if policy_arns else []
+    return {'role': role_name, 'status': status, 'arn': arn, 'policies': policies}
+
+
+def deploy_cross_account_role(role_name, trusted_account_id, accounts, description="Cross-account access role",
+                              policy_arns=None, pool=None, max_workers=10):
+    """
+    Deploy create_cross_account_role's role to many accounts at once
+
+    Args:
+        role_name (str): Name of the role
+        trusted_account_id (str): AWS account ID that can assume the role
+        accounts (list): Target account ids
+        description (str): Role description
+        policy_arns (list): Managed policies to attach in every account
+        pool (AssumedRoleSessionPool): Optional pool (default: assume OrganizationAccountAccessRole)
+        max_workers (int): Accounts worked on at the same time
+
+    Returns:
+        list: Per-account report from fan_out()
+    """
+    trust_policy = account_trust_policy(trusted_account_id)
+
+    def work(iam, account_id):
+        return deploy_role(iam, role_name, trust_policy, description, policy_arns)
+
+    own_pool = pool is None
+    pool = pool or AssumedRoleSessionPool()
+    try:
+        return fan_out(accounts, work, pool.client, max_workers)
+    finally:
+        if own_pool:
+            pool.close()
+
+
+def print_report(report):
+    ok = [r for r in report if r['status'] == ACCOUNT_OK]
+    print(f"\n📊 {len(ok)}/{len(report)} accounts succeeded")
+    for r in report:
+        if r['status'] == ACCOUNT_OK:
+            result = r['result'] or {}
+            failed = [p for p in result.get('policies', []) if p['status'] != 'attached']
+            note = f", {len(failed)} policies failed" if failed else ""
+            print(f"   ✅ {r['account']}: {result.get('status')} {result.get('arn')} ({r['seconds']:.1f}s{note})")
+        else:
+            print(f"   ❌ {r['account']}: {r['error']}")
+
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deploy a cross-account role to many accounts")
+    parser.add_argument('role_name')
+    parser.add_argument('trusted_account_id', help="Account allowed to assume the role")
+    parser.add_argument('accounts', nargs='+', help="Target account ids")
+    parser.add_argument('--policy', action='append', default=[], help="Managed policy ARN to attach (repeatable)")
+    parser.add_argument('--deployment-role', default=DEFAULT_DEPLOYMENT_ROLE, help="Role assumed in each account")
+    parser.add_argument('--external-id', help="ExternalId of the deployment role")
+    parser.add_argument('--workers', type=int, default=10, help="Accounts worked on at the same time")
+    parser.add_argument('--tps', type=float, help="IAM calls per second allowed per account")
+    args = parser.parse_args()
+
+    print(f"🚀 Deploying role '{args.role_name}' to {len(args.accounts)} accounts...")
+    try:
+        with AssumedRoleSessionPool(args.deployment_role, external_id=args.external_id,
+                                    per_account_tps=args.tps, use_disk=True) as session_pool:
+            results = deploy_cross_account_role(args.role_name, args.trusted_account_id, args.accounts,
+                                                policy_arns=args.policy, pool=session_pool,
+                                                max_workers=args.workers)
+    except ValueError as e:
+        print(f"❌ Configuration error: {e}")
+        exit(1)
+
+    print_report(results)
+    exit(0 if all(r['status'] == ACCOUNT_OK for r in results) else 1)
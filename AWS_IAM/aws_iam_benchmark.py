@@ -0,0 +1,356 @@
+### Benchmarks for the IAM helpers
+### Runs against the in-process FakeIAMClient (aws_iam_fake.py), so no AWS account or credentials are needed.
+### Usage: python aws_iam_benchmark.py [--users 200] [--latency 0.02]
+###        python aws_iam_benchmark.py --suite [--sizes 10 1000 10000] [--latency 0] [--max-tps 0] [--output run.json]
+### The suite times every helper at several account sizes, sequentially and concurrently; comparing the JSON
+### files of two runs shows regressions.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_iam_create_group import create_iam_group_explicit
+from aws_iam_create_role import create_iam_role, create_role_with_policies, list_roles
+from aws_iam_create_user import create_aws_user, create_aws_users_bulk, USER_CREATED
+from aws_iam_fake import FakeIAMClient
+from aws_iam_policy_eval import PolicyEvaluator
+from aws_iam_throttle import AdaptiveRateLimiter, ThrottledClient
+
+
+def bench_bulk_users(count, max_workers, latency):
+    """
+    Time create_aws_users_bulk for `count` new users on a fresh fake IAM
+
+    Returns:
+        dict: Elapsed seconds, users/sec and how many users were created
+    """
+    iam = FakeIAMClient(latency=latency)
+    users = [f"bench_user_{i:05d}" for i in range(count)]
+
+    start = time.perf_counter()
+    results = create_aws_users_bulk(users, max_workers=max_workers, iam=iam)
+    elapsed = time.perf_counter() - start
+
+    created = sum(1 for r in results if r['status'] == USER_CREATED)
+    return {'workers': max_workers, 'seconds': elapsed, 'ops_per_sec': count / elapsed, 'created': created}
+
+
+def bench_throttled_users(count, max_workers, latency, max_tps):
+    """
+    Time create_aws_users_bulk against a fake IAM that throttles above `max_tps`, through a ThrottledClient
+
+    Returns:
+        dict: Elapsed seconds, users/sec, users created, throttles seen and the limiter's final rate
+    """
+    fake = FakeIAMClient(latency=latency, max_tps=max_tps)
+    iam = ThrottledClient(fake, AdaptiveRateLimiter())
+    users = [f"bench_user_{i:05d}" for i in range(count)]
+
+    start = time.perf_counter()
+    results = create_aws_users_bulk(users, max_workers=max_workers, iam=iam)
+    elapsed = time.perf_counter() - start
+
+    created = sum(1 for r in results if r['status'] == USER_CREATED)
+    return {'seconds': elapsed, 'ops_per_sec': count / elapsed, 'created': created,
+            'throttles': fake.throttled_calls, 'rate': iam.limiter.rate}
+
+
+def bench_role_with_policies(policy_count, max_workers, latency):
+    """
+    Time one create_role_with_policies call with `policy_count` managed policies on a fresh fake IAM
+
+    Returns:
+        dict: Elapsed seconds and the number of round trips that took
+    """
+    iam = FakeIAMClient(latency=latency)
+    policy_arns = [f"arn:aws:iam::aws:policy/BenchPolicy{i}" for i in range(policy_count)]
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_role_with_policies('BenchRole', {}, policy_arns=policy_arns, max_workers=max_workers, iam=iam)
+    elapsed = time.perf_counter() - start
+
+    return {'workers': max_workers, 'seconds': elapsed, 'round_trips': elapsed / latency if latency else 0.0}
+
+
+def bench_policy_eval(query_count, principal_count=50, seed=7):
+    """
+    Time PolicyEvaluator.evaluate_batch on synthetic policies, first with unique queries (cold) and then
+    with the same batch again (answered from the decision cache)
+
+    Returns:
+        dict: Queries per second for the cold and the warm run
+    """
+    rng = random.Random(seed)
+    services = ['s3', 'ec2', 'dynamodb', 'lambda', 'sqs', 'sns', 'logs', 'kms']
+    verbs = ['Get', 'Put', 'Delete', 'List', 'Describe', 'Create', 'Update']
+
+    evaluator = PolicyEvaluator()
+    for p in range(principal_count):
+        statements = []
+        for s in rng.sample(services, 4):
+            statements.append({'Effect': 'Allow', 'Action': [f"{s}:{v}*" for v in rng.sample(verbs, 3)],
+                               'Resource': f"arn:aws:{s}:*:123456789012:team{p % 5}-*"})
+        statements.append({'Effect': 'Deny', 'Action': '*:Delete*', 'Resource': '*prod*'})
+        evaluator.add_principal(f"role/Bench{p}", [{'Version': '2012-10-17', 'Statement': statements}])
+
+    queries = []
+    for i in range(query_count):
+        stage = rng.choice(['dev', 'prod'])
+        queries.append((f"role/Bench{rng.randrange(principal_count)}",
+                        f"{rng.choice(services)}:{rng.choice(verbs)}Thing{rng.randrange(5)}",
+                        f"arn:aws:{rng.choice(services)}:us-east-1:123456789012:team{rng.randrange(5)}-{stage}-{i}"))
+
+    start = time.perf_counter()
+    evaluator.evaluate_batch(queries)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    evaluator.evaluate_batch(queries)
+    warm = time.perf_counter() - start
+
+    return {'cold_qps': query_count / cold, 'warm_qps': query_count / warm}
+
+
+BENCH_TRUST_POLICY = {
+    "Version": "2012-10-17",
+    "Statement": [{"Effect": "Allow", "Principal": {"Service": "ec2.amazonaws.com"}, "Action": "sts:AssumeRole"}]
+}
+BENCH_POLICY_ARNS = [f"arn:aws:iam::aws:policy/BenchPolicy{i}" for i in range(3)]
+
+# How many times list_roles pages through the whole account per run
+LIST_REPEATS = 10
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _suite_operations():
+    """name -> (setup(iam, size), op(iam, index), operation count) for every helper the suite measures"""
+
+    def seed_roles(iam, size):
+        for i in range(size):
+            iam.create_role(RoleName=f"seed_role_{i:05d}", AssumeRolePolicyDocument=json.dumps(BENCH_TRUST_POLICY))
+
+    return {
+        'create_iam_role': (
+            None, lambda iam, i: create_iam_role(f"bench_role_{i:05d}", BENCH_TRUST_POLICY, iam=iam), None),
+        'create_role_with_policies': (
+            None, lambda iam, i: create_role_with_policies(f"bench_role_{i:05d}", BENCH_TRUST_POLICY,
+                                                           policy_arns=BENCH_POLICY_ARNS, max_workers=1, iam=iam),
+            None),
+        'create_aws_user': (
+            None, lambda iam, i: create_aws_user(f"bench_user_{i:05d}", iam=iam), None),
+        'create_iam_group_explicit': (
+            None, lambda iam, i: create_iam_group_explicit(f"bench_group_{i:05d}", iam=iam), None),
+        'list_roles': (
+            seed_roles, lambda iam, i: list_roles(iam=iam), LIST_REPEATS),
+    }
+
+
+def bench_operation(operation, size, workers=1, latency=0.0, max_tps=None, trace_memory=True):
+    """
+    Run one helper against a fresh fake IAM holding `size` entities
+
+    Create helpers are called `size` times; list_roles pages through `size` existing roles LIST_REPEATS times.
+
+    Args:
+        operation (str): One of the names of _suite_operations()
+        size (int): Entities created (or listed)
+        workers (int): 1 runs the calls one after the other, more runs them from a thread pool
+        latency (float): Simulated seconds per IAM call
+        max_tps (float): If set, the fake throttles above this rate and calls go through a ThrottledClient
+        trace_memory (bool): Measure the peak Python memory of the run (tracemalloc slows the run down)
+
+    Returns:
+        dict: ops/sec, p50/p99 seconds per helper call, peak memory and the fake's call counters
+    """
+    setup, op, count = _suite_operations()[operation]
+    count = count or size
+
+    fake = FakeIAMClient()
+    if setup:
+        setup(fake, size)
+    fake.latency = latency
+    fake.max_tps = max_tps
+    fake.calls = 0
+    iam = ThrottledClient(fake, AdaptiveRateLimiter()) if max_tps else fake
+
+    durations = [0.0] * count
+
+    def timed(i):
+        start = time.perf_counter()
+        op(iam, i)
+        durations[i] = time.perf_counter() - start
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if workers <= 1:
+            for i in range(count):
+                timed(i)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(timed, range(count)))
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    durations.sort()
+    return {
+        'operation': operation,
+        'size': size,
+        'mode': 'sequential' if workers <= 1 else 'concurrent',
+        'workers': workers,
+        'ops': count,
+        'seconds': elapsed,
+        'ops_per_sec': count / elapsed if elapsed else 0.0,
+        'p50': _percentile(durations, 0.50),
+        'p99': _percentile(durations, 0.99),
+        'peak_memory_mb': peak / (1024 * 1024),
+        'iam_calls': fake.calls,
+        'throttled_calls': fake.throttled_calls,
+    }
+
+
+def run_suite(sizes=(10, 1000, 10000), workers=20, latency=0.0, max_tps=None, operations=None, trace_memory=True):
+    """
+    Run every suite operation at every size, sequentially and with `workers` threads
+
+    Returns:
+        list: One bench_operation() result per (operation, size, mode)
+    """
+    results = []
+    for operation in operations or list(_suite_operations()):
+        for size in sizes:
+            for mode_workers in (1, workers):
+                results.append(bench_operation(operation, size, mode_workers, latency, max_tps, trace_memory))
+    return results
+
+
+def print_suite(results):
+    print(f"📊 {'operation':<26} {'size':>6} {'mode':<10} {'ops/sec':>10} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'peak MB':>8} {'throttled':>9}")
+    for r in results:
+        print(f"   {r['operation']:<26} {r['size']:>6} {r['mode']:<10} {r['ops_per_sec']:>10,.0f} "
+              f"{r['p50'] * 1000:>8.2f} {r['p99'] * 1000:>8.2f} {r['peak_memory_mb']:>8.1f} {r['throttled_calls']:>9}")
+
+
+# Snippets timed in a fresh interpreter by bench_cold_start(); {here} is this folder
+COLD_START_SNIPPETS = {
+    'import console': "import sys; sys.path.insert(0, {project!r}); import command_controller",
+    'import create_role script': "import sys; sys.path.insert(0, {here!r}); import aws_iam_create_role",
+    'import + first IAM client': ("import sys; sys.path.insert(0, {here!r}); import aws_iam_client; "
+                                  "aws_iam_client.get_iam_client('bench', 'bench', 'us-east-1')"),
+    'first IAM client after prewarm': (
+        "import sys, time; sys.path.insert(0, {here!r}); import aws_iam_client; "
+        "aws_iam_client.prewarm().join(); start = time.perf_counter(); "
+        "aws_iam_client.get_iam_client('bench', 'bench', 'us-east-1'); "
+        "print(time.perf_counter() - start)"),
+}
+
+
+def bench_cold_start(runs=5):
+    """
+    Time each COLD_START_SNIPPETS entry in a fresh Python process (median of `runs`)
+
+    The prewarm entry reports only the client construction that is left once the prewarm thread is done,
+    i.e. what a console user waits for after typing their credentials.
+
+    Returns:
+        dict: snippet name -> median seconds
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    project = os.path.join(here, '..', 'Project_1')
+    results = {}
+    for name, snippet in COLD_START_SNIPPETS.items():
+        code = snippet.format(here=here, project=project)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+            elapsed = time.perf_counter() - start
+            timings.append(float(output) if output.strip() else elapsed)
+        results[name] = sorted(timings)[len(timings) // 2]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IAM helpers against a local IAM stand-in")
+    parser.add_argument('--users', type=int, default=200, help="Users to create per run")
+    parser.add_argument('--latency', type=float, default=None,
+                        help="Simulated seconds per IAM call (default: 0.02, or 0 with --suite)")
+    parser.add_argument('--policies', type=int, default=12, help="Managed policies per role build")
+    parser.add_argument('--max-tps', type=float, default=None,
+                        help="Calls/sec the throttling fake allows (default: 40, or no throttling with --suite)")
+    parser.add_argument('--queries', type=int, default=200000, help="Policy evaluation queries")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 10, 50], help="Concurrency levels to compare")
+    parser.add_argument('--suite', action='store_true', help="Run the per-helper suite at several account sizes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000], help="Suite account sizes")
+    parser.add_argument('--operations', nargs='+', choices=sorted(_suite_operations()), help="Suite helpers to run")
+    parser.add_argument('--no-memory', action='store_true', help="Skip tracemalloc (faster, no memory column)")
+    parser.add_argument('--output', help="Also write the suite results to this JSON file")
+    parser.add_argument('--startup', action='store_true', help="Only measure the cold-start times")
+    args = parser.parse_args()
+
+    if args.startup:
+        print("📊 Cold start (median of 5 fresh interpreters)")
+        for name, seconds in bench_cold_start().items():
+            print(f"   - {name}: {seconds * 1000:.0f} ms")
+        return
+
+    if args.suite:
+        # The suite defaults to no simulated latency and no throttling unless they are asked for explicitly
+        latency = args.latency if args.latency is not None else 0.0
+        max_tps = args.max_tps if args.max_tps is not None and args.max_tps > 0 else None
+        results = run_suite(args.sizes, max(args.workers), latency, max_tps, args.operations, not args.no_memory)
+        print_suite(results)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"\n✅ Results saved to {args.output}")
+        return
+
+    if args.latency is None:
+        args.latency = 0.02
+    if args.max_tps is None:
+        args.max_tps = 40
+
+    print(f"📊 Bulk user creation: {args.users} users, {args.latency * 1000:.0f} ms per call")
+    for workers in args.workers:
+        r = bench_bulk_users(args.users, workers, args.latency)
+        print(f"   - workers={r['workers']:>3}: {r['seconds']:.2f}s "
+              f"({r['ops_per_sec']:.0f} users/sec, {r['created']} created)")
+
+    print(f"\n📊 Role build with {args.policies} managed policies")
+    for workers in args.workers:
+        r = bench_role_with_policies(args.policies, workers, args.latency)
+        print(f"   - workers={r['workers']:>3}: {r['seconds']:.2f}s (~{r['round_trips']:.1f} round trips)")
+
+    print(f"\n📊 Bulk user creation against IAM throttling above {args.max_tps:.0f} calls/sec")
+    r = bench_throttled_users(args.users, max(args.workers), args.latency, args.max_tps)
+    print(f"   - {r['seconds']:.2f}s ({r['ops_per_sec']:.0f} users/sec, {r['created']} created, "
+          f"{r['throttles']} throttled calls, final rate {r['rate']:.1f}/sec)")
+
+    print(f"\n📊 Offline policy evaluation: {args.queries} queries")
+    r = bench_policy_eval(args.queries)
+    print(f"   - cold: {r['cold_qps']:,.0f} queries/sec")
+    print(f"   - cached: {r['warm_qps']:,.0f} queries/sec")
+
+
+if __name__ == "__main__":
+    main()
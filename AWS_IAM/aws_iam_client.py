@@ -0,0 +1,222 @@
+### Shared boto3 client factory
+### Every helper in this folder asks this module for its IAM/STS client instead of calling boto3.client()
+### itself, so clients (and their HTTP connection pools) are built once per credentials + region and reused.
+
+import os
+import threading
+import time
+
+from aws_iam_metrics import instrument_client, observe_client_setup
+from aws_iam_throttle import ThrottledClient, get_rate_limiter, throttled
+
+# boto3/botocore and python-dotenv take a few hundred milliseconds to import, so they are only imported (and the
+# .env file only read) when the first client or credentials are needed. prewarm() does it in the background.
+
+# Size of the shared HTTP connection pool of every client (botocore default is 10)
+MAX_POOL_CONNECTIONS = 50
+
+_lock = threading.Lock()
+_env_loaded = False
+_session = None
+_client_config = None
+_clients = {}
+_env_credentials = {}
+
+
+def _load_env():
+    """Load environment variables from the .env file (once)"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def _get_session():
+    """Return the boto3 session every client is built from (call while holding _lock)"""
+    global _session, _client_config
+    if _session is None:
+        import boto3
+        from botocore.config import Config
+
+        # Retries are done by aws_iam_throttle.ThrottledClient, which also slows every caller down on throttling
+        _client_config = Config(
+            max_pool_connections=MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
+            retries={'total_max_attempts': 1, 'mode': 'standard'}
+        )
+        # Credentials are passed per client, so one session (and its cache of parsed service models) serves all
+        _session = boto3.session.Session()
+    return _session
+
+
+def get_credentials(default_region='us-east-1'):
+    """
+    Read the AWS credentials from the environment (.env file), once per process
+
+    Args:
+        default_region (str): Region to use when AWS_DEFAULT_REGION is not set
+
+    Returns:
+        tuple: (access_key, secret_key, region)
+    """
+    credentials = _env_credentials.get(default_region)
+    if credentials is None:
+        _load_env()
+        credentials = (os.getenv('AWS_ACCESS_KEY_ID'), os.getenv('AWS_SECRET_ACCESS_KEY'),
+                       os.getenv('AWS_DEFAULT_REGION', default_region))
+        # Only complete credentials are remembered, so keys added to the environment later are still picked up
+        if credentials[0] and credentials[1]:
+            _env_credentials[default_region] = credentials
+    return credentials
+
+
+def get_client(service_name, access_key=None, secret_key=None, region=None, default_region='us-east-1'):
+    """
+    Return a cached boto3 client for a service, credentials and region
+
+    Clients are thread-safe, so the same client is shared by every caller (and every worker
+    thread) using the same credentials. When no keys are given they are read from the .env file.
+    Every client is wrapped in a ThrottledClient sharing the rate limiter of its service and
+    reports its calls to aws_iam_metrics.
+
+    Args:
+        service_name (str): AWS service, e.g. 'iam' or 'sts'
+        access_key (str): Optional AWS access key id
+        secret_key (str): Optional AWS secret access key
+        region (str): Optional region name
+        default_region (str): Region to use when neither region nor AWS_DEFAULT_REGION is set
+
+    Raises:
+        ValueError: If no access key or secret key is available
+    """
+    if access_key is None and secret_key is None:
+        access_key, secret_key, env_region = get_credentials(default_region)
+        region = region or env_region
+
+    if not access_key or not secret_key:
+        raise ValueError("AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY must be set in .env file")
+
+    key = (service_name, access_key, secret_key, region or None)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    # boto3 sessions are not thread-safe, so clients are only built while holding the lock
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            start = time.perf_counter()
+            raw_client = _get_session().client(
+                service_name,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name=region or None,
+                config=_client_config
+            )
+            raw_client = instrument_client(raw_client)
+            observe_client_setup(service_name, time.perf_counter() - start)
+            client = throttled(raw_client, service_name)
+            _clients[key] = client
+
+    return client
+
+
+def _credential_resolver(credentials):
+    """botocore credential resolver whose only provider hands out the RefreshableCredentials of `credentials`"""
+    from botocore.credentials import CredentialProvider, CredentialResolver
+
+    class TemporaryCredentialProvider(CredentialProvider):
+        METHOD = 'aws-iam-temporary-credentials'
+
+        def load(self):
+            return credentials.botocore_credentials()
+
+    return CredentialResolver([TemporaryCredentialProvider()])
+
+
+def get_client_with_credentials(service_name, credentials, region=None, rate_limit_key=None):
+    """
+    Return a cached client using TemporaryCredentials (e.g. an assumed role in another account)
+
+    The client follows the background refreshes of `credentials` and never calls STS itself.
+
+    Args:
+        service_name (str): AWS service, e.g. 'iam'
+        credentials (TemporaryCredentials): Credentials from aws_iam_credentials
+        region (str): Optional region name
+        rate_limit_key (str): Name of the rate limiter to share (default: the service's global limiter);
+            IAM limits are per account, so use e.g. 'iam:123456789012' for a client of another account
+    """
+    key = (service_name, credentials, region or None)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            import boto3
+            import botocore.session
+
+            start = time.perf_counter()
+            shared = _get_session()._session
+            botocore_session = botocore.session.Session()
+            # Reuse the parsed service models of the shared session instead of loading them again
+            botocore_session.register_component('data_loader', shared.get_component('data_loader'))
+            botocore_session.register_component('credential_provider', _credential_resolver(credentials))
+            session = boto3.session.Session(botocore_session=botocore_session, region_name=region or None)
+            raw_client = instrument_client(session.client(service_name, config=_client_config))
+            observe_client_setup(service_name, time.perf_counter() - start)
+            client = ThrottledClient(raw_client, get_rate_limiter(rate_limit_key or service_name), service_name)
+            _clients[key] = client
+
+    return client
+
+
+def release_clients(credentials):
+    """Forget the cached clients built by get_client_with_credentials for `credentials` (e.g. when they are closed)"""
+    with _lock:
+        for key in [key for key in _clients if key[1] is credentials]:
+            del _clients[key]
+
+
+def get_iam_client(access_key=None, secret_key=None, region=None, default_region='us-east-1'):
+    """Return the shared IAM client"""
+    return get_client('iam', access_key, secret_key, region, default_region)
+
+
+def get_sts_client(access_key=None, secret_key=None, region=None, default_region='us-east-1'):
+    """Return the shared STS client"""
+    return get_client('sts', access_key, secret_key, region, default_region)
+
+
+def clear_clients():
+    """Forget every cached client and the credentials read from .env (e.g. after rotating the keys)"""
+    with _lock:
+        _clients.clear()
+        _env_credentials.clear()
+
+
+def prewarm(services=('iam', 'sts')):
+    """
+    Import the AWS SDK and load the service models in a background thread
+
+    Meant to be started while an interactive user is still typing, so the first real call does not pay
+    for the imports. Throwaway clients are built with placeholder keys (nothing is sent to AWS) only to
+    parse the service models into the shared session's cache.
+
+    Returns:
+        threading.Thread: The (daemon) thread doing the work
+    """
+    def warm():
+        _load_env()
+        with _lock:
+            session = _get_session()
+            for service_name in services:
+                session.client(service_name, aws_access_key_id='prewarm', aws_secret_access_key='prewarm',
+                               region_name='us-east-1', config=_client_config)
+
+    thread = threading.Thread(target=warm, name='aws-prewarm', daemon=True)
+    thread.start()
+    return thread
@@ -1,37 +1,37 @@
 ### Creating a Security group
 
 ### First execute the command pip install boto3 and pip install python-dotenv
+### Group membership can be kept in sync with reconcile_group_memberships (see below):
+### Usage: python aws_iam_create_group.py --reconcile members.json [--prune] [--dry-run]
+###        where members.json is {"Developers": ["Jane_Doe", "John_Smith"], "Admins": ["Jane_Doe"]}
 
-import boto3
-import os
-from dotenv import load_dotenv
-from botocore.exceptions import ClientError
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# Load environment variables from .env file
-load_dotenv()
+from botocore.exceptions import BotoCoreError, ClientError
 
+from aws_iam_client import get_iam_client
+from aws_iam_paginate import iter_items
+from aws_iam_throttle import THROTTLE_CODES
 
-def create_iam_group_explicit(group_name, path='/'):
+
+def create_iam_group_explicit(group_name, path='/', inventory=None, iam=None):
     """
     Create an IAM group using explicit credentials from .env
+
+    If a local IAMInventory is given, a group it already knows is reported without calling IAM.
+    A client can be passed as `iam` (e.g. the FakeIAMClient used by the benchmarks).
     """
     try:
-        # Get credentials from environment variables
-        access_key = os.getenv('AWS_ACCESS_KEY_ID')
-        secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-        region = os.getenv('AWS_DEFAULT_REGION', 'us-east-2')
-
-        # Validate that we have the required credentials
-        if not access_key or not secret_key:
-            raise ValueError("AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY must be set in .env file")
-
-        # Create IAM client with explicit credentials
-        iam = boto3.client(
-            'iam',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
+        if inventory is not None and inventory.exists('group', group_name):
+            print(f"Group '{group_name}' already exists")
+            return None
+
+        # Get the shared IAM client (raises ValueError if the .env credentials are missing)
+        if iam is None:
+            iam = get_iam_client(default_region='us-east-2')
 
         # Create the group
         response = iam.create_group(
@@ -39,6 +39,9 @@ def create_iam_group_explicit(group_name, path='/'):
             Path=path
         )
 
+        if inventory is not None:
+            inventory.record_response('group', response)
+
         print(f"✓ Group '{group_name}' created successfully")
         print(f"Group ARN: {response['Group']['Arn']}")
         return response
@@ -47,10 +50,16 @@ def create_iam_group_explicit(group_name, path='/'):
         error_code = e.response['Error']['Code']
         if error_code == 'EntityAlreadyExists':
             print(f"Group '{group_name}' already exists")
+            if inventory is not None:
+                inventory.invalidate('group')
         elif error_code == 'InvalidClientTokenId':
             print(f"Invalid credentials. Check your AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY")
         elif error_code == 'AccessDenied':
             print(f"Access denied. Check your IAM permissions")
+        elif error_code in THROTTLE_CODES:
+            print("IAM is still throttling requests after several retries. Try again later")
+        elif error_code == 'LimitExceeded':
+            print("Your account reached its IAM groups quota")
         else:
             print(f"Error creating group: {e}")
         return None
@@ -59,6 +68,163 @@ def create_iam_group_explicit(group_name, path='/'):
         return None
 
 
+def iter_groups(path_prefix='/', prefetch=True, page_size=1000, iam=None):
+    """
+    Yield every IAM group, following the pagination markers
+
+    Args:
+        path_prefix (str): Only return groups under this path (filtered by IAM)
+        prefetch (bool): Fetch the next page while the caller works on the current one
+        page_size (int): Groups requested per call (IAM allows up to 1000)
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+    """
+    if iam is None:
+        iam = get_iam_client(default_region='us-east-2')
+    return iter_items(iam.list_groups, 'Groups', prefetch=prefetch, PathPrefix=path_prefix, MaxItems=page_size)
+
+
+def get_group_members(group_name, page_size=1000, iam=None):
+    """
+    Return the user names in a group, following the get_group pagination markers
+
+    Raises:
+        ClientError: NoSuchEntity if the group does not exist
+    """
+    if iam is None:
+        iam = get_iam_client(default_region='us-east-2')
+    return {user['UserName'] for user in iter_items(iam.get_group, 'Users', prefetch=False, GroupName=group_name,
+                                                    MaxItems=page_size)}
+
+
+def _change_membership(iam, action, group_name, user_name):
+    """Run one add_user_to_group / remove_user_from_group call and describe the outcome as a dict"""
+    change = {'group': group_name, 'user': user_name, 'action': action, 'status': action, 'error': None}
+    try:
+        if action == 'added':
+            iam.add_user_to_group(GroupName=group_name, UserName=user_name)
+        else:
+            iam.remove_user_from_group(GroupName=group_name, UserName=user_name)
+    except ClientError as e:
+        change['status'] = 'failed'
+        change['error'] = f"{e.response['Error']['Code']}: {e.response['Error'].get('Message', '')}"
+    except BotoCoreError as e:
+        change['status'] = 'failed'
+        change['error'] = f"{type(e).__name__}: {e}"
+    return change
+
+
+def reconcile_group_memberships(desired, prune=False, dry_run=False, max_workers=10, iam=None):
+    """
+    Bring the members of several groups in line with a desired mapping
+
+    The current members of every group are fetched concurrently (paginated get_group), the additions and
+    removals are computed with one set difference per group, and all of them are then applied concurrently.
+    Calls go through the shared throttled client, so IAM throttling slows the workers down instead of failing.
+
+    Args:
+        desired (dict): Group name -> user names that should be in the group
+        prune (bool): Also remove users that are in a group but not listed for it
+        dry_run (bool): Only compute the changes
+        max_workers (int): IAM calls in flight at the same time
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+
+    Returns:
+        dict: {'groups': {group: {'added', 'removed', 'unchanged', 'failed'}}, 'changes': [...],
+               'missing_groups': [...], 'failed_groups': {group: error}, 'seconds'}
+    """
+    if iam is None:
+        iam = get_iam_client(default_region='us-east-2')
+    start = time.perf_counter()
+    desired = {group: set(users) for group, users in desired.items()}
+
+    def fetch(group_name):
+        try:
+            return group_name, get_group_members(group_name, iam=iam), None
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code == 'NoSuchEntity':
+                return group_name, None, None
+            return group_name, None, f"{code}: {e.response['Error'].get('Message', '')}"
+        except BotoCoreError as e:
+            return group_name, None, f"{type(e).__name__}: {e}"
+
+    workers = max(1, min(max_workers, len(desired) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fetched = list(executor.map(fetch, desired))
+
+    current = {group: members for group, members, _ in fetched}
+    # A group that could not be read is left alone; the other groups are still reconciled
+    failed_groups = {group: error for group, _, error in fetched if error is not None}
+    missing_groups = sorted(group for group, members in current.items()
+                            if members is None and group not in failed_groups)
+    planned, groups = [], {}
+    for group_name, wanted in sorted(desired.items()):
+        members = current[group_name]
+        if members is None:
+            continue
+        to_add = wanted - members
+        to_remove = members - wanted if prune else set()
+        groups[group_name] = {'added': [], 'removed': [], 'unchanged': len(members & wanted), 'failed': []}
+        planned += [('added', group_name, user) for user in sorted(to_add)]
+        planned += [('removed', group_name, user) for user in sorted(to_remove)]
+
+    if dry_run:
+        changes = [{'group': g, 'user': u, 'action': a, 'status': 'planned', 'error': None} for a, g, u in planned]
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(planned) or 1))) as executor:
+            changes = list(executor.map(lambda item: _change_membership(iam, *item), planned))
+
+    for change in changes:
+        summary = groups[change['group']]
+        if change['status'] == 'failed':
+            summary['failed'].append(change['user'])
+        else:
+            summary[change['action']].append(change['user'])
+
+    return {'groups': groups, 'changes': changes, 'missing_groups': missing_groups,
+            'failed_groups': dict(sorted(failed_groups.items())), 'seconds': time.perf_counter() - start}
+
+
+def print_membership_summary(result, dry_run=False):
+    verb = "Would change" if dry_run else "Changed"
+    changed = sum(1 for c in result['changes'] if c['status'] != 'failed')
+    print(f"{verb} {changed} memberships in {len(result['groups'])} groups ({result['seconds']:.1f}s)")
+    for group_name, summary in result['groups'].items():
+        print(f"   {group_name}: +{len(summary['added'])} -{len(summary['removed'])} "
+              f"={summary['unchanged']}" + (f", {len(summary['failed'])} failed" if summary['failed'] else ""))
+    for change in result['changes']:
+        if change['status'] == 'failed':
+            verb = 'add' if change['action'] == 'added' else 'remove'
+            print(f"   Could not {verb} {change['user']} ({change['group']}): {change['error']}")
+    for group_name in result['missing_groups']:
+        print(f"   Group '{group_name}' does not exist")
+    for group_name, error in result['failed_groups'].items():
+        print(f"   Could not read group '{group_name}': {error}")
+
+
 # Usage
 if __name__ == "__main__":
-    create_iam_group_explicit('DevelopersGroup')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create an IAM group or reconcile group memberships")
+    parser.add_argument('--reconcile', metavar='MEMBERS_JSON', help="JSON file mapping group -> user names")
+    parser.add_argument('--prune', action='store_true', help="Remove members not listed in the file")
+    parser.add_argument('--dry-run', action='store_true', help="Only print the changes")
+    args = parser.parse_args()
+
+    if not args.reconcile:
+        create_iam_group_explicit('DevelopersGroup')
+        exit(0)
+
+    with open(args.reconcile, encoding='utf-8') as f:
+        members = json.load(f)
+    try:
+        result = reconcile_group_memberships(members, prune=args.prune, dry_run=args.dry_run)
+    except ValueError as e:
+        print(f"Configuration error: {e}")
+        exit(1)
+    except (ClientError, BotoCoreError) as e:
+        print(f"Error reconciling groups: {e}")
+        exit(1)
+    print_membership_summary(result, args.dry_run)
+    failed = (any(c['status'] == 'failed' for c in result['changes']) or result['missing_groups']
+              or result['failed_groups'])
+    exit(1 if failed else 0)
\ No newline at end of file
@@ -1,53 +1,58 @@
-import boto3
-import os
+import argparse
 import json
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+
 from botocore.exceptions import ClientError
 
-# Load environment variables from .env file
-load_dotenv()
+from aws_iam_client import get_credentials, get_iam_client
+from aws_iam_credentials import forget_caller_identity, get_caller_identity
+from aws_iam_paginate import iter_items
+from aws_iam_templates import TEMPLATES, account_trust_policy_json, service_trust_policy_json
+from aws_iam_throttle import THROTTLE_CODES
+from aws_iam_validate import validate_change, validate_changes
 
 
-def create_iam_role(role_name, trust_policy, description=None, path='/'):
+def create_iam_role(role_name, trust_policy, description=None, path='/', iam=None, inventory=None):
     """
     Create an IAM role with a trust policy
 
     Args:
         role_name (str): Name of the role to create
-        trust_policy (dict): Trust policy document
+        trust_policy (dict | str): Trust policy document, or its JSON (e.g. from aws_iam_templates)
         description (str): Optional description for the role
         path (str): Path for the role (default: '/')
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+        inventory (IAMInventory): Optional local cache checked before calling IAM
     """
-    try:
-        # Get credentials from environment variables
-        access_key = os.getenv('AWS_ACCESS_KEY_ID')
-        secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-        region = os.getenv('AWS_DEFAULT_REGION', 'us-east-1')
-
-        # Validate credentials
-        if not access_key or not secret_key:
-            raise ValueError("AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY must be set in .env file")
-
-        # Create IAM client
-        iam = boto3.client(
-            'iam',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
+    # Prepare parameters
+    params = {
+        'RoleName': role_name,
+        'AssumeRolePolicyDocument': trust_policy if isinstance(trust_policy, str) else json.dumps(trust_policy),
+        'Path': path
+    }
+    if description:
+        params['Description'] = description
+
+    # Reject what IAM would reject (names, trust policy syntax and size) before calling it
+    problems = validate_change({'action': 'create_role', 'params': params})
+    if problems:
+        print(f"❌ Role '{role_name}' is invalid: {'; '.join(problems)}")
+        return None
 
-        # Prepare parameters
-        params = {
-            'RoleName': role_name,
-            'AssumeRolePolicyDocument': json.dumps(trust_policy),
-            'Path': path
-        }
+    try:
+        # Skip the call if the local inventory already knows the role
+        if inventory is not None and inventory.exists('role', role_name):
+            print(f"❌ Role '{role_name}' already exists")
+            return None
 
-        if description:
-            params['Description'] = description
+        # Get the shared IAM client (raises ValueError if the .env credentials are missing)
+        if iam is None:
+            iam = get_iam_client()
 
         # Create the role
         response = iam.create_role(**params)
+        if inventory is not None:
+            inventory.record_response('role', response)
 
         print(f"✅ Role '{role_name}' created successfully!")
         print(f"📋 Role Details:")
@@ -61,10 +66,16 @@ def create_iam_role(role_name, trust_policy, description=None, path='/'):
         error_code = e.response['Error']['Code']
         if error_code == 'EntityAlreadyExists':
             print(f"❌ Role '{role_name}' already exists")
+            if inventory is not None:
+                inventory.invalidate('role')
         elif error_code == 'InvalidClientTokenId':
             print("❌ Invalid credentials. Check your .env file")
         elif error_code == 'AccessDenied':
             print("❌ Access denied. Check your IAM permissions")
+        elif error_code in THROTTLE_CODES:
+            print("❌ IAM is still throttling requests after several retries. Try again later")
+        elif error_code == 'LimitExceeded':
+            print("❌ Your account reached its IAM roles quota")
         else:
             print(f"❌ Error creating role: {e}")
         return None
@@ -76,69 +87,74 @@ def create_iam_role(role_name, trust_policy, description=None, path='/'):
 def create_ec2_role(role_name, description="Role for EC2 instances"):
     """
     Create a role that can be assumed by EC2 instances
+
+    Instances only get a role through an instance profile: see ensure_instance_profile, or
+    aws_iam_provision.provision_ec2_roles to create many roles with their profiles and wait until they are usable.
     """
-    # Trust policy for EC2
-    ec2_trust_policy = {
-        "Version": "2012-10-17",
-        "Statement": [
-            {
-                "Effect": "Allow",
-                "Principal": {
-                    "Service": "ec2.amazonaws.com"
-                },
-                "Action": "sts:AssumeRole"
-            }
-        ]
-    }
+    # Trust policy for EC2 (serialized once, shared by every call)
+    return create_iam_role(role_name, service_trust_policy_json('ec2.amazonaws.com'), description)
+
+
+def ensure_instance_profile(role_name, profile_name=None, iam=None):
+    """
+    Make sure an instance profile exists and carries the role, so EC2 instances can be launched with it
+
+    Existing profiles are reused; an instance profile holds at most one role.
+
+    Args:
+        role_name (str): Role made by create_ec2_role
+        profile_name (str): Name of the instance profile (defaults to the role name, like the console does)
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+
+    Returns:
+        dict: {'name', 'arn', 'created': bool, 'role_added': bool}
+
+    Raises:
+        ClientError: If the role does not exist or the profile already carries another role
+    """
+    if iam is None:
+        iam = get_iam_client()
+    profile_name = profile_name or role_name
+
+    created = False
+    try:
+        profile = iam.create_instance_profile(InstanceProfileName=profile_name)['InstanceProfile']
+        created = True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'EntityAlreadyExists':
+            raise
+        profile = iam.get_instance_profile(InstanceProfileName=profile_name)['InstanceProfile']
 
-    return create_iam_role(role_name, ec2_trust_policy, description)
+    roles = [role['RoleName'] for role in profile.get('Roles', [])]
+    role_added = False
+    if role_name not in roles:
+        iam.add_role_to_instance_profile(InstanceProfileName=profile_name, RoleName=role_name)
+        role_added = True
+
+    return {'name': profile_name, 'arn': profile['Arn'], 'created': created, 'role_added': role_added}
 
 
 def create_lambda_role(role_name, description="Role for Lambda functions"):
     """
     Create a role that can be assumed by Lambda functions
     """
-    # Trust policy for Lambda
-    lambda_trust_policy = {
-        "Version": "2012-10-17",
-        "Statement": [
-            {
-                "Effect": "Allow",
-                "Principal": {
-                    "Service": "lambda.amazonaws.com"
-                },
-                "Action": "sts:AssumeRole"
-            }
-        ]
-    }
-
-    return create_iam_role(role_name, lambda_trust_policy, description)
+    # Trust policy for Lambda (serialized once, shared by every call)
+    return create_iam_role(role_name, service_trust_policy_json('lambda.amazonaws.com'), description)
 
 
 def create_cross_account_role(role_name, trusted_account_id, description="Cross-account access role"):
     """
     Create a role that can be assumed by another AWS account
 
+    To create it in many accounts at once, see aws_iam_accounts.deploy_cross_account_role.
+
     Args:
         role_name (str): Name of the role
         trusted_account_id (str): AWS account ID that can assume this role
         description (str): Role description
     """
     # Trust policy for cross-account access
-    cross_account_trust_policy = {
-        "Version": "2012-10-17",
-        "Statement": [
-            {
-                "Effect": "Allow",
-                "Principal": {
-                    "AWS": f"arn:aws:iam::{trusted_account_id}:root"
-                },
-                "Action": "sts:AssumeRole"
-            }
-        ]
-    }
-
-    return create_iam_role(role_name, cross_account_trust_policy, description)
+    return create_iam_role(role_name, account_trust_policy_json(trusted_account_id), description)
 
 
 def attach_policy_to_role(role_name, policy_arn):
@@ -150,18 +166,8 @@ def attach_policy_to_role(role_name, policy_arn):
         policy_arn (str): ARN of the policy to attach
     """
     try:
-        # Get credentials
-        access_key = os.getenv('AWS_ACCESS_KEY_ID')
-        secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-        region = os.getenv('AWS_DEFAULT_REGION', 'us-east-1')
-
-        # Create IAM client
-        iam = boto3.client(
-            'iam',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
+        # Get the shared IAM client
+        iam = get_iam_client()
 
         # Attach policy
         iam.attach_role_policy(
@@ -173,61 +179,116 @@ def attach_policy_to_role(role_name, policy_arn):
 
     except ClientError as e:
         print(f"❌ Error attaching policy: {e}")
+    except ValueError as e:
+        print(f"❌ Configuration error: {e}")
+
+
+def _attach_managed_policy(iam, role_name, policy_arn):
+    """Attach one managed policy and describe the outcome as a dict"""
+    try:
+        iam.attach_role_policy(
+            RoleName=role_name,
+            PolicyArn=policy_arn
+        )
+        return {'policy': policy_arn, 'type': 'managed', 'status': 'attached', 'error': None}
+    except ClientError as e:
+        return {'policy': policy_arn, 'type': 'managed', 'status': 'failed', 'error': str(e)}
+
+
+def _put_inline_policy(iam, role_name, policy_name, policy_document):
+    """Create one inline policy and describe the outcome as a dict"""
+    try:
+        iam.put_role_policy(
+            RoleName=role_name,
+            PolicyName=policy_name,
+            PolicyDocument=policy_document if isinstance(policy_document, str) else json.dumps(policy_document)
+        )
+        return {'policy': policy_name, 'type': 'inline', 'status': 'attached', 'error': None}
+    except ClientError as e:
+        return {'policy': policy_name, 'type': 'inline', 'status': 'failed', 'error': str(e)}
 
 
-def create_role_with_policies(role_name, trust_policy, policy_arns=None, inline_policies=None):
+def attach_policies_concurrently(iam, role_name, policy_arns=None, inline_policies=None, max_workers=10):
+    """
+    Attach managed and inline policies to an existing role at the same time
+
+    Every policy is attached independently, so one failure does not stop the others and the
+    whole step takes about as long as the slowest call instead of the sum of all of them.
+
+    Args:
+        iam: IAM client
+        role_name (str): Name of the role
+        policy_arns (list): List of managed policy ARNs to attach
+        inline_policies (dict): Dictionary of inline policies {policy_name: policy_document}
+        max_workers (int): Maximum number of calls in flight
+
+    Returns:
+        list: One result dict per policy with the keys 'policy', 'type', 'status' and 'error'
+    """
+    tasks = [(_attach_managed_policy, (iam, role_name, arn)) for arn in policy_arns or []]
+    tasks += [(_put_inline_policy, (iam, role_name, name, document))
+              for name, document in (inline_policies or {}).items()]
+    if not tasks:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks)))) as executor:
+        futures = [executor.submit(func, *args) for func, args in tasks]
+        return [future.result() for future in futures]
+
+
+def create_role_with_policies(role_name, trust_policy, policy_arns=None, inline_policies=None,
+                              max_workers=10, iam=None, inventory=None):
     """
     Create a role and attach policies to it
 
+    Once the role exists all the policies are attached concurrently.
+    The per-policy results are returned in role_response['PolicyResults'].
+
     Args:
         role_name (str): Name of the role
-        trust_policy (dict): Trust policy document
+        trust_policy (dict | str): Trust policy document, or its JSON
         policy_arns (list): List of managed policy ARNs to attach
         inline_policies (dict): Dictionary of inline policies {policy_name: policy_document}
+        max_workers (int): Maximum number of policy calls in flight
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+        inventory (IAMInventory): Optional local cache checked before creating and updated afterwards
     """
     try:
+        if iam is None:
+            iam = get_iam_client()
+
+        # Check the policies locally first, so a bad one does not leave a half-configured role behind
+        batch = [{'action': 'attach_role_policy', 'params': {'RoleName': role_name, 'PolicyArn': arn}}
+                 for arn in policy_arns or []]
+        batch += [{'action': 'put_role_policy', 'params': {'RoleName': role_name, 'PolicyName': name,
+                                                           'PolicyDocument': document}}
+                  for name, document in (inline_policies or {}).items()]
+        problems = [problem for found in validate_changes(batch).values() for problem in found]
+        if problems:
+            print(f"❌ Policies of role '{role_name}' are invalid: {'; '.join(problems)}")
+            return None
+
         # Create the role first
-        role_response = create_iam_role(role_name, trust_policy)
+        role_response = create_iam_role(role_name, trust_policy, iam=iam, inventory=inventory)
         if not role_response:
             return None
 
-        # Get IAM client
-        access_key = os.getenv('AWS_ACCESS_KEY_ID')
-        secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-        region = os.getenv('AWS_DEFAULT_REGION', 'us-east-1')
-
-        iam = boto3.client(
-            'iam',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
-
-        # Attach managed policies
-        if policy_arns:
-            for policy_arn in policy_arns:
-                try:
-                    iam.attach_role_policy(
-                        RoleName=role_name,
-                        PolicyArn=policy_arn
-                    )
-                    print(f"✅ Attached managed policy: {policy_arn}")
-                except ClientError as e:
-                    print(f"❌ Failed to attach policy {policy_arn}: {e}")
-
-        # Create inline policies
-        if inline_policies:
-            for policy_name, policy_document in inline_policies.items():
-                try:
-                    iam.put_role_policy(
-                        RoleName=role_name,
-                        PolicyName=policy_name,
-                        PolicyDocument=json.dumps(policy_document)
-                    )
-                    print(f"✅ Created inline policy: {policy_name}")
-                except ClientError as e:
-                    print(f"❌ Failed to create inline policy {policy_name}: {e}")
-
+        # Attach managed and inline policies in parallel
+        results = attach_policies_concurrently(iam, role_name, policy_arns, inline_policies, max_workers)
+        for result in results:
+            if result['type'] == 'managed' and result['status'] == 'attached':
+                print(f"✅ Attached managed policy: {result['policy']}")
+            elif result['type'] == 'managed':
+                print(f"❌ Failed to attach policy {result['policy']}: {result['error']}")
+            elif result['status'] == 'attached':
+                print(f"✅ Created inline policy: {result['policy']}")
+            else:
+                print(f"❌ Failed to create inline policy {result['policy']}: {result['error']}")
+
+            if inventory is not None and result['type'] == 'managed' and result['status'] == 'attached':
+                inventory.record_policy('role', role_name, result['policy'])
+
+        role_response['PolicyResults'] = results
         return role_response
 
     except Exception as e:
@@ -235,30 +296,38 @@ def create_role_with_policies(role_name, trust_policy, policy_arns=None, inline_
         return None
 
 
-def list_roles():
-    """List all IAM roles"""
-    try:
-        # Get credentials
-        access_key = os.getenv('AWS_ACCESS_KEY_ID')
-        secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-        region = os.getenv('AWS_DEFAULT_REGION', 'us-east-1')
-
-        # Create IAM client
-        iam = boto3.client(
-            'iam',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
+def iter_roles(path_prefix='/', prefetch=True, page_size=1000, iam=None):
+    """
+    Yield every IAM role, following the pagination markers
+
+    Args:
+        path_prefix (str): Only return roles under this path (filtered by IAM, e.g. '/service-role/')
+        prefetch (bool): Fetch the next page while the caller works on the current one
+        page_size (int): Roles requested per call (IAM allows up to 1000)
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+    """
+    if iam is None:
+        iam = get_iam_client()
+    return iter_items(iam.list_roles, 'Roles', prefetch=prefetch, PathPrefix=path_prefix, MaxItems=page_size)
 
-        # List roles
-        response = iam.list_roles()
-        roles = response['Roles']
+
+def list_roles(path_prefix='/', iam=None):
+    """
+    List all IAM roles (every page, printed as they arrive)
+
+    Args:
+        path_prefix (str): Only list roles under this path (default: '/', all roles)
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+    """
+    try:
+        roles = []
+        print("\n📋 Roles:")
+        for role in iter_roles(path_prefix, iam=iam):
+            print(f"   - {role['RoleName']} (Created: {role['CreateDate']})")
+            roles.append(role)
 
         if roles:
-            print(f"\n📋 Found {len(roles)} roles:")
-            for role in roles:
-                print(f"   - {role['RoleName']} (Created: {role['CreateDate']})")
+            print(f"Found {len(roles)} roles")
         else:
             print("No roles found")
 
@@ -267,43 +336,48 @@ def list_roles():
     except ClientError as e:
         print(f"❌ Error listing roles: {e}")
         return []
+    except ValueError as e:
+        print(f"❌ Configuration error: {e}")
+        return []
 
 
-def verify_credentials():
-    """Verify AWS credentials"""
-    try:
-        access_key = os.getenv('AWS_ACCESS_KEY_ID')
-        secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-        region = os.getenv('AWS_DEFAULT_REGION', 'us-east-1')
+def verify_credentials(force=False):
+    """
+    Verify AWS credentials with STS
 
-        if not access_key or not secret_key:
+    The identity comes from the aws_iam_credentials cache when it was checked recently (never longer ago than
+    IDENTITY_MAX_AGE), so repeated runs do not wait for STS.
+
+    Args:
+        force (bool): Always ask STS, e.g. right after rotating or revoking keys
+    """
+    try:
+        try:
+            identity = get_caller_identity(force=force)
+        except ValueError:
             print("❌ AWS credentials not found in .env file")
             return False
 
-        # Create STS client
-        sts = boto3.client(
-            'sts',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
-
-        identity = sts.get_caller_identity()
         print(f"✅ Connected as: {identity.get('Arn')}")
         return True
 
     except ClientError as e:
         print(f"❌ Credential verification failed: {e}")
+        forget_caller_identity(*get_credentials()[:2])
         return False
 
 
 # Usage examples
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create example IAM roles")
+    parser.add_argument('--check', action='store_true', help="Verify the credentials with STS even if cached")
+    args = parser.parse_args()
+
     print("🚀 AWS IAM Role Creator")
     print("=" * 40)
 
     # Verify credentials
-    if not verify_credentials():
+    if not verify_credentials(force=args.check):
         print("Please check your .env file")
         exit(1)
 
@@ -325,16 +399,7 @@ if __name__ == "__main__":
     print("Example 3: Creating role with policies...")
 
     # Define trust policy for EC2
-    ec2_trust = {
-        "Version": "2012-10-17",
-        "Statement": [
-            {
-                "Effect": "Allow",
-                "Principal": {"Service": "ec2.amazonaws.com"},
-                "Action": "sts:AssumeRole"
-            }
-        ]
-    }
+    ec2_trust = service_trust_policy_json('ec2.amazonaws.com')
 
     # Managed policies to attach
     managed_policies = [
@@ -344,19 +409,7 @@ if __name__ == "__main__":
 
     # Inline policy
     inline_policy = {
-        'CustomS3Policy': {
-            "Version": "2012-10-17",
-            "Statement": [
-                {
-                    "Effect": "Allow",
-                    "Action": [
-                        "s3:GetObject",
-                        "s3:PutObject"
-                    ],
-                    "Resource": "arn:aws:s3:::my-bucket/*"
-                }
-            ]
-        }
+        'CustomS3Policy': TEMPLATES['s3-object-read-write'].render(bucket='my-bucket')
     }
 
     create_role_with_policies(
@@ -1,40 +1,47 @@
-import boto3
-import os
-from dotenv import load_dotenv
-from botocore.exceptions import ClientError
+import csv
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
-# Load environment variables from .env file
-load_dotenv()
+from botocore.exceptions import BotoCoreError, ClientError
 
+from aws_iam_client import get_iam_client
+from aws_iam_paginate import iter_items
+from aws_iam_throttle import THROTTLE_CODES
 
-def create_aws_user(user_name):
+# Status values returned by the bulk mode
+USER_CREATED = 'created'
+USER_ALREADY_EXISTS = 'already-exists'
+USER_FAILED = 'failed'
+
+
+def create_aws_user(user_name, inventory=None, iam=None):
     """
     Create a new AWS IAM user
 
     Args:
         user_name (str): Name of the user you want to create
+        inventory (IAMInventory): Optional local cache checked before calling IAM
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
     """
     try:
-        # Get your AWS credentials from the .env file
-        access_key = os.getenv('AWS_ACCESS_KEY_ID')
-        secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-        region = os.getenv('AWS_DEFAULT_REGION', 'us-east-2')
+        # Skip the call if the local inventory already knows the user
+        if inventory is not None and inventory.exists('user', user_name):
+            print(f"❌ Error: User '{user_name}' already exists!")
+            return
 
-        # Check if we have the credentials
-        if not access_key or not secret_key:
+        # Connect to AWS with the shared client built from your .env credentials
+        try:
+            if iam is None:
+                iam = get_iam_client(default_region='us-east-2')
+        except ValueError:
             print("❌ Error: Please make sure AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY are in your .env file")
             return
 
-        # Connect to AWS
-        iam = boto3.client(
-            'iam',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
-
         # Create the user
         response = iam.create_user(UserName=user_name)
+        if inventory is not None:
+            inventory.record_response('user', response)
 
         # Success message
         print(f"✅ Success! User '{user_name}' has been created!")
@@ -49,19 +56,127 @@ def create_aws_user(user_name):
 
         if error_code == 'EntityAlreadyExists':
             print(f"❌ Error: User '{user_name}' already exists!")
+            if inventory is not None:
+                inventory.invalidate('user')
         elif error_code == 'InvalidClientTokenId':
             print("❌ Error: Your AWS credentials are invalid. Check your .env file.")
         elif error_code == 'AccessDenied':
             print("❌ Error: You don't have permission to create users.")
+        elif error_code in THROTTLE_CODES:
+            print("❌ Error: AWS is still throttling requests after several retries. Try again later.")
+        elif error_code == 'LimitExceeded':
+            print("❌ Error: Your account reached its IAM users quota.")
         else:
             print(f"❌ Error: Something went wrong - {error}")
 
 
+def load_users(file_path):
+    """
+    Read the users to create from a CSV or JSONL file
+
+    CSV files need a header with a 'user_name' column (and optionally 'path').
+    JSONL files hold one object per line, e.g. {"user_name": "Jane_Doe", "path": "/engineering/"}
+
+    Args:
+        file_path (str): Path to a .csv or .jsonl file
+
+    Returns:
+        list: One dict per user with the keys 'user_name' and 'path'
+    """
+    users = []
+    with open(file_path, newline='', encoding='utf-8') as f:
+        if file_path.endswith('.csv'):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for row in rows:
+            user_name = (row.get('user_name') or '').strip()
+            if not user_name:
+                continue
+            users.append({'user_name': user_name, 'path': (row.get('path') or '/').strip()})
+    return users
+
+
+def _create_user_result(iam, user, inventory=None):
+    """Create one user and describe the outcome as a dict instead of printing it"""
+    user_name = user['user_name']
+    if inventory is not None and inventory.exists('user', user_name):
+        cached = inventory.get('user', user_name)
+        return {'user_name': user_name, 'status': USER_ALREADY_EXISTS, 'arn': cached['arn'] or None, 'error': None}
+    try:
+        response = iam.create_user(UserName=user_name, Path=user.get('path', '/'))
+        if inventory is not None:
+            inventory.record_response('user', response)
+        return {'user_name': user_name, 'status': USER_CREATED, 'arn': response['User']['Arn'], 'error': None}
+    except ClientError as error:
+        error_code = error.response['Error']['Code']
+        if error_code == 'EntityAlreadyExists':
+            return {'user_name': user_name, 'status': USER_ALREADY_EXISTS, 'arn': None, 'error': None}
+        return {'user_name': user_name, 'status': USER_FAILED, 'arn': None, 'error': f"{error_code}: {error}"}
+    except BotoCoreError as error:
+        # Connection failures and timeouts fail this user only, not the whole batch
+        return {'user_name': user_name, 'status': USER_FAILED, 'arn': None, 'error': f"{type(error).__name__}: {error}"}
+
+
+def create_aws_users_bulk(users, max_workers=10, iam=None, inventory=None):
+    """
+    Create many IAM users concurrently on a thread pool
+
+    Args:
+        users (list): User names (str) or dicts with 'user_name' and optional 'path'
+        max_workers (int): Number of users created at the same time
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+        inventory (IAMInventory): Optional local cache; users it already knows are not sent to IAM
+
+    Returns:
+        list: One result dict per user, in input order, with the keys
+              'user_name', 'status' ('created', 'already-exists' or 'failed'), 'arn' and 'error'
+    """
+    users = [{'user_name': u, 'path': '/'} if isinstance(u, str) else u for u in users]
+    if not users:
+        return []
+
+    if iam is None:
+        iam = get_iam_client(default_region='us-east-2')
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(users)))) as executor:
+        return list(executor.map(lambda user: _create_user_result(iam, user, inventory), users))
+
+
+def iter_users(path_prefix='/', prefetch=True, page_size=1000, iam=None):
+    """
+    Yield every IAM user, following the pagination markers
+
+    Args:
+        path_prefix (str): Only return users under this path (filtered by IAM)
+        prefetch (bool): Fetch the next page while the caller works on the current one
+        page_size (int): Users requested per call (IAM allows up to 1000)
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+    """
+    if iam is None:
+        iam = get_iam_client(default_region='us-east-2')
+    return iter_items(iam.list_users, 'Users', prefetch=prefetch, PathPrefix=path_prefix, MaxItems=page_size)
+
+
 # Main program
 if __name__ == "__main__":
     print("🚀 AWS User Creator")
     print("==================")
 
+    if len(sys.argv) > 1:
+        # Bulk mode: python aws_iam_create_user.py users.csv [max_workers]
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+        try:
+            results = create_aws_users_bulk(load_users(sys.argv[1]), max_workers=workers)
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+
+        for result in results:
+            print(json.dumps(result))
+        sys.exit(1 if any(r['status'] == USER_FAILED for r in results) else 0)
+
     # The name of the user you want to create
     new_user_name = "David_Developer"  # Change this to whatever name you want
 
@@ -0,0 +1,318 @@
+### Credential and caller-identity cache
+### sts.get_caller_identity() and sts.assume_role() are slow round trips that return the same answer for a long
+### time, so their results are kept in process and, optionally, in small JSON files under CACHE_DIR (mode 0600,
+### guarded by a file lock so concurrent scripts do not corrupt them). Temporary credentials are refreshed by a
+### background timer well before they expire, so callers only ever wait for STS the very first time.
+
+import datetime
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.aws_iam_cache')
+
+# Seconds a cached caller identity is served without asking STS again (then refreshed in the background)
+IDENTITY_TTL = 300
+
+# Seconds after which a cached caller identity is never served: STS is asked before returning
+IDENTITY_MAX_AGE = 3600
+
+# Temporary credentials are refreshed this many seconds before they expire (or at half their lifetime if sooner)
+REFRESH_MARGIN = 900
+
+# Wait before retrying a failed background refresh
+RETRY_DELAY = 30
+
+# STS error codes meaning the credentials themselves are no good (a cached identity is dropped)
+REJECTED_CODES = frozenset(['InvalidClientTokenId', 'ExpiredToken', 'SignatureDoesNotMatch',
+                            'UnrecognizedClientException'])
+
+
+def key_id(access_key):
+    """Short, non-reversible name for an access key (used in file names, never the key itself)"""
+    return hashlib.sha256(access_key.encode('utf-8')).hexdigest()[:16]
+
+
+class DiskCache:
+    """
+    JSON files under CACHE_DIR, one per key, read and written under an exclusive file lock
+
+    Args:
+        directory (str): Where the files live (created with 0700 permissions)
+    """
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _locked(self, key):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        lock = open(os.path.join(self.directory, f"{key}.lock"), 'a')
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def read(self, key):
+        """Return the stored dict, or None if missing or unreadable"""
+        if not os.path.exists(self._path(key)):
+            return None
+        with self._locked(key):
+            try:
+                with open(self._path(key)) as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                return None
+
+    def write(self, key, value):
+        with self._locked(key):
+            tmp_path = self._path(key) + '.tmp'
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(value, f, default=str)
+            os.replace(tmp_path, self._path(key))
+
+    def delete(self, key):
+        with self._locked(key):
+            if os.path.exists(self._path(key)):
+                os.unlink(self._path(key))
+
+
+_identities = {}
+_identity_lock = threading.Lock()
+_identity_refreshing = set()
+
+
+def _fetch_identity(sts, name, disk):
+    identity = sts.get_caller_identity()
+    entry = {'Account': identity['Account'], 'Arn': identity['Arn'], 'UserId': identity['UserId'],
+             'fetched_at': time.time()}
+    with _identity_lock:
+        _identities[name] = entry
+        _identity_refreshing.discard(name)
+    if disk is not None:
+        disk.write(f"identity-{name}", entry)
+    return entry
+
+
+def _refresh_identity_in_background(sts, name, disk):
+    def refresh():
+        try:
+            _fetch_identity(sts, name, disk)
+        except Exception as e:
+            # Keep serving the cached identity unless STS rejected the keys; the next call tries again
+            rejected = getattr(e, 'response', {}).get('Error', {}).get('Code') in REJECTED_CODES
+            with _identity_lock:
+                _identity_refreshing.discard(name)
+                if rejected:
+                    _identities.pop(name, None)
+            if rejected and disk is not None:
+                disk.delete(f"identity-{name}")
+
+    with _identity_lock:
+        if name in _identity_refreshing:
+            return
+        _identity_refreshing.add(name)
+    threading.Thread(target=refresh, name='identity-refresh', daemon=True).start()
+
+
+def _identity_key(access_key, secret_key):
+    # The secret is part of the key, so a wrong secret never matches an identity cached with the right one
+    return key_id(f"{access_key}\0{secret_key or ''}")
+
+
+def get_caller_identity(sts=None, access_key=None, secret_key=None, ttl=IDENTITY_TTL, max_age=IDENTITY_MAX_AGE,
+                        use_disk=True, force=False):
+    """
+    Return {'Account', 'Arn', 'UserId'} of the credentials, calling STS as rarely as possible
+
+    A cached identity (in process, then on disk) is returned right away. When it is older than
+    `ttl` it is still returned, and refreshed in a background thread for the next caller; once it
+    is older than `max_age` (or with force) STS is asked before returning.
+
+    Args:
+        sts: Optional STS client (defaults to the shared client from the .env credentials)
+        access_key (str): Access key of `sts` (read from .env when not given)
+        secret_key (str): Secret key of `sts`; the cache key is a hash of both keys
+        ttl (int): Seconds before a cached identity is refreshed in the background
+        max_age (int): Seconds after which a cached identity is not used at all
+        use_disk (bool): Also share the identity between runs through CACHE_DIR
+        force (bool): Always ask STS (the answer is still cached for the next callers)
+
+    Raises:
+        ValueError: If no credentials are available
+        ClientError: If STS rejects the credentials (nothing is cached then)
+    """
+    from aws_iam_client import get_credentials, get_sts_client
+
+    if access_key is None:
+        access_key, secret_key = get_credentials()[:2]
+        if not access_key or not secret_key:
+            raise ValueError("AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY must be set in .env file")
+    if sts is None:
+        sts = get_sts_client()
+
+    name = _identity_key(access_key, secret_key)
+    disk = DiskCache() if use_disk else None
+    if force:
+        entry = _fetch_identity(sts, name, disk)
+        return {k: entry[k] for k in ('Account', 'Arn', 'UserId')}
+
+    with _identity_lock:
+        entry = _identities.get(name)
+    if entry is None and disk is not None:
+        entry = disk.read(f"identity-{name}")
+        if entry is not None:
+            with _identity_lock:
+                _identities[name] = entry
+
+    age = time.time() - entry['fetched_at'] if entry is not None else None
+    if entry is None or age >= max_age:
+        entry = _fetch_identity(sts, name, disk)
+    elif age >= ttl:
+        _refresh_identity_in_background(sts, name, disk)
+    return {k: entry[k] for k in ('Account', 'Arn', 'UserId')}
+
+
+def forget_caller_identity(access_key, secret_key=None):
+    """Drop the cached identity of a pair of keys (e.g. after STS rejected them)"""
+    name = _identity_key(access_key, secret_key)
+    with _identity_lock:
+        _identities.pop(name, None)
+    DiskCache().delete(f"identity-{name}")
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+    return datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+
+
+class TemporaryCredentials:
+    """
+    Short-lived credentials (e.g. from sts.assume_role) kept fresh by a background timer
+
+    Args:
+        fetch (callable): Returns an STS 'Credentials' dict (AccessKeyId, SecretAccessKey, SessionToken, Expiration)
+        refresh_margin (int): Refresh this many seconds before expiry (or at half the lifetime if sooner)
+        cache_key (str): If set, the credentials are also shared between processes through DiskCache
+    """
+
+    def __init__(self, fetch, refresh_margin=REFRESH_MARGIN, cache_key=None):
+        self._fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.cache_key = cache_key
+        self.refreshes = 0
+        self._disk = DiskCache() if cache_key else None
+        self._credentials = None
+        # _lock guards the state and is never held during a call to STS; _refresh_lock serializes the fetches
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._timer = None
+        self._closed = False
+
+    def _seconds_left(self, credentials):
+        return (_as_datetime(credentials['Expiration']) - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+
+    def _usable(self, credentials):
+        return credentials is not None and self._seconds_left(credentials) > 60
+
+    def _schedule(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._closed:
+            return
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _store(self, credentials, lifetime):
+        self._credentials = credentials
+        left = self._seconds_left(credentials)
+        self._schedule(max(1.0, min(left - self.refresh_margin, lifetime / 2)))
+
+    def refresh(self, force=True):
+        """
+        Get new credentials now (from the disk cache if another process refreshed them recently)
+
+        Args:
+            force (bool): Refresh even if the current credentials are still usable
+        """
+        with self._refresh_lock:
+            if not force:
+                with self._lock:
+                    current = self._credentials
+                if self._usable(current):
+                    return current
+
+            if self._disk is not None:
+                cached = self._disk.read(self.cache_key)
+                if cached is not None and self._seconds_left(cached) > self.refresh_margin:
+                    with self._lock:
+                        self._store(cached, self._seconds_left(cached))
+                    return cached
+
+            credentials = dict(self._fetch())
+            credentials['Expiration'] = _as_datetime(credentials['Expiration']).isoformat()
+            if self._disk is not None:
+                self._disk.write(self.cache_key, credentials)
+            with self._lock:
+                self.refreshes += 1
+                self._store(credentials, self._seconds_left(credentials))
+            return credentials
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            # Keep the current credentials while they last and try again shortly
+            with self._lock:
+                if self._credentials is not None:
+                    self._schedule(min(RETRY_DELAY, max(1.0, self._seconds_left(self._credentials) / 2)))
+
+    def get(self):
+        """Return valid credentials; only blocks when none were fetched yet or they already expired"""
+        with self._lock:
+            credentials = self._credentials
+        if self._usable(credentials):
+            return credentials
+        return self.refresh(force=False)
+
+    def expires_in(self):
+        """Seconds until the current credentials expire (0 if none yet)"""
+        with self._lock:
+            credentials = self._credentials
+        return max(0.0, self._seconds_left(credentials)) if credentials else 0.0
+
+    def as_client_kwargs(self):
+        """Keyword arguments for boto3 client() built from the current credentials"""
+        credentials = self.get()
+        return {'aws_access_key_id': credentials['AccessKeyId'],
+                'aws_secret_access_key': credentials['SecretAccessKey'],
+                'aws_session_token': credentials['SessionToken']}
+
+    def botocore_credentials(self):
+        """
+        botocore RefreshableCredentials reading from this object
+
+        A client built with them picks up every background refresh without calling STS itself.
+        """
+        from botocore.credentials import RefreshableCredentials
+
+        def metadata():
+            credentials = self.get()
+            return {'access_key': credentials['AccessKeyId'], 'secret_key': credentials['SecretAccessKey'],
+                    'token': credentials['SessionToken'], 'expiry_time': credentials['Expiration']}
+
+        return RefreshableCredentials.create_from_metadata(metadata(), metadata, 'aws-iam-temporary-credentials')
+
+    def close(self):
+        """Stop the background refresh timer"""
+        with self._lock:
+            self._closed = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
@@ -0,0 +1,174 @@
+### Warm IAM worker daemon
+### Keeps the shared clients of aws_iam_client (imports done, credentials loaded, HTTP connections open) in one
+### long-lived process and serves API calls over a Unix domain socket, so shell scripts do not pay for a Python
+### start-up, the boto3 imports and a TLS handshake on every call. Use aws_iam_daemon_client.py to talk to it.
+###
+### Protocol: one JSON object per line in each direction.
+###     {"op": "create_user", "params": {"UserName": "alice"}, "service": "iam"}
+###     -> {"ok": true, "result": {...}}  or  {"ok": false, "error": {"code": "EntityAlreadyExists", "message": ...}}
+###     {"batch": [request, ...]}  ->  {"batch": [response, ...]}   (run in parallel, answered in order)
+### Special ops: ping, metrics (aws_iam_metrics data) and shutdown.
+### Every message carries "credentials": the client's credentials_fingerprint; other credentials are refused.
+### Usage: python aws_iam_daemon.py serve [--socket PATH] [--workers 20] [--idle-timeout 900]
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_iam_client import get_client, get_credentials
+from aws_iam_daemon_client import credentials_fingerprint, default_socket_path
+from aws_iam_metrics import METRICS
+
+# Services the daemon builds clients for
+SERVICES = ('iam', 'sts')
+
+
+class IAMDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server running IAM/STS calls on the shared, warm clients
+
+    Args:
+        socket_path (str): Where to listen (created with 0600 permissions)
+        fingerprint (str): credentials_fingerprint of the credentials the clients are built with
+        max_workers (int): Calls of one batch run in parallel
+        idle_timeout (float): Exit after this many seconds without a request (0 to run forever)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, fingerprint, max_workers=20, idle_timeout=900):
+        self.socket_path = socket_path
+        self.fingerprint = fingerprint
+        self.idle_timeout = idle_timeout
+        self.last_request = time.monotonic()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def dispatch(self, request):
+        """Answer one request dict"""
+        self.last_request = time.monotonic()
+        if request.get('credentials') != self.fingerprint:
+            # A client with other keys (another .env, rotated keys) must never act in this daemon's account
+            error = {'ok': False, 'error': {'code': 'CredentialsMismatch',
+                                            'message': "This daemon serves other credentials"}}
+            return {'batch': [error] * len(request['batch'])} if 'batch' in request else error
+        if 'batch' in request:
+            return {'batch': list(self.executor.map(self.run_call, request['batch']))}
+        return self.run_call(request)
+
+    def run_call(self, request):
+        from botocore.exceptions import ClientError
+
+        op = request.get('op')
+        service = request.get('service', 'iam')
+        if op == 'ping':
+            return {'ok': True, 'result': 'pong'}
+        if op == 'metrics':
+            return {'ok': True, 'result': METRICS.to_dict()}
+        if op == 'shutdown':
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {'ok': True, 'result': 'bye'}
+
+        try:
+            if service not in SERVICES:
+                raise ValueError(f"Unsupported service '{service}'")
+            client = get_client(service)
+            if op not in client.meta.method_to_api_mapping:
+                raise ValueError(f"'{op}' is not an API call of {service}")
+            result = getattr(client, op)(**request.get('params', {}))
+            result.pop('ResponseMetadata', None)
+            return {'ok': True, 'result': result}
+        except ClientError as e:
+            return {'ok': False, 'error': {'code': e.response['Error']['Code'],
+                                           'message': e.response['Error'].get('Message', '')}}
+        except (ValueError, TypeError) as e:
+            return {'ok': False, 'error': {'code': 'InvalidRequest', 'message': str(e)}}
+        except Exception as e:
+            return {'ok': False, 'error': {'code': type(e).__name__, 'message': str(e)}}
+
+    def watch_idle(self):
+        while self.idle_timeout:
+            time.sleep(min(self.idle_timeout, 5))
+            if time.monotonic() - self.last_request >= self.idle_timeout:
+                self.shutdown()
+                return
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.dispatch(json.loads(line))
+            except ValueError as e:
+                response = {'ok': False, 'error': {'code': 'InvalidRequest', 'message': str(e)}}
+            self.wfile.write(json.dumps(response, default=str).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+def _remove_stale_socket(socket_path):
+    """Delete a socket file left by a daemon that died; raise if a daemon is still listening"""
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        os.unlink(socket_path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"A daemon is already listening on {socket_path}")
+
+
+def serve(socket_path=None, max_workers=20, idle_timeout=900):
+    """Run the daemon in the foreground until it is shut down or idle for `idle_timeout` seconds"""
+    # Build the clients now (credentials, imports, service models), the first request then only pays the call
+    for service in SERVICES:
+        get_client(service)
+    fingerprint = credentials_fingerprint(*get_credentials())
+
+    socket_path = socket_path or default_socket_path(fingerprint)
+    _remove_stale_socket(socket_path)
+    server = IAMDaemon(socket_path, fingerprint, max_workers, idle_timeout)
+    threading.Thread(target=server.watch_idle, daemon=True).start()
+    print(f"🚀 IAM daemon listening on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve IAM/STS calls from warm clients over a Unix socket")
+    parser.add_argument('command', choices=['serve'])
+    parser.add_argument('--socket', help="Socket path (default: AWS_IAM_DAEMON_SOCKET or the temp directory)")
+    parser.add_argument('--workers', type=int, default=20, help="Parallel calls per batch")
+    parser.add_argument('--idle-timeout', type=float, default=900, help="Exit after this many idle seconds (0: never)")
+    args = parser.parse_args()
+
+    try:
+        serve(args.socket, args.workers, args.idle_timeout)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        exit(1)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,265 @@
+### Thin client for aws_iam_daemon.py
+### Only uses the standard library, so it starts in a few milliseconds: the daemon holds the warm boto3 clients.
+### The daemon is started in the background the first time it is needed.
+### A daemon serves exactly one set of credentials: its socket is named after a fingerprint of the keys and region
+### (from the environment, or the .env file the daemon would load), and every request carries that fingerprint.
+### Usage: python aws_iam_daemon_client.py create_user UserName=alice [--query User.Arn]
+###        python aws_iam_daemon_client.py put_user_policy UserName=1234 PolicyName=p PolicyDocument:='{...}'
+###        python aws_iam_daemon_client.py get_caller_identity --service sts --query Arn
+###        python aws_iam_daemon_client.py --batch < requests.jsonl     (one {"op": ..., "params": ...} per line)
+### Exit code 0 on success, 1 on an AWS error (printed as "<ErrorCode>: <message>" on stderr), 2 on usage errors.
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+DAEMON_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'aws_iam_daemon.py')
+
+# Seconds to wait for an auto-started daemon to accept connections
+START_TIMEOUT = 15.0
+
+
+# Region the daemon uses when AWS_DEFAULT_REGION is not set (aws_iam_client.get_credentials default)
+DEFAULT_REGION = 'us-east-1'
+
+
+class UntrustedSocketError(RuntimeError):
+    """The daemon socket or its directory is not owned by (and private to) the current user"""
+
+
+def credentials_fingerprint(access_key, secret_key, region):
+    """Short, non-reversible id of a set of credentials and region (never the keys themselves)"""
+    material = '\0'.join([access_key or '', secret_key or '', region or ''])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()[:16]
+
+
+def _dotenv_values():
+    """KEY=VALUE pairs of the nearest .env file at or above this folder (the one python-dotenv finds)"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        path = os.path.join(directory, '.env')
+        if os.path.isfile(path):
+            values = {}
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line.startswith('export '):
+                        line = line[len('export '):].lstrip()
+                    key, sep, value = line.partition('=')
+                    if sep and not key.startswith('#'):
+                        values[key.strip()] = value.strip().strip('\'"')
+            return values
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return {}
+        directory = parent
+
+
+def current_fingerprint():
+    """Fingerprint of the credentials a daemon started from this environment uses"""
+    dotenv = None
+
+    def value(name, default=None):
+        nonlocal dotenv
+        # Like python-dotenv, the .env file never overrides a variable that is already set
+        if name in os.environ:
+            return os.environ[name]
+        if dotenv is None:
+            dotenv = _dotenv_values()
+        return dotenv.get(name, default)
+
+    return credentials_fingerprint(value('AWS_ACCESS_KEY_ID'), value('AWS_SECRET_ACCESS_KEY'),
+                                   value('AWS_DEFAULT_REGION', DEFAULT_REGION))
+
+
+def _check_private(path, is_directory):
+    info = os.lstat(path)
+    kind_ok = stat.S_ISDIR(info.st_mode) if is_directory else stat.S_ISSOCK(info.st_mode)
+    if not kind_ok or info.st_uid != os.getuid() or (is_directory and info.st_mode & 0o077):
+        raise UntrustedSocketError(f"{path} is not private to this user; remove it or set AWS_IAM_DAEMON_SOCKET")
+
+
+def _runtime_dir():
+    """$XDG_RUNTIME_DIR, or a 0700 folder of this user in the temp directory"""
+    directory = os.getenv('XDG_RUNTIME_DIR')
+    if not directory or not os.path.isdir(directory):
+        directory = os.path.join(tempfile.gettempdir(), f"aws_iam_daemon-{os.getuid()}")
+        try:
+            os.mkdir(directory, 0o700)
+        except FileExistsError:
+            pass
+    _check_private(directory, is_directory=True)
+    return directory
+
+
+def default_socket_path(fingerprint=None):
+    """
+    Socket of the daemon serving the current credentials (override with AWS_IAM_DAEMON_SOCKET)
+
+    Args:
+        fingerprint (str): credentials_fingerprint of the daemon (default: the current credentials)
+    """
+    return os.getenv('AWS_IAM_DAEMON_SOCKET') or os.path.join(
+        _runtime_dir(), f"aws_iam_daemon-{fingerprint or current_fingerprint()}.sock")
+
+
+def _connect(socket_path):
+    """
+    Raises:
+        OSError: If nothing is listening
+        UntrustedSocketError: If the socket belongs to another user
+    """
+    if os.path.lexists(socket_path):
+        _check_private(socket_path, is_directory=False)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def start_daemon(socket_path=None):
+    """Start the daemon in the background (if it is not running) and wait until it accepts connections"""
+    socket_path = socket_path or default_socket_path()
+    try:
+        _connect(socket_path).close()
+        return
+    except OSError:
+        pass
+
+    log_path = socket_path + '.log'
+    with open(log_path, 'wb') as log:
+        process = subprocess.Popen([sys.executable, DAEMON_SCRIPT, 'serve', '--socket', socket_path],
+                                   stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                                   start_new_session=True)
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            _connect(socket_path).close()
+            return
+        except OSError:
+            if process.poll() is not None:
+                with open(log_path, encoding='utf-8', errors='replace') as log:
+                    raise ConnectionError(f"The IAM daemon exited: {log.read().strip()}")
+            time.sleep(0.05)
+    raise ConnectionError(f"The IAM daemon did not start listening on {socket_path}")
+
+
+def send(requests, socket_path=None, auto_start=True):
+    """
+    Send requests to the daemon over one connection
+
+    Args:
+        requests (list): Request dicts {'op', 'params', 'service'}; more than one is sent as a single batch
+        socket_path (str): Daemon socket (default: default_socket_path())
+        auto_start (bool): Start the daemon if nothing is listening
+
+    Returns:
+        list: One response dict per request ({'ok': True, 'result': ...} or {'ok': False, 'error': {...}})
+
+    Raises:
+        ConnectionError: If the daemon cannot be reached or started
+        UntrustedSocketError: If the socket is not private to this user
+    """
+    fingerprint = current_fingerprint()
+    socket_path = socket_path or default_socket_path(fingerprint)
+    try:
+        sock = _connect(socket_path)
+    except OSError:
+        if not auto_start:
+            raise
+        start_daemon(socket_path)
+        sock = _connect(socket_path)
+
+    # The daemon refuses requests meant for other credentials than the ones it was started with
+    message = dict(requests[0]) if len(requests) == 1 else {'batch': requests}
+    message['credentials'] = fingerprint
+    with sock, sock.makefile('rwb') as stream:
+        stream.write(json.dumps(message).encode('utf-8') + b'\n')
+        stream.flush()
+        response = json.loads(stream.readline())
+    return response['batch'] if 'batch' in response else [response]
+
+
+def call(op, params=None, service='iam', socket_path=None):
+    """Run one API call through the daemon and return its response"""
+    return send([{'op': op, 'params': params or {}, 'service': service}], socket_path)[0]
+
+
+def _parse_params(pairs):
+    """Key=Value pairs; values starting with { or [ are JSON, Key:=Value forces JSON (e.g. MaxItems:=10)"""
+    params = {}
+    for pair in pairs:
+        key, sep, value = pair.partition('=')
+        if not sep or not key:
+            raise ValueError(f"Expected Key=Value, got '{pair}'")
+        if key.endswith(':'):
+            key, value = key[:-1], json.loads(value)
+        elif value.startswith(('{', '[')):
+            value = json.loads(value)
+        params[key] = value
+    return params
+
+
+def _query(value, path):
+    for part in path.split('.'):
+        value = value[int(part)] if isinstance(value, list) else value.get(part)
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Call IAM/STS through the warm aws_iam_daemon")
+    parser.add_argument('op', nargs='?', help="boto3 method name, e.g. create_user, or ping / metrics / shutdown")
+    parser.add_argument('params', nargs='*', help="Key=Value parameters ({...}/[...] values and Key:=json are decoded)")
+    parser.add_argument('--service', default='iam', help="AWS service (default: iam)")
+    parser.add_argument('--query', help="Print only this dotted path of the result, e.g. User.Arn")
+    parser.add_argument('--batch', action='store_true', help="Read one JSON request per line from stdin")
+    parser.add_argument('--socket', help="Daemon socket path")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.batch:
+            requests = [json.loads(line) for line in sys.stdin if line.strip()]
+        elif args.op:
+            requests = [{'op': args.op, 'params': _parse_params(args.params), 'service': args.service}]
+        else:
+            parser.error("an operation or --batch is required")
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    if not requests:
+        return 0
+    try:
+        responses = send(requests, args.socket)
+    except (ConnectionError, UntrustedSocketError) as e:
+        print(f"DaemonUnavailable: {e}", file=sys.stderr)
+        return 1
+
+    failed = False
+    for response in responses:
+        if not response.get('ok'):
+            failed = True
+            error = response.get('error', {})
+            print(f"{error.get('code')}: {error.get('message')}", file=sys.stderr)
+            if args.batch:
+                print(json.dumps(response))
+            continue
+        result = response.get('result')
+        if args.query and not args.batch:
+            result = _query(result, args.query)
+        print(result if isinstance(result, str) else json.dumps(result, default=str))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
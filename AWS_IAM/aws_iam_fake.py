@@ -0,0 +1,583 @@
+### In-process IAM stand-in
+### A small fake of the boto3 IAM client used to benchmark and try the helpers in this folder offline.
+### It keeps everything in dictionaries, raises the same ClientError codes as IAM and can simulate
+### network latency per call.
+
+import collections
+import datetime
+import json
+import random
+import threading
+import time
+import uuid
+
+from botocore.exceptions import ClientError
+
+FAKE_ACCOUNT_ID = '123456789012'
+
+
+def _client_error(code, message, operation_name):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation_name)
+
+
+class FakeIAMClient:
+    """
+    Thread-safe in-memory replacement for boto3.client('iam')
+
+    Args:
+        latency (float): Seconds every call sleeps, to simulate the network round trip
+        jitter (float): Extra random seconds (0..jitter) added to each call
+        max_tps (float): If set, calls beyond this many per second fail with a Throttling error
+        job_time (float): Seconds a generate_service_last_accessed_details job stays IN_PROGRESS
+        visibility_delay (float): Seconds before a new role, instance profile or role association shows up
+            (IAM is eventually consistent: until then the entity looks missing)
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, max_tps=None, job_time=0.0, visibility_delay=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.max_tps = max_tps
+        self.calls = 0
+        self.throttled_calls = 0
+        self._recent_calls = collections.deque()
+        self._lock = threading.Lock()
+        self.users = {}
+        self.groups = {}
+        self.roles = {}
+        self.user_managed_policies = {}
+        self.group_managed_policies = {}
+        self.group_members = {}
+        self.role_managed_policies = {}
+        self.role_inline_policies = {}
+        self.managed_policies = {}
+        self.instance_profiles = {}
+        self.job_time = job_time
+        self.visibility_delay = visibility_delay
+        self._visible_at = {}
+        self.service_activity = {}
+        self.last_accessed_jobs = {}
+
+    def _round_trip(self):
+        with self._lock:
+            self.calls += 1
+            if self.max_tps:
+                now = time.monotonic()
+                while self._recent_calls and now - self._recent_calls[0] >= 1.0:
+                    self._recent_calls.popleft()
+                if len(self._recent_calls) >= self.max_tps:
+                    self.throttled_calls += 1
+                    raise _client_error('Throttling', 'Rate exceeded', 'IAM')
+                self._recent_calls.append(now)
+        delay = self.latency + (random.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    def _arn(self, kind, path, name):
+        return f"arn:aws:iam::{FAKE_ACCOUNT_ID}:{kind}{path}{name}"
+
+    def _require(self, entities, kind, name, operation_name):
+        if name not in entities:
+            raise _client_error('NoSuchEntity', f"The {kind} with name {name} cannot be found.", operation_name)
+
+    def _attach(self, entities, attached, kind, name, policy_arn, operation_name):
+        self._round_trip()
+        with self._lock:
+            self._require(entities, kind, name, operation_name)
+            if not policy_arn.startswith('arn:aws:iam::'):
+                raise _client_error('InvalidInput', f"ARN {policy_arn} is not valid.", operation_name)
+            attached[name].add(policy_arn)
+        return {}
+
+    def _detach(self, entities, attached, kind, name, policy_arn, operation_name):
+        self._round_trip()
+        with self._lock:
+            self._require(entities, kind, name, operation_name)
+            if policy_arn not in attached[name]:
+                raise _client_error('NoSuchEntity', f"Policy {policy_arn} was not found.", operation_name)
+            attached[name].discard(policy_arn)
+        return {}
+
+    def _list_attached(self, entities, attached, kind, name, operation_name, Marker=None, MaxItems=100):
+        self._round_trip()
+        with self._lock:
+            self._require(entities, kind, name, operation_name)
+            policies = [{'PolicyName': arn.rsplit('/', 1)[-1], 'PolicyArn': arn} for arn in sorted(attached[name])]
+        start = int(Marker) if Marker else 0
+        end = start + MaxItems
+        page = {'AttachedPolicies': policies[start:end], 'IsTruncated': end < len(policies)}
+        if page['IsTruncated']:
+            page['Marker'] = str(end)
+        return page
+
+    def _page(self, entities, result_key, PathPrefix='/', Marker=None, MaxItems=100):
+        """Return one page the way the IAM list_* calls do (sorted by name, Marker is an offset)"""
+        with self._lock:
+            matching = [e for _, e in sorted(entities.items()) if e['Path'].startswith(PathPrefix)]
+            start = int(Marker) if Marker else 0
+            end = start + MaxItems
+            # Only the returned entities are copied, so paging through 10k roles stays cheap
+            page = {result_key: [dict(e) for e in matching[start:end]], 'IsTruncated': end < len(matching)}
+        if page['IsTruncated']:
+            page['Marker'] = str(end)
+        return page
+
+    def _created(self, kind, name):
+        if self.visibility_delay:
+            self._visible_at[(kind, name)] = time.monotonic() + self.visibility_delay
+
+    def _hidden(self, kind, name):
+        """True while a new entity is not visible yet (simulated eventual consistency)"""
+        return time.monotonic() < self._visible_at.get((kind, name), 0.0)
+
+    def _require_visible(self, entities, kind, name, operation_name):
+        self._require(entities, kind, name, operation_name)
+        if self._hidden(kind, name):
+            raise _client_error('NoSuchEntity', f"The {kind} with name {name} cannot be found.", operation_name)
+
+    def add_managed_policy(self, policy_arn, document, version_id='v1'):
+        """Seed a managed policy document (not an IAM call); a new version_id becomes the default version"""
+        with self._lock:
+            versions = self.managed_policies.get(policy_arn, {}).get('Versions', {})
+            versions[version_id] = document
+            self.managed_policies[policy_arn] = {'Document': document, 'VersionId': version_id,
+                                                 'Versions': versions}
+
+    # Users
+
+    def create_user(self, UserName, Path='/', **kwargs):
+        self._round_trip()
+        with self._lock:
+            if UserName in self.users:
+                raise _client_error('EntityAlreadyExists', f"User with name {UserName} already exists.", 'CreateUser')
+            user = {
+                'Path': Path,
+                'UserName': UserName,
+                'UserId': f"AIDA{len(self.users):017d}",
+                'Arn': self._arn('user', Path, UserName),
+                'CreateDate': self._now()
+            }
+            self.users[UserName] = user
+            self.user_managed_policies[UserName] = set()
+        return {'User': dict(user)}
+
+    def list_users(self, PathPrefix='/', Marker=None, MaxItems=100):
+        self._round_trip()
+        return self._page(self.users, 'Users', PathPrefix, Marker, MaxItems)
+
+    def attach_user_policy(self, UserName, PolicyArn):
+        return self._attach(self.users, self.user_managed_policies, 'user', UserName, PolicyArn, 'AttachUserPolicy')
+
+    def list_attached_user_policies(self, UserName, Marker=None, MaxItems=100):
+        return self._list_attached(self.users, self.user_managed_policies, 'user', UserName,
+                                   'ListAttachedUserPolicies', Marker, MaxItems)
+
+    def detach_user_policy(self, UserName, PolicyArn):
+        return self._detach(self.users, self.user_managed_policies, 'user', UserName, PolicyArn, 'DetachUserPolicy')
+
+    def list_groups_for_user(self, UserName, Marker=None, MaxItems=100):
+        self._round_trip()
+        with self._lock:
+            self._require(self.users, 'user', UserName, 'ListGroupsForUser')
+            groups = {name: group for name, group in self.groups.items() if UserName in self.group_members[name]}
+        return self._page(groups, 'Groups', '/', Marker, MaxItems)
+
+    # Groups
+
+    def create_group(self, GroupName, Path='/'):
+        self._round_trip()
+        with self._lock:
+            if GroupName in self.groups:
+                raise _client_error('EntityAlreadyExists', f"Group with name {GroupName} already exists.",
+                                    'CreateGroup')
+            group = {
+                'Path': Path,
+                'GroupName': GroupName,
+                'GroupId': f"AGPA{len(self.groups):017d}",
+                'Arn': self._arn('group', Path, GroupName),
+                'CreateDate': self._now()
+            }
+            self.groups[GroupName] = group
+            self.group_managed_policies[GroupName] = set()
+            self.group_members[GroupName] = set()
+        return {'Group': dict(group)}
+
+    def list_groups(self, PathPrefix='/', Marker=None, MaxItems=100):
+        self._round_trip()
+        return self._page(self.groups, 'Groups', PathPrefix, Marker, MaxItems)
+
+    def attach_group_policy(self, GroupName, PolicyArn):
+        return self._attach(self.groups, self.group_managed_policies, 'group', GroupName, PolicyArn,
+                            'AttachGroupPolicy')
+
+    def list_attached_group_policies(self, GroupName, Marker=None, MaxItems=100):
+        return self._list_attached(self.groups, self.group_managed_policies, 'group', GroupName,
+                                   'ListAttachedGroupPolicies', Marker, MaxItems)
+
+    def detach_group_policy(self, GroupName, PolicyArn):
+        return self._detach(self.groups, self.group_managed_policies, 'group', GroupName, PolicyArn,
+                            'DetachGroupPolicy')
+
+    def add_user_to_group(self, GroupName, UserName):
+        self._round_trip()
+        with self._lock:
+            self._require(self.groups, 'group', GroupName, 'AddUserToGroup')
+            self._require(self.users, 'user', UserName, 'AddUserToGroup')
+            self.group_members[GroupName].add(UserName)
+        return {}
+
+    def remove_user_from_group(self, GroupName, UserName):
+        self._round_trip()
+        with self._lock:
+            self._require(self.groups, 'group', GroupName, 'RemoveUserFromGroup')
+            self._require(self.users, 'user', UserName, 'RemoveUserFromGroup')
+            self.group_members[GroupName].discard(UserName)
+        return {}
+
+    def get_group(self, GroupName, Marker=None, MaxItems=100):
+        self._round_trip()
+        with self._lock:
+            self._require(self.groups, 'group', GroupName, 'GetGroup')
+            group = dict(self.groups[GroupName])
+            members = {name: self.users[name] for name in self.group_members[GroupName]}
+        page = self._page(members, 'Users', '/', Marker, MaxItems)
+        page['Group'] = group
+        return page
+
+    # Roles
+
+    def create_role(self, RoleName, AssumeRolePolicyDocument, Path='/', Description=None, **kwargs):
+        self._round_trip()
+        with self._lock:
+            if RoleName in self.roles:
+                raise _client_error('EntityAlreadyExists', f"Role with name {RoleName} already exists.", 'CreateRole')
+            role = {
+                'Path': Path,
+                'RoleName': RoleName,
+                'RoleId': f"AROA{len(self.roles):017d}",
+                'Arn': self._arn('role', Path, RoleName),
+                'CreateDate': self._now(),
+                # boto3 hands policy documents back already decoded
+                'AssumeRolePolicyDocument': json.loads(AssumeRolePolicyDocument)
+            }
+            if Description:
+                role['Description'] = Description
+            self.roles[RoleName] = role
+            self._created('role', RoleName)
+            self.role_managed_policies[RoleName] = set()
+            self.role_inline_policies[RoleName] = {}
+        return {'Role': dict(role)}
+
+    def get_role(self, RoleName):
+        self._round_trip()
+        with self._lock:
+            self._require_visible(self.roles, 'role', RoleName, 'GetRole')
+            return {'Role': dict(self.roles[RoleName])}
+
+    def list_roles(self, PathPrefix='/', Marker=None, MaxItems=100):
+        self._round_trip()
+        with self._lock:
+            roles = {name: role for name, role in self.roles.items() if not self._hidden('role', name)}
+        return self._page(roles, 'Roles', PathPrefix, Marker, MaxItems)
+
+    def attach_role_policy(self, RoleName, PolicyArn):
+        if self._hidden('role', RoleName):
+            self._round_trip()
+            raise _client_error('NoSuchEntity', f"The role with name {RoleName} cannot be found.", 'AttachRolePolicy')
+        return self._attach(self.roles, self.role_managed_policies, 'role', RoleName, PolicyArn, 'AttachRolePolicy')
+
+    def list_attached_role_policies(self, RoleName, Marker=None, MaxItems=100):
+        return self._list_attached(self.roles, self.role_managed_policies, 'role', RoleName,
+                                   'ListAttachedRolePolicies', Marker, MaxItems)
+
+    def detach_role_policy(self, RoleName, PolicyArn):
+        return self._detach(self.roles, self.role_managed_policies, 'role', RoleName, PolicyArn, 'DetachRolePolicy')
+
+    def put_role_policy(self, RoleName, PolicyName, PolicyDocument):
+        self._round_trip()
+        with self._lock:
+            self._require(self.roles, 'role', RoleName, 'PutRolePolicy')
+            self.role_inline_policies[RoleName][PolicyName] = json.loads(PolicyDocument)
+        return {}
+
+    def get_role_policy(self, RoleName, PolicyName):
+        self._round_trip()
+        with self._lock:
+            self._require(self.roles, 'role', RoleName, 'GetRolePolicy')
+            if PolicyName not in self.role_inline_policies[RoleName]:
+                raise _client_error('NoSuchEntity', f"The role policy with name {PolicyName} cannot be found.",
+                                    'GetRolePolicy')
+            document = self.role_inline_policies[RoleName][PolicyName]
+        return {'RoleName': RoleName, 'PolicyName': PolicyName, 'PolicyDocument': document}
+
+    def list_role_policies(self, RoleName, Marker=None, MaxItems=100):
+        self._round_trip()
+        with self._lock:
+            self._require(self.roles, 'role', RoleName, 'ListRolePolicies')
+            names = sorted(self.role_inline_policies[RoleName])
+        start = int(Marker) if Marker else 0
+        end = start + MaxItems
+        page = {'PolicyNames': names[start:end], 'IsTruncated': end < len(names)}
+        if page['IsTruncated']:
+            page['Marker'] = str(end)
+        return page
+
+    def delete_role_policy(self, RoleName, PolicyName):
+        self._round_trip()
+        with self._lock:
+            self._require(self.roles, 'role', RoleName, 'DeleteRolePolicy')
+            if self.role_inline_policies[RoleName].pop(PolicyName, None) is None:
+                raise _client_error('NoSuchEntity', f"The role policy with name {PolicyName} cannot be found.",
+                                    'DeleteRolePolicy')
+        return {}
+
+    def update_assume_role_policy(self, RoleName, PolicyDocument):
+        self._round_trip()
+        with self._lock:
+            self._require(self.roles, 'role', RoleName, 'UpdateAssumeRolePolicy')
+            self.roles[RoleName]['AssumeRolePolicyDocument'] = json.loads(PolicyDocument)
+        return {}
+
+    def delete_role(self, RoleName):
+        self._round_trip()
+        with self._lock:
+            self._require(self.roles, 'role', RoleName, 'DeleteRole')
+            in_profile = any(RoleName in p['Roles'] for p in self.instance_profiles.values())
+            if self.role_managed_policies[RoleName] or self.role_inline_policies[RoleName] or in_profile:
+                raise _client_error('DeleteConflict', "Cannot delete entity, must detach all policies first.",
+                                    'DeleteRole')
+            del self.roles[RoleName]
+            del self.role_managed_policies[RoleName]
+            del self.role_inline_policies[RoleName]
+        return {}
+
+    # Instance profiles
+
+    def _instance_profile_view(self, profile):
+        roles = [dict(self.roles[name]) for name in profile['Roles']
+                 if name in self.roles and not self._hidden('instance profile role', profile['InstanceProfileName'])]
+        return dict(profile, Roles=roles)
+
+    def create_instance_profile(self, InstanceProfileName, Path='/', **kwargs):
+        self._round_trip()
+        with self._lock:
+            if InstanceProfileName in self.instance_profiles:
+                raise _client_error('EntityAlreadyExists', f"Instance Profile {InstanceProfileName} already exists.",
+                                    'CreateInstanceProfile')
+            profile = {
+                'Path': Path,
+                'InstanceProfileName': InstanceProfileName,
+                'InstanceProfileId': f"AIPA{len(self.instance_profiles):017d}",
+                'Arn': self._arn('instance-profile', Path, InstanceProfileName),
+                'CreateDate': self._now(),
+                'Roles': []
+            }
+            self.instance_profiles[InstanceProfileName] = profile
+            self._created('instance profile', InstanceProfileName)
+            return {'InstanceProfile': self._instance_profile_view(profile)}
+
+    def get_instance_profile(self, InstanceProfileName):
+        self._round_trip()
+        with self._lock:
+            self._require_visible(self.instance_profiles, 'instance profile', InstanceProfileName,
+                                  'GetInstanceProfile')
+            return {'InstanceProfile': self._instance_profile_view(self.instance_profiles[InstanceProfileName])}
+
+    def add_role_to_instance_profile(self, InstanceProfileName, RoleName):
+        self._round_trip()
+        with self._lock:
+            self._require_visible(self.instance_profiles, 'instance profile', InstanceProfileName,
+                                  'AddRoleToInstanceProfile')
+            self._require_visible(self.roles, 'role', RoleName, 'AddRoleToInstanceProfile')
+            if self.instance_profiles[InstanceProfileName]['Roles']:
+                raise _client_error('LimitExceeded', "Cannot exceed quota for InstanceSessionsPerInstanceProfile: 1",
+                                    'AddRoleToInstanceProfile')
+            self.instance_profiles[InstanceProfileName]['Roles'].append(RoleName)
+            self._created('instance profile role', InstanceProfileName)
+        return {}
+
+    def list_instance_profiles(self, PathPrefix='/', Marker=None, MaxItems=100):
+        self._round_trip()
+        with self._lock:
+            profiles = {name: self._instance_profile_view(p) for name, p in self.instance_profiles.items()
+                        if not self._hidden('instance profile', name)}
+        return self._page(profiles, 'InstanceProfiles', PathPrefix, Marker, MaxItems)
+
+    def remove_role_from_instance_profile(self, InstanceProfileName, RoleName):
+        self._round_trip()
+        with self._lock:
+            self._require(self.instance_profiles, 'instance profile', InstanceProfileName,
+                          'RemoveRoleFromInstanceProfile')
+            roles = self.instance_profiles[InstanceProfileName]['Roles']
+            if RoleName not in roles:
+                raise _client_error('NoSuchEntity', f"The role with name {RoleName} cannot be found.",
+                                    'RemoveRoleFromInstanceProfile')
+            roles.remove(RoleName)
+        return {}
+
+    def delete_instance_profile(self, InstanceProfileName):
+        self._round_trip()
+        with self._lock:
+            self._require(self.instance_profiles, 'instance profile', InstanceProfileName, 'DeleteInstanceProfile')
+            if self.instance_profiles[InstanceProfileName]['Roles']:
+                raise _client_error('DeleteConflict',
+                                    "Cannot delete entity, must remove roles from instance profile first.",
+                                    'DeleteInstanceProfile')
+            del self.instance_profiles[InstanceProfileName]
+        return {}
+
+    def list_instance_profiles_for_role(self, RoleName, Marker=None, MaxItems=100):
+        self._round_trip()
+        with self._lock:
+            self._require(self.roles, 'role', RoleName, 'ListInstanceProfilesForRole')
+            profiles = {name: self._instance_profile_view(p) for name, p in self.instance_profiles.items()
+                        if RoleName in p['Roles']}
+        return self._page(profiles, 'InstanceProfiles', '/', Marker, MaxItems)
+
+    # Managed policies
+
+    def get_policy(self, PolicyArn):
+        self._round_trip()
+        with self._lock:
+            policy = self.managed_policies.get(PolicyArn)
+            if policy is None:
+                raise _client_error('NoSuchEntity', f"Policy {PolicyArn} was not found.", 'GetPolicy')
+            all_attached = [self.user_managed_policies, self.group_managed_policies, self.role_managed_policies]
+            count = sum(1 for attached_sets in all_attached for arns in attached_sets.values() if PolicyArn in arns)
+            return {'Policy': {
+                'PolicyName': PolicyArn.rsplit('/', 1)[-1],
+                'Arn': PolicyArn,
+                'Path': '/',
+                'DefaultVersionId': policy['VersionId'],
+                'AttachmentCount': count,
+                'IsAttachable': True
+            }}
+
+    def get_policy_version(self, PolicyArn, VersionId):
+        self._round_trip()
+        with self._lock:
+            policy = self.managed_policies.get(PolicyArn)
+            if policy is None or VersionId not in policy['Versions']:
+                raise _client_error('NoSuchEntity', f"Policy {PolicyArn} version {VersionId} does not exist.",
+                                    'GetPolicyVersion')
+            return {'PolicyVersion': {'Document': policy['Versions'][VersionId], 'VersionId': VersionId,
+                                      'IsDefaultVersion': VersionId == policy['VersionId']}}
+
+    # Access advisor
+
+    def add_service_activity(self, arn, service_namespace, last_authenticated):
+        """Seed when an entity last used a service (not an IAM call); datetime, or None for never"""
+        with self._lock:
+            self.service_activity.setdefault(arn, {})[service_namespace] = last_authenticated
+
+    def _granted_namespaces(self, role_name):
+        documents = [self.managed_policies[arn]['Document'] for arn in self.role_managed_policies[role_name]
+                     if arn in self.managed_policies]
+        documents += list(self.role_inline_policies[role_name].values())
+        namespaces = set()
+        for document in documents:
+            statements = document['Statement'] if isinstance(document['Statement'], list) else [document['Statement']]
+            for statement in statements:
+                if statement.get('Effect') != 'Allow':
+                    continue
+                actions = statement.get('Action', [])
+                for action in actions if isinstance(actions, list) else [actions]:
+                    if ':' in action:
+                        namespaces.add(action.split(':', 1)[0].lower())
+        return namespaces
+
+    def generate_service_last_accessed_details(self, Arn, Granularity='SERVICE_LEVEL'):
+        self._round_trip()
+        with self._lock:
+            role_name = next((name for name, role in self.roles.items() if role['Arn'] == Arn), None)
+            if role_name is None:
+                raise _client_error('NoSuchEntity', f"The entity {Arn} cannot be found.",
+                                    'GenerateServiceLastAccessedDetails')
+            activity = self.service_activity.get(Arn, {})
+            services = [{
+                'ServiceName': namespace.upper(),
+                'ServiceNamespace': namespace,
+                'LastAuthenticated': activity.get(namespace),
+                'TotalAuthenticatedEntities': 1 if activity.get(namespace) else 0
+            } for namespace in sorted(self._granted_namespaces(role_name))]
+            job_id = str(uuid.uuid4())
+            self.last_accessed_jobs[job_id] = {'created': self._now(), 'ready_at': time.monotonic() + self.job_time,
+                                               'services': services}
+        return {'JobId': job_id}
+
+    def get_service_last_accessed_details(self, JobId, MaxItems=100, Marker=None):
+        self._round_trip()
+        with self._lock:
+            job = self.last_accessed_jobs.get(JobId)
+            if job is None:
+                raise _client_error('NoSuchEntity', f"Job {JobId} cannot be found.", 'GetServiceLastAccessedDetails')
+        page = {'JobCreationDate': job['created'], 'ServicesLastAccessed': [], 'IsTruncated': False}
+        if time.monotonic() < job['ready_at']:
+            return dict(page, JobStatus='IN_PROGRESS')
+
+        start = int(Marker) if Marker else 0
+        end = start + MaxItems
+        services = [{k: v for k, v in service.items() if v is not None} for service in job['services'][start:end]]
+        page.update(JobStatus='COMPLETED', JobCompletionDate=self._now(), ServicesLastAccessed=services,
+                    IsTruncated=end < len(job['services']))
+        if page['IsTruncated']:
+            page['Marker'] = str(end)
+        return page
+
+    # Account
+
+    def get_account_authorization_details(self, Filter=None, Marker=None, MaxItems=100):
+        self._round_trip()
+        sections = Filter or ['User', 'Role', 'Group', 'LocalManagedPolicy', 'AWSManagedPolicy']
+
+        def attached(arns):
+            return [{'PolicyName': arn.rsplit('/', 1)[-1], 'PolicyArn': arn} for arn in sorted(arns)]
+
+        entries = []
+        with self._lock:
+            if 'User' in sections:
+                for name, user in sorted(self.users.items()):
+                    groups = sorted(g for g, members in self.group_members.items() if name in members)
+                    entries.append(('UserDetailList', dict(user, GroupList=groups, UserPolicyList=[],
+                                    AttachedManagedPolicies=attached(self.user_managed_policies[name]))))
+            if 'Group' in sections:
+                for name, group in sorted(self.groups.items()):
+                    entries.append(('GroupDetailList', dict(group, GroupPolicyList=[],
+                                    AttachedManagedPolicies=attached(self.group_managed_policies[name]))))
+            if 'Role' in sections:
+                for name, role in sorted(self.roles.items()):
+                    inline = [{'PolicyName': p, 'PolicyDocument': d}
+                              for p, d in sorted(self.role_inline_policies[name].items())]
+                    profiles = [dict(p, Roles=[dict(role)]) for _, p in sorted(self.instance_profiles.items())
+                                if name in p['Roles']]
+                    entries.append(('RoleDetailList', dict(role, RolePolicyList=inline, InstanceProfileList=profiles,
+                                    AttachedManagedPolicies=attached(self.role_managed_policies[name]))))
+            all_attached = [self.user_managed_policies, self.group_managed_policies, self.role_managed_policies]
+            for arn, policy in sorted(self.managed_policies.items()):
+                section = 'AWSManagedPolicy' if ':aws:policy/' in arn else 'LocalManagedPolicy'
+                if section not in sections:
+                    continue
+                count = sum(1 for attached_sets in all_attached for arns in attached_sets.values() if arn in arns)
+                entries.append(('Policies', {
+                    'PolicyName': arn.rsplit('/', 1)[-1],
+                    'Arn': arn,
+                    'Path': '/',
+                    'DefaultVersionId': policy['VersionId'],
+                    'AttachmentCount': count,
+                    'IsAttachable': True,
+                    'PolicyVersionList': [{'Document': policy['Document'], 'VersionId': policy['VersionId'],
+                                           'IsDefaultVersion': True}]
+                }))
+
+        start = int(Marker) if Marker else 0
+        end = start + MaxItems
+        page = {'UserDetailList': [], 'GroupDetailList': [], 'RoleDetailList': [], 'Policies': [],
+                'IsTruncated': end < len(entries)}
+        for key, entry in entries[start:end]:
+            page[key].append(entry)
+        if page['IsTruncated']:
+            page['Marker'] = str(end)
+        return page
@@ -0,0 +1,340 @@
+### Local IAM inventory cache
+### Keeps the roles, users and groups of an account (and their attached managed policies) in a SQLite file,
+### so "does this entity already exist?" is answered from disk in microseconds instead of an IAM round trip.
+### Each kind of entity has its own TTL stamp and only stale kinds are listed again on refresh().
+
+import datetime
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_iam_client import get_credentials, get_iam_client
+from aws_iam_paginate import iter_items
+
+# Default folder for the inventory files (one file per access key)
+INVENTORY_DIR = os.path.join(os.path.expanduser('~'), '.aws_iam_inventory')
+
+# Seconds a listing stays fresh
+DEFAULT_TTL = 15 * 60
+
+# kind -> (list call, result key, name key, id key, attached policies call, name parameter)
+_KINDS = {
+    'role': ('list_roles', 'Roles', 'RoleName', 'RoleId', 'list_attached_role_policies', 'RoleName'),
+    'user': ('list_users', 'Users', 'UserName', 'UserId', 'list_attached_user_policies', 'UserName'),
+    'group': ('list_groups', 'Groups', 'GroupName', 'GroupId', 'list_attached_group_policies', 'GroupName'),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    arn TEXT NOT NULL,
+    entity_id TEXT,
+    create_date TEXT,
+    generation INTEGER NOT NULL,
+    policies_refreshed_at REAL,
+    PRIMARY KEY (kind, name)
+);
+CREATE INDEX IF NOT EXISTS entities_path ON entities (kind, path);
+CREATE INDEX IF NOT EXISTS entities_arn ON entities (arn);
+
+CREATE TABLE IF NOT EXISTS attached_policies (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    policy_arn TEXT NOT NULL,
+    PRIMARY KEY (kind, name, policy_arn)
+);
+CREATE INDEX IF NOT EXISTS attached_policies_arn ON attached_policies (policy_arn);
+
+CREATE TABLE IF NOT EXISTS listings (
+    kind TEXT PRIMARY KEY,
+    refreshed_at REAL NOT NULL,
+    generation INTEGER NOT NULL
+);
+"""
+
+
+def _as_text(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+class IAMInventory:
+    """
+    SQLite-backed cache of the IAM roles, users and groups of one account
+
+    Args:
+        db_path (str): SQLite file to use (created if missing)
+        ttl (float): Seconds before a listing is considered stale
+        iam: Optional IAM client used to refresh (defaults to the shared client from the .env credentials)
+    """
+
+    def __init__(self, db_path, ttl=DEFAULT_TTL, iam=None):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._iam = iam
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+
+    @property
+    def iam(self):
+        if self._iam is None:
+            self._iam = get_iam_client()
+        return self._iam
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Freshness
+
+    def _listing(self, kind):
+        return self._db.execute(
+            'SELECT refreshed_at, generation FROM listings WHERE kind = ?', (kind,)
+        ).fetchone()
+
+    def is_fresh(self, kind):
+        """True if `kind` was listed less than `ttl` seconds ago"""
+        with self._lock:
+            listing = self._listing(kind)
+        return listing is not None and time.time() - listing[0] < self.ttl
+
+    def invalidate(self, kind=None):
+        """Mark one kind (or every kind) as stale so the next refresh() lists it again"""
+        with self._lock, self._db:
+            if kind is None:
+                self._db.execute('UPDATE listings SET refreshed_at = 0')
+            else:
+                self._db.execute('UPDATE listings SET refreshed_at = 0 WHERE kind = ?', (kind,))
+
+    # Refresh
+
+    def refresh(self, kinds=('role', 'user', 'group'), force=False, include_policies=False, max_workers=10):
+        """
+        List again every kind whose cache is stale (or all of them with force=True)
+
+        Entities are streamed page by page into SQLite; anything not seen in the new listing is removed.
+
+        Args:
+            kinds (tuple): Any of 'role', 'user', 'group'
+            force (bool): Refresh even if the cached listing is still fresh
+            include_policies (bool): Also refresh attached managed policies (see refresh_policies)
+            max_workers (int): Parallel calls used for the attached policies
+
+        Returns:
+            dict: Number of entities cached per refreshed kind
+        """
+        refreshed = {}
+        for kind in kinds:
+            if not force and self.is_fresh(kind):
+                continue
+            list_call, result_key, name_key, id_key, _, _ = _KINDS[kind]
+
+            with self._lock:
+                listing = self._listing(kind)
+            generation = (listing[1] if listing else 0) + 1
+
+            count = 0
+            batch = []
+            for entity in iter_items(getattr(self.iam, list_call), result_key, MaxItems=1000):
+                batch.append((kind, entity[name_key], entity['Path'], entity['Arn'], entity.get(id_key),
+                              _as_text(entity.get('CreateDate')), generation))
+                if len(batch) >= 500:
+                    self._upsert(batch)
+                    count += len(batch)
+                    batch = []
+            self._upsert(batch)
+            count += len(batch)
+
+            with self._lock, self._db:
+                self._db.execute('DELETE FROM attached_policies WHERE kind = ? AND name IN '
+                                 '(SELECT name FROM entities WHERE kind = ? AND generation < ?)',
+                                 (kind, kind, generation))
+                self._db.execute('DELETE FROM entities WHERE kind = ? AND generation < ?', (kind, generation))
+                self._db.execute('INSERT OR REPLACE INTO listings (kind, refreshed_at, generation) VALUES (?, ?, ?)',
+                                 (kind, time.time(), generation))
+            refreshed[kind] = count
+
+            if include_policies:
+                self.refresh_policies(kind, max_workers=max_workers)
+        return refreshed
+
+    def _upsert(self, rows):
+        if not rows:
+            return
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT INTO entities (kind, name, path, arn, entity_id, create_date, generation) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (kind, name) DO UPDATE SET path = excluded.path, arn = excluded.arn, '
+                'entity_id = excluded.entity_id, create_date = excluded.create_date, generation = excluded.generation',
+                rows
+            )
+
+    def refresh_policies(self, kind, force=False, max_workers=10):
+        """
+        Fetch the attached managed policies of every cached entity of `kind`
+
+        Only entities whose policies were never fetched, or were fetched more than `ttl` seconds ago,
+        are asked for again. The calls run concurrently.
+
+        Returns:
+            int: Number of entities whose policies were fetched
+        """
+        _, _, _, _, attached_call, name_param = _KINDS[kind]
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            if force:
+                names = [r[0] for r in self._db.execute('SELECT name FROM entities WHERE kind = ?', (kind,))]
+            else:
+                names = [r[0] for r in self._db.execute(
+                    'SELECT name FROM entities WHERE kind = ? AND '
+                    '(policies_refreshed_at IS NULL OR policies_refreshed_at < ?)', (kind, cutoff))]
+        if not names:
+            return 0
+
+        list_attached = getattr(self.iam, attached_call)
+
+        def fetch(name):
+            arns = [p['PolicyArn'] for p in iter_items(list_attached, 'AttachedPolicies', prefetch=False,
+                                                       **{name_param: name})]
+            self.record_policies(kind, name, arns)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(names)))) as executor:
+            list(executor.map(fetch, names))
+        return len(names)
+
+    # Write-through updates from the create helpers
+
+    def record(self, kind, name, path='/', arn='', entity_id=None, create_date=None):
+        """Add (or update) one entity right after it was created"""
+        with self._lock, self._db:
+            listing = self._listing(kind)
+            generation = listing[1] if listing else 0
+            self._db.execute(
+                'INSERT INTO entities (kind, name, path, arn, entity_id, create_date, generation) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (kind, name) DO UPDATE SET path = excluded.path, arn = excluded.arn, '
+                'entity_id = excluded.entity_id, create_date = excluded.create_date',
+                (kind, name, path, arn, entity_id, _as_text(create_date), generation)
+            )
+
+    def record_response(self, kind, response):
+        """Record the entity returned by create_role / create_user / create_group"""
+        _, _, name_key, id_key, _, _ = _KINDS[kind]
+        entity = response[kind.capitalize()]
+        self.record(kind, entity[name_key], entity['Path'], entity['Arn'], entity.get(id_key),
+                    entity.get('CreateDate'))
+
+    def record_policies(self, kind, name, policy_arns):
+        """Replace the cached attached managed policies of one entity"""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM attached_policies WHERE kind = ? AND name = ?', (kind, name))
+            self._db.executemany('INSERT OR IGNORE INTO attached_policies (kind, name, policy_arn) VALUES (?, ?, ?)',
+                                 [(kind, name, arn) for arn in policy_arns])
+            self._db.execute('UPDATE entities SET policies_refreshed_at = ? WHERE kind = ? AND name = ?',
+                             (time.time(), kind, name))
+
+    def record_policy(self, kind, name, policy_arn):
+        """Add one attached managed policy to an entity"""
+        with self._lock, self._db:
+            self._db.execute('INSERT OR IGNORE INTO attached_policies (kind, name, policy_arn) VALUES (?, ?, ?)',
+                             (kind, name, policy_arn))
+
+    def forget_policy(self, kind, name, policy_arn):
+        """Remove one attached managed policy from an entity"""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM attached_policies WHERE kind = ? AND name = ? AND policy_arn = ?',
+                             (kind, name, policy_arn))
+
+    def forget(self, kind, name):
+        """Remove one entity (e.g. after it was deleted)"""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM attached_policies WHERE kind = ? AND name = ?', (kind, name))
+            self._db.execute('DELETE FROM entities WHERE kind = ? AND name = ?', (kind, name))
+
+    # Queries
+
+    def exists(self, kind, name):
+        """
+        Check locally whether an entity exists
+
+        Returns:
+            True or False when the cached listing of `kind` is fresh, None when it is stale or missing
+            (the caller should then ask IAM, or call refresh() first)
+        """
+        with self._lock:
+            listing = self._listing(kind)
+            if listing is None or time.time() - listing[0] >= self.ttl:
+                return None
+            row = self._db.execute('SELECT 1 FROM entities WHERE kind = ? AND name = ?', (kind, name)).fetchone()
+        return row is not None
+
+    def get(self, kind, name):
+        """Return the cached entity as a dict, or None"""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT name, path, arn, entity_id, create_date FROM entities WHERE kind = ? AND name = ?',
+                (kind, name)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'name': row[0], 'path': row[1], 'arn': row[2], 'id': row[3], 'create_date': row[4]}
+
+    def names(self, kind, path_prefix='/'):
+        """Return the names of every cached entity of `kind` under a path"""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT name FROM entities WHERE kind = ? AND path >= ? AND path < ? ORDER BY name',
+                (kind, path_prefix, path_prefix + '\uffff')
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def attached_policies(self, kind, name):
+        """Return the cached managed policy ARNs attached to an entity"""
+        with self._lock:
+            rows = self._db.execute('SELECT policy_arn FROM attached_policies WHERE kind = ? AND name = ?',
+                                    (kind, name)).fetchall()
+        return [r[0] for r in rows]
+
+    def entities_with_policy(self, policy_arn, kind=None):
+        """Return (kind, name) for every cached entity that has a managed policy attached"""
+        query = 'SELECT kind, name FROM attached_policies WHERE policy_arn = ?'
+        params = [policy_arn]
+        if kind is not None:
+            query += ' AND kind = ?'
+            params.append(kind)
+        with self._lock:
+            return [tuple(r) for r in self._db.execute(query + ' ORDER BY kind, name', params)]
+
+
+def open_inventory(access_key=None, secret_key=None, region=None, ttl=DEFAULT_TTL):
+    """
+    Open the inventory file of the given (or .env) credentials
+
+    Every access key gets its own file under INVENTORY_DIR, so caches of different accounts never mix.
+    """
+    if access_key is None and secret_key is None:
+        access_key, secret_key, env_region = get_credentials()
+        region = region or env_region
+
+    iam = get_iam_client(access_key, secret_key, region)
+    key_hash = hashlib.sha256(access_key.encode('utf-8')).hexdigest()[:16]
+    return IAMInventory(os.path.join(INVENTORY_DIR, f"{key_hash}.sqlite3"), ttl=ttl, iam=iam)
@@ -0,0 +1,264 @@
+### Resumable bulk jobs
+### A job is a list of IAM calls (the changes of aws_iam_plan: create users, groups and roles, attach policies,
+### add users to groups...). Its journal is an append-only JSONL file: the whole plan is written first, then one
+### line before ("start") and one after ("end") every call, flushed to disk with fsync before the job goes on.
+### When a run dies halfway, resume replays only the calls that did not finish; calls interrupted mid-flight are
+### safe to repeat because an EntityAlreadyExists (or NoSuchEntity for a removal) then means "already done".
+### Usage: python aws_iam_journal.py run spec.json job.journal [--workers 10]     (spec format of aws_iam_plan)
+###        python aws_iam_journal.py run --users users.csv job.journal            (users file of aws_iam_create_user)
+###        python aws_iam_journal.py resume job.journal
+###        python aws_iam_journal.py status job.journal
+
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+
+from botocore.exceptions import ClientError
+
+from aws_iam_create_user import load_users
+from aws_iam_plan import apply_changes, describe_change, load_spec, plan_changes
+from aws_iam_validate import print_rejected, reject_invalid
+
+# Journal outcomes ('started' alone means the call was in flight when the run stopped)
+JOURNAL_STARTED = 'started'
+JOURNAL_DONE = 'done'
+JOURNAL_FAILED = 'failed'
+
+
+class JobJournal:
+    """
+    Append-only, fsync'd journal of one bulk job
+
+    Opening an existing journal replays it: `changes` is the job's plan and `status` the last known
+    outcome of every change. A line cut short by a crash at the end of the file is dropped.
+
+    Args:
+        path (str): Journal file (created if missing)
+        fsync (bool): Flush every record to disk before the call it describes goes on (group-committed
+            across threads); without it a crash of the machine, not just the process, can lose records
+    """
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self.job_id = None
+        self.changes = None
+        self.created_at = None
+        self.status = {}
+        self.errors = {}
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._written = 0
+        self._synced = 0
+        self._replay()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            lines = f.readlines()
+
+        valid_bytes = 0
+        for number, line in enumerate(lines, 1):
+            try:
+                # Every record ends with a newline; a last line without one was cut short, even if it parses
+                if not line.endswith(b'\n'):
+                    raise ValueError("missing newline")
+                record = json.loads(line)
+            except ValueError:
+                if number == len(lines):
+                    # Torn last write: cut it off so the next records start on a clean line
+                    with open(self.path, 'r+b') as f:
+                        f.truncate(valid_bytes)
+                    break
+                raise ValueError(f"{self.path} line {number} is corrupted")
+            valid_bytes += len(line)
+
+            if record['t'] == 'job':
+                self.job_id, self.changes, self.created_at = record['job'], record['changes'], record['at']
+            elif record['t'] == 'start':
+                self.status[record['i']] = JOURNAL_STARTED
+            elif record['t'] == 'end':
+                self.status[record['i']] = record['status']
+                if record.get('error'):
+                    self.errors[record['i']] = record['error']
+                else:
+                    self.errors.pop(record['i'], None)
+
+    def _append(self, record):
+        line = json.dumps(record, separators=(',', ':'), default=str) + '\n'
+        with self._write_lock:
+            self._file.write(line)
+            self._file.flush()
+            self._written += 1
+            sequence = self._written
+        if not self.fsync:
+            return
+        with self._sync_lock:
+            # One fsync covers every record written before it, so threads arriving together share it
+            if self._synced < sequence:
+                target = self._written
+                os.fsync(self._file.fileno())
+                self._synced = target
+
+    def start_job(self, changes):
+        """
+        Write the plan of a new job, or check that `changes` is the plan of the job being resumed
+
+        Raises:
+            ValueError: If the journal already holds a different job
+        """
+        if self.changes is not None:
+            if json.dumps(self.changes, sort_keys=True, default=str) != json.dumps(changes, sort_keys=True,
+                                                                                   default=str):
+                raise ValueError(f"{self.path} holds another job ({self.job_id}); use a new journal file")
+            return
+        self.job_id = uuid.uuid4().hex[:12]
+        self.changes = json.loads(json.dumps(changes, default=str))
+        self.created_at = time.time()
+        self._append({'t': 'job', 'job': self.job_id, 'at': self.created_at, 'changes': self.changes})
+
+    def record_start(self, index):
+        self._append({'t': 'start', 'i': index, 'at': time.time()})
+        self.status[index] = JOURNAL_STARTED
+
+    def record_end(self, index, status, error=None):
+        self._append({'t': 'end', 'i': index, 'status': status, 'error': error, 'at': time.time()})
+        self.status[index] = status
+        if error:
+            self.errors[index] = error
+
+    def completed(self):
+        """Indexes of the changes that are done"""
+        return {index for index, status in self.status.items() if status == JOURNAL_DONE}
+
+    def summary(self):
+        """Changes per state: done, failed, interrupted (started, no outcome) and pending (never started)"""
+        counts = {'done': 0, 'failed': 0, 'interrupted': 0, 'pending': 0}
+        for index in range(len(self.changes or [])):
+            status = self.status.get(index)
+            if status is None:
+                counts['pending'] += 1
+            elif status == JOURNAL_STARTED:
+                counts['interrupted'] += 1
+            else:
+                counts['done' if status == JOURNAL_DONE else 'failed'] += 1
+        return counts
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def bulk_changes(spec):
+    """
+    Plan every call needed to create what a spec describes, without reading the account first
+
+    The journal makes this safe: entities that already exist come back as EntityAlreadyExists and are
+    recorded as done. (Use aws_iam_plan instead to compare with the account and update existing ones.)
+
+    Args:
+        spec (dict): aws_iam_plan spec with 'users', 'groups' and 'roles'
+    """
+    for key in ('users', 'groups', 'roles'):
+        spec.setdefault(key, [])
+    return plan_changes(spec, {'user': {}, 'group': {}, 'role': {}})
+
+
+def run_job(journal_path, changes=None, iam=None, max_workers=10, inventory=None, fsync=True):
+    """
+    Run a bulk job, or resume the job of an existing journal
+
+    Args:
+        journal_path (str): Journal file; if it holds a job, only its unfinished changes are run
+        changes (list): Changes of a new job (aws_iam_plan format); None to resume the journal's job.
+            Changes failing the local pre-flight checks (aws_iam_validate), and those depending on them,
+            are left out of the job
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+        max_workers (int): Calls in flight
+        inventory (IAMInventory): Optional local cache updated with what was created/attached
+        fsync (bool): fsync every journal record
+
+    Returns:
+        dict: {'job_id', 'results' (apply_changes results, in plan order), 'replayed' (changes run now),
+               'rejected' (aws_iam_validate.reject_invalid items), 'seconds'}
+
+    Raises:
+        ValueError: If there is nothing to resume or the journal holds another job
+    """
+    start = time.perf_counter()
+    rejected = []
+    with JobJournal(journal_path, fsync) as journal:
+        if changes is not None:
+            changes, rejected = reject_invalid(changes)
+            journal.start_job(changes)
+        elif journal.changes is None:
+            raise ValueError(f"{journal_path} has no job to resume")
+        replayed = len(journal.changes) - len(journal.completed())
+        results = apply_changes(journal.changes, iam, max_workers, inventory, journal=journal)
+        return {'job_id': journal.job_id, 'results': results, 'replayed': replayed, 'rejected': rejected,
+                'seconds': time.perf_counter() - start}
+
+
+def print_job(job):
+    if job.get('rejected'):
+        print(f"❌ {len(job['rejected'])} changes rejected by the pre-flight checks (not run):")
+        print_rejected(job['rejected'])
+    results = job['results']
+    done = sum(1 for r in results if r['status'] == 'done')
+    print(f"📊 Job {job['job_id']}: {done}/{len(results)} changes done, {job['replayed']} run now "
+          f"({job['seconds']:.1f}s)")
+    for result in results:
+        if result['status'] != 'done':
+            print(f"   ❌ {describe_change(result['change'])} ({result['status']}: {result['error']})")
+
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run bulk IAM jobs that can be resumed after a failure")
+    parser.add_argument('command', choices=['run', 'resume', 'status'])
+    parser.add_argument('files', nargs='+', help="run: [spec] journal, resume/status: journal")
+    parser.add_argument('--users', help="CSV/JSONL users file (instead of a spec)")
+    parser.add_argument('--workers', type=int, default=10, help="Calls in flight")
+    args = parser.parse_args()
+    journal_file = args.files[-1]
+
+    if args.command == 'status':
+        with JobJournal(journal_file) as status_journal:
+            if status_journal.changes is None:
+                print(f"❌ {journal_file} has no job")
+                exit(1)
+            counts = status_journal.summary()
+            print(f"📋 Job {status_journal.job_id}: " + ', '.join(f"{n} {state}" for state, n in counts.items()))
+            for index, error in sorted(status_journal.errors.items()):
+                print(f"   ❌ {describe_change(status_journal.changes[index])}: {error}")
+        exit(0)
+
+    try:
+        job_changes = None
+        if args.command == 'run':
+            if args.users:
+                job_spec = {'users': [{'name': u['user_name'], 'path': u['path']} for u in load_users(args.users)]}
+            elif len(args.files) == 2:
+                job_spec = load_spec(args.files[0])
+            else:
+                parser.error("run needs a spec file or --users")
+            job_changes = bulk_changes(job_spec)
+            print(f"🚀 Running {len(job_changes)} changes, journaled in {journal_file}")
+        job = run_job(journal_file, job_changes, max_workers=args.workers)
+    except (ValueError, ClientError) as e:
+        print(f"❌ Error: {e}")
+        exit(1)
+
+    print_job(job)
+    exit(0 if all(r['status'] == 'done' for r in job['results']) and not job['rejected'] else 1)
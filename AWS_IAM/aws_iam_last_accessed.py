@@ -0,0 +1,250 @@
+### Unused permissions (service last accessed) for every role
+### generate_service_last_accessed_details only starts a job; its result has to be polled with
+### get_service_last_accessed_details until the job completes. Instead of one role at a time, analyze_roles keeps
+### many jobs outstanding: a single scheduler loop submits new jobs while there is room, polls every job that is
+### due (concurrently, with a backoff per job) and streams each finished role into a compact table.
+### All calls go through the shared throttled IAM client, so the rate adapts when IAM throttles.
+### Usage: python aws_iam_last_accessed.py [--path /service-role/] [--days 90] [--csv unused.csv]
+
+import argparse
+import collections
+import csv
+import datetime
+import random
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from aws_iam_client import get_iam_client
+from aws_iam_create_role import iter_roles
+from aws_iam_paginate import iter_items
+
+# Stored as the last access time of services the role never used
+NEVER_ACCESSED = 0.0
+
+# Job states of get_service_last_accessed_details
+JOB_IN_PROGRESS = 'IN_PROGRESS'
+JOB_COMPLETED = 'COMPLETED'
+JOB_FAILED = 'FAILED'
+
+
+class LastAccessedTable:
+    """
+    Service last-accessed data of many roles: one row per (role, service), stored in typed columns
+
+    Attributes:
+        roles (list): Role ARNs, in the order they were added
+        services (list): Service namespaces (e.g. 's3'); service_names maps them to display names
+        errors (dict): Role ARN -> why its job failed
+    """
+
+    def __init__(self):
+        self.roles = []
+        self.services = []
+        self.service_names = {}
+        self.errors = {}
+        self._role_ids = {}
+        self._service_ids = {}
+        self._role = array('I')
+        self._service = array('H')
+        self._last = array('d')
+
+    def __len__(self):
+        return len(self._role)
+
+    def _id(self, ids, values, value):
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(values)
+            values.append(value)
+        return index
+
+    def add(self, role_arn, services):
+        """
+        Add the result of a role's job
+
+        Args:
+            role_arn (str): Role the job ran for
+            services (list): ServicesLastAccessed entries of get_service_last_accessed_details
+        """
+        role = self._id(self._role_ids, self.roles, role_arn)
+        for service in services:
+            namespace = service['ServiceNamespace']
+            self.service_names.setdefault(namespace, service.get('ServiceName', namespace))
+            last = service.get('LastAuthenticated')
+            self._role.append(role)
+            self._service.append(self._id(self._service_ids, self.services, namespace))
+            self._last.append(last.timestamp() if last else NEVER_ACCESSED)
+
+    def rows(self):
+        """Yield {'role', 'service', 'last_accessed' (datetime or None)} for every row"""
+        for role, service, last in zip(self._role, self._service, self._last):
+            yield {'role': self.roles[role], 'service': self.services[service],
+                   'last_accessed': _as_datetime(last)}
+
+    def last_accessed(self, role_arn, service_namespace):
+        """When the role last used the service (None if never or not granted)"""
+        role, service = self._role_ids.get(role_arn), self._service_ids.get(service_namespace)
+        for i in range(len(self._role)):
+            if self._role[i] == role and self._service[i] == service:
+                return _as_datetime(self._last[i])
+        return None
+
+    def unused(self, days, now=None):
+        """
+        Services granted but not used in the last `days` days (or never)
+
+        Returns:
+            list: (role ARN, service namespace, last access datetime or None)
+        """
+        cutoff = (now or time.time()) - days * 86400
+        return [(self.roles[self._role[i]], self.services[self._service[i]], _as_datetime(self._last[i]))
+                for i in range(len(self._last)) if self._last[i] < cutoff]
+
+    def unused_by_role(self, days, now=None):
+        """Role ARN -> unused service namespaces (roles using all their services are left out)"""
+        by_role = {}
+        for role_arn, namespace, _ in self.unused(days, now):
+            by_role.setdefault(role_arn, []).append(namespace)
+        return by_role
+
+    def write_csv(self, path, days=None):
+        """Write every row (or only the unused ones, with days) as role,service,last_accessed"""
+        rows = self.unused(days) if days is not None else [(r['role'], r['service'], r['last_accessed'])
+                                                           for r in self.rows()]
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['role', 'service', 'last_accessed'])
+            for role_arn, namespace, last in rows:
+                writer.writerow([role_arn, namespace, last.isoformat() if last else 'never'])
+
+
+def _as_datetime(timestamp):
+    if timestamp == NEVER_ACCESSED:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+
+def analyze_roles(role_arns=None, path_prefix='/', max_outstanding=50, max_workers=10, poll_interval=1.0,
+                  max_poll_interval=30.0, timeout=3600.0, iam=None, table=None):
+    """
+    Run service-last-accessed jobs for many roles, many at a time
+
+    Args:
+        role_arns (list): Roles to analyze (default: every role under path_prefix)
+        path_prefix (str): Path of the roles to list when role_arns is None
+        max_outstanding (int): Jobs submitted but not finished at any time
+        max_workers (int): IAM calls in flight
+        poll_interval (float): Seconds before a new job is polled for the first time
+        max_poll_interval (float): Longest wait between two polls of a job (the wait doubles while it runs)
+        timeout (float): Seconds after which jobs still running are given up (recorded in table.errors)
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+        table (LastAccessedTable): Table to add the results to (default: a new one)
+
+    Returns:
+        LastAccessedTable: One row per role and granted service; failed roles in its errors
+    """
+    if iam is None:
+        iam = get_iam_client()
+    if table is None:
+        table = LastAccessedTable()
+    if role_arns is None:
+        role_arns = [role['Arn'] for role in iter_roles(path_prefix, iam=iam)]
+
+    def submit(role_arn):
+        try:
+            return role_arn, iam.generate_service_last_accessed_details(Arn=role_arn)['JobId'], None
+        except ClientError as e:
+            return role_arn, None, str(e)
+
+    def poll(job_id):
+        try:
+            page = iam.get_service_last_accessed_details(JobId=job_id)
+            if page['JobStatus'] == JOB_FAILED:
+                return job_id, JOB_FAILED, None, page.get('Error', {}).get('Message', 'job failed')
+            services = list(page['ServicesLastAccessed'])
+            if page['JobStatus'] == JOB_COMPLETED and page.get('IsTruncated'):
+                services += iter_items(iam.get_service_last_accessed_details, 'ServicesLastAccessed',
+                                       prefetch=False, JobId=job_id, Marker=page['Marker'])
+            return job_id, page['JobStatus'], services, None
+        except ClientError as e:
+            return job_id, JOB_FAILED, None, str(e)
+
+    queue = collections.deque(dict.fromkeys(role_arns))
+    jobs = {}  # job id -> (role ARN, next poll time, current interval)
+    deadline = time.monotonic() + timeout
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while queue or jobs:
+            batch = [queue.popleft() for _ in range(min(len(queue), max_outstanding - len(jobs)))]
+            submitted_at = time.monotonic()
+            for role_arn, job_id, error in executor.map(submit, batch):
+                if job_id is None:
+                    table.errors[role_arn] = error
+                else:
+                    jobs[job_id] = (role_arn, submitted_at + poll_interval, poll_interval)
+
+            now = time.monotonic()
+            due = [job_id for job_id, (_, next_poll, _) in jobs.items() if next_poll <= now]
+            for job_id, status, services, error in executor.map(poll, due):
+                role_arn, _, interval = jobs[job_id]
+                if status == JOB_IN_PROGRESS:
+                    interval = min(interval * 2, max_poll_interval)
+                    # Jitter keeps jobs submitted together from being polled in bursts
+                    jobs[job_id] = (role_arn, time.monotonic() + interval * random.uniform(0.8, 1.2), interval)
+                    continue
+                del jobs[job_id]
+                if status == JOB_COMPLETED:
+                    table.add(role_arn, services)
+                else:
+                    table.errors[role_arn] = error
+
+            if time.monotonic() > deadline:
+                for role_arn, _, _ in jobs.values():
+                    table.errors[role_arn] = f"job still running after {timeout:.0f}s"
+                for role_arn in queue:
+                    table.errors[role_arn] = "not analyzed before the timeout"
+                break
+            if jobs and (not queue or len(jobs) >= max_outstanding):
+                next_poll = min(next_poll for _, next_poll, _ in jobs.values())
+                time.sleep(max(0.0, next_poll - time.monotonic()))
+    return table
+
+
+def print_unused(table, days):
+    by_role = table.unused_by_role(days)
+    for role_arn in table.roles:
+        if role_arn in by_role:
+            print(f"📋 {role_arn.rsplit('/', 1)[-1]}: unused {', '.join(sorted(by_role[role_arn]))}")
+    for role_arn, error in sorted(table.errors.items()):
+        print(f"❌ {role_arn}: {error}")
+    print(f"📊 {len(table.roles)} roles analyzed, {len(by_role)} with services unused in {days} days, "
+          f"{len(table.errors)} failed")
+
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the services roles are allowed to use but do not")
+    parser.add_argument('roles', nargs='*', help="Role ARNs (default: every role under --path)")
+    parser.add_argument('--path', default='/', help="Analyze the roles under this path")
+    parser.add_argument('--days', type=int, default=90, help="Services not used for this many days are unused")
+    parser.add_argument('--csv', help="Write the unused services to this CSV file")
+    parser.add_argument('--outstanding', type=int, default=50, help="Jobs running at the same time")
+    parser.add_argument('--workers', type=int, default=10, help="IAM calls in flight")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        result = analyze_roles(args.roles or None, args.path, max_outstanding=args.outstanding,
+                               max_workers=args.workers)
+    except (ValueError, ClientError) as e:
+        print(f"❌ Error: {e}")
+        exit(1)
+
+    print_unused(result, args.days)
+    if args.csv:
+        result.write_csv(args.csv, args.days)
+        print(f"✅ Unused services written to {args.csv}")
+    print(f"📊 Done in {time.perf_counter() - start:.1f}s")
+    exit(1 if result.errors else 0)
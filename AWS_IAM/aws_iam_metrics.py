@@ -0,0 +1,274 @@
+### Per-API-call metrics for the AWS clients
+### Every client built by aws_iam_client is instrumented through botocore's event hooks: each call records its
+### latency (histogram), errors, throttles and request/response bytes per service and operation. Retries come from
+### aws_iam_throttle and client construction time from the factory. Metrics can be exported as Prometheus text
+### or JSON, and profile_calls() captures only what happens inside a `with` block:
+###
+###     with profile_calls() as report:
+###         create_role_with_policies(...)
+###     print(report.summary())
+
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from aws_iam_throttle import THROTTLE_CODES, add_retry_listener
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_START_KEY = 'aws_iam_metrics_start'
+
+
+class _OperationStats:
+    __slots__ = ('calls', 'errors', 'throttles', 'retries', 'bytes_sent', 'bytes_received',
+                 'latency_sum', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.throttles = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def quantile(self, q):
+        """Estimate a latency quantile from the histogram (linear inside the bucket)"""
+        total = sum(self.buckets)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            if seen + count >= rank and count:
+                lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+                upper = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else lower * 2 or 1.0
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return LATENCY_BUCKETS[-1]
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'throttles': self.throttles,
+            'retries': self.retries,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'latency_sum': self.latency_sum,
+            'latency_p50': self.quantile(0.5),
+            'latency_p99': self.quantile(0.99),
+            'latency_buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], self.buckets)),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe metrics per (service, operation), plus client setup time per service"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}
+        self._setup = {}
+
+    def _stats(self, service, operation):
+        key = (service, operation)
+        stats = self._operations.get(key)
+        if stats is None:
+            stats = self._operations[key] = _OperationStats()
+        return stats
+
+    def observe_call(self, service, operation, seconds, error_code=None):
+        with self._lock:
+            stats = self._stats(service, operation)
+            stats.calls += 1
+            stats.latency_sum += seconds
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            if error_code:
+                stats.errors += 1
+                if error_code in THROTTLE_CODES:
+                    stats.throttles += 1
+
+    def observe_bytes(self, service, operation, sent=0, received=0):
+        with self._lock:
+            stats = self._stats(service, operation)
+            stats.bytes_sent += sent
+            stats.bytes_received += received
+
+    def observe_retry(self, service, operation):
+        with self._lock:
+            self._stats(service, operation).retries += 1
+
+    def observe_client_setup(self, service, seconds):
+        with self._lock:
+            count, total = self._setup.get(service, (0, 0.0))
+            self._setup[service] = (count + 1, total + seconds)
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+            self._setup.clear()
+
+    # Exports
+
+    def to_dict(self):
+        with self._lock:
+            operations = {f"{service}.{operation}": stats.to_dict()
+                          for (service, operation), stats in sorted(self._operations.items())}
+            setup = {service: {'count': count, 'seconds': total}
+                     for service, (count, total) in sorted(self._setup.items())}
+        return {'operations': operations, 'client_setup': setup}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            items = sorted(self._operations.items())
+            setup = sorted(self._setup.items())
+
+        lines.append('# HELP aws_api_call_duration_seconds Latency of AWS API calls')
+        lines.append('# TYPE aws_api_call_duration_seconds histogram')
+        for (service, operation), stats in items:
+            labels = f'service="{service}",operation="{operation}"'
+            cumulative = 0
+            for bound, count in zip(list(LATENCY_BUCKETS) + ['+Inf'], stats.buckets):
+                cumulative += count
+                lines.append(f'aws_api_call_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'aws_api_call_duration_seconds_sum{{{labels}}} {stats.latency_sum}')
+            lines.append(f'aws_api_call_duration_seconds_count{{{labels}}} {stats.calls}')
+
+        counters = [
+            ('aws_api_errors_total', 'AWS API calls that returned an error', 'errors'),
+            ('aws_api_throttles_total', 'AWS API calls rejected by throttling', 'throttles'),
+            ('aws_api_retries_total', 'AWS API calls retried', 'retries'),
+            ('aws_api_request_bytes_total', 'Bytes sent to AWS', 'bytes_sent'),
+            ('aws_api_response_bytes_total', 'Bytes received from AWS', 'bytes_received'),
+        ]
+        for name, help_text, attribute in counters:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (service, operation), stats in items:
+                lines.append(f'{name}{{service="{service}",operation="{operation}"}} {getattr(stats, attribute)}')
+
+        lines.append('# HELP aws_client_setup_seconds Time spent building AWS clients')
+        lines.append('# TYPE aws_client_setup_seconds summary')
+        for service, (count, total) in setup:
+            lines.append(f'aws_client_setup_seconds_sum{{service="{service}"}} {total}')
+            lines.append(f'aws_client_setup_seconds_count{{service="{service}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Human readable table, slowest operations first"""
+        data = self.to_dict()['operations']
+        if not data:
+            return "No AWS calls recorded"
+        rows = sorted(data.items(), key=lambda item: item[1]['latency_sum'], reverse=True)
+        lines = [f"{'operation':<40} {'calls':>6} {'p50 ms':>8} {'p99 ms':>8} {'total s':>8} "
+                 f"{'retries':>7} {'throttles':>9}"]
+        for name, stats in rows:
+            lines.append(f"{name:<40} {stats['calls']:>6} {stats['latency_p50'] * 1000:>8.1f} "
+                         f"{stats['latency_p99'] * 1000:>8.1f} {stats['latency_sum']:>8.2f} "
+                         f"{stats['retries']:>7} {stats['throttles']:>9}")
+        return '\n'.join(lines)
+
+
+# Process-wide registry, plus the registries of the profile_calls() blocks currently running
+METRICS = MetricsRegistry()
+_active = [METRICS]
+_active_lock = threading.Lock()
+
+
+def _registries():
+    return list(_active)
+
+
+def _service_and_operation(event_name):
+    # Event names look like 'after-call.iam.CreateRole'
+    parts = event_name.split('.')
+    return (parts[1], parts[2]) if len(parts) >= 3 else (parts[-1], 'unknown')
+
+
+def _start_clock(context=None, **kwargs):
+    if context is not None:
+        context[_START_KEY] = time.perf_counter()
+
+
+def _after_call(event_name, http_response=None, parsed=None, context=None, **kwargs):
+    start = (context or {}).get(_START_KEY)
+    if start is None:
+        return
+    seconds = time.perf_counter() - start
+    service, operation = _service_and_operation(event_name)
+    error_code = (parsed or {}).get('Error', {}).get('Code') if isinstance(parsed, dict) else None
+    received = len(getattr(http_response, 'content', b'') or b'')
+    for registry in _registries():
+        registry.observe_call(service, operation, seconds, error_code)
+        registry.observe_bytes(service, operation, received=received)
+
+
+def _after_call_error(event_name, exception=None, context=None, **kwargs):
+    start = (context or {}).get(_START_KEY)
+    if start is None:
+        return
+    seconds = time.perf_counter() - start
+    service, operation = _service_and_operation(event_name)
+    for registry in _registries():
+        registry.observe_call(service, operation, seconds, type(exception).__name__)
+
+
+def _before_send(event_name, request=None, **kwargs):
+    body = getattr(request, 'body', None) or b''
+    service, operation = _service_and_operation(event_name)
+    for registry in _registries():
+        registry.observe_bytes(service, operation, sent=len(body))
+
+
+def _on_retry(service, operation, reason):
+    for registry in _registries():
+        registry.observe_retry(service, operation)
+
+
+add_retry_listener(_on_retry)
+
+
+def instrument_client(client):
+    """Register the metric hooks on a boto3 client (done by aws_iam_client for every client it builds)"""
+    events = client.meta.events
+    service = client.meta.service_model.service_id.hyphenize()
+    # The clock starts before the request is serialized; before-call handlers may short-circuit each other
+    events.register(f'before-parameter-build.{service}', _start_clock, unique_id='aws-iam-metrics-start')
+    events.register(f'after-call.{service}', _after_call, unique_id='aws-iam-metrics-after-call')
+    events.register(f'after-call-error.{service}', _after_call_error, unique_id='aws-iam-metrics-after-call-error')
+    events.register(f'before-send.{service}', _before_send, unique_id='aws-iam-metrics-before-send')
+    return client
+
+
+def observe_client_setup(service, seconds):
+    for registry in _registries():
+        registry.observe_client_setup(service, seconds)
+
+
+@contextmanager
+def profile_calls(print_summary=False):
+    """
+    Record only the AWS calls made inside the `with` block
+
+    Yields:
+        MetricsRegistry: Filled while the block runs (calls from other threads are included too)
+    """
+    registry = MetricsRegistry()
+    with _active_lock:
+        _active.append(registry)
+    try:
+        yield registry
+    finally:
+        with _active_lock:
+            _active.remove(registry)
+        if print_summary:
+            print(registry.summary())
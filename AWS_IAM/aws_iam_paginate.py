@@ -0,0 +1,73 @@
+### Streaming pagination for the IAM list_* calls
+### IAM returns at most 100 (MaxItems up to 1000) entities per call and sets IsTruncated/Marker when there is more.
+### iter_pages follows the markers and yields one page at a time (iter_items one entity at a time), optionally
+### fetching the next page in the background while the caller is still working on the current one.
+### Calls paginated with NextToken instead (e.g. EC2 describe_instances) pass token_key='NextToken'.
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _next_token(page, token_key):
+    if token_key == 'Marker':
+        return page['Marker'] if page.get('IsTruncated') else None
+    return page.get(token_key) or None
+
+
+def iter_pages(list_call, prefetch=True, token_key='Marker', **params):
+    """
+    Yield every response page of a paginated IAM call
+
+    Useful for calls that return several lists per page, e.g. get_account_authorization_details.
+
+    Args:
+        list_call: Bound client method, e.g. iam.list_roles
+        prefetch (bool): Request the next page while the current one is being consumed
+        token_key (str): 'Marker' (IAM, with IsTruncated) or the name of another pagination token, e.g. 'NextToken'
+        **params: Extra request parameters, e.g. PathPrefix='/service-role/' or MaxItems=1000
+
+    Yields:
+        dict: One response page at a time
+    """
+    def fetch(token):
+        kwargs = dict(params)
+        if token:
+            kwargs[token_key] = token
+        return list_call(**kwargs)
+
+    if not prefetch:
+        token = None
+        while True:
+            page = fetch(token)
+            yield page
+            token = _next_token(page, token_key)
+            if not token:
+                return
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        future = executor.submit(fetch, None)
+        while future is not None:
+            page = future.result()
+            # Ask for the next page before handing out this one
+            token = _next_token(page, token_key)
+            future = executor.submit(fetch, token) if token else None
+            yield page
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_items(list_call, result_key, prefetch=True, **params):
+    """
+    Yield every item of a paginated IAM list call
+
+    Args:
+        list_call: Bound client method, e.g. iam.list_roles
+        result_key (str): Key of the items in each page, e.g. 'Roles'
+        prefetch (bool): Request the next page while the current one is being consumed
+        **params: Extra request parameters, e.g. PathPrefix='/service-role/' or MaxItems=1000
+
+    Yields:
+        dict: One item at a time, in the order IAM returns them
+    """
+    for page in iter_pages(list_call, prefetch=prefetch, **params):
+        yield from page[result_key]
@@ -0,0 +1,402 @@
+### Declarative IAM plan / apply
+### Describe the users, groups and roles you want in a JSON (or YAML, with pip install pyyaml) spec file.
+### plan_changes() compares the spec with what already exists and returns only the IAM calls that are missing;
+### apply_changes() runs them in dependency order (e.g. create_role before attach_role_policy), in parallel.
+###
+### Spec example:
+### {
+###   "groups": [{"name": "Developers", "policies": ["arn:aws:iam::aws:policy/ReadOnlyAccess"]}],
+###   "users": [{"name": "Jane_Doe", "groups": ["Developers"]}],
+###   "roles": [{"name": "MyEC2Role", "service": "ec2.amazonaws.com",
+###              "policies": ["arn:aws:iam::aws:policy/AmazonS3ReadOnlyAccess"],
+###              "inline_policies": {"CustomS3Policy": {"Version": "2012-10-17", "Statement": []}}}]
+### }
+### Usage: python aws_iam_plan.py spec.json [--apply] [--prune]
+
+import argparse
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from aws_iam_client import get_iam_client
+from aws_iam_paginate import iter_items
+from aws_iam_templates import account_trust_policy_json, service_trust_policy_json
+from aws_iam_validate import print_rejected, reject_invalid
+
+# Symbols used when printing a plan
+_CREATE, _UPDATE, _DELETE = '+', '~', '-'
+
+
+def load_spec(file_path):
+    """
+    Read a spec file (.json, or .yaml/.yml when PyYAML is installed)
+
+    Returns:
+        dict: The spec with 'users', 'groups' and 'roles' lists (missing ones are empty)
+    """
+    with open(file_path, encoding='utf-8') as f:
+        if file_path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("YAML specs need PyYAML: pip install pyyaml")
+            spec = yaml.safe_load(f) or {}
+        else:
+            spec = json.load(f)
+
+    for key in ('users', 'groups', 'roles'):
+        spec.setdefault(key, [])
+    return spec
+
+
+def trust_policy_for(role_spec):
+    """Return the trust policy of a role spec ('trust_policy', 'service' or 'trusted_account_id')"""
+    return json.loads(_trust_policy_text(role_spec))
+
+
+def _trust_policy_text(role_spec):
+    """JSON of the trust policy of a role spec; 'service' and 'trusted_account_id' use the shared templates"""
+    if 'trust_policy' in role_spec:
+        trust_policy = role_spec['trust_policy']
+        return trust_policy if isinstance(trust_policy, str) else json.dumps(trust_policy)
+    if 'service' in role_spec:
+        return service_trust_policy_json(role_spec['service'])
+    if 'trusted_account_id' in role_spec:
+        return account_trust_policy_json(role_spec['trusted_account_id'], role_spec.get('external_id'))
+    raise ValueError(f"Role '{role_spec['name']}' needs a trust_policy, service or trusted_account_id")
+
+
+def _canonical(document):
+    """Policy documents compare equal regardless of key order or whether they are str or dict"""
+    if isinstance(document, str):
+        document = json.loads(document)
+    return json.dumps(document, sort_keys=True, separators=(',', ':'))
+
+
+# Current state
+
+def fetch_state(spec, iam=None, inventory=None, max_workers=10):
+    """
+    Read the current state of every entity named in the spec
+
+    Existence comes from the local inventory when its listing is fresh, otherwise from a paginated listing.
+    Policies, inline policies, trust policies and group memberships are then fetched concurrently,
+    only for the entities of the spec that already exist.
+
+    Returns:
+        dict: {'user': {name: {...}}, 'group': {name: {...}}, 'role': {name: {...}}} for existing entities
+    """
+    if iam is None:
+        iam = get_iam_client()
+
+    wanted = {
+        'user': {u['name'] for u in spec['users']},
+        'group': {g['name'] for g in spec['groups']},
+        'role': {r['name'] for r in spec['roles']},
+    }
+    listers = {
+        'user': (iam.list_users, 'Users', 'UserName'),
+        'group': (iam.list_groups, 'Groups', 'GroupName'),
+        'role': (iam.list_roles, 'Roles', 'RoleName'),
+    }
+
+    state = {'user': {}, 'group': {}, 'role': {}}
+    for kind, names in wanted.items():
+        if not names:
+            continue
+        if inventory is not None and inventory.is_fresh(kind):
+            state[kind] = {name: {} for name in names if inventory.exists(kind, name)}
+            continue
+        list_call, result_key, name_key = listers[kind]
+        for entity in iter_items(list_call, result_key, MaxItems=1000):
+            if entity[name_key] in names:
+                state[kind][entity[name_key]] = {'trust': entity.get('AssumeRolePolicyDocument')}
+
+    def attached(list_call, **params):
+        return {p['PolicyArn'] for p in iter_items(list_call, 'AttachedPolicies', prefetch=False, **params)}
+
+    def fetch_user(name):
+        state['user'][name]['policies'] = attached(iam.list_attached_user_policies, UserName=name)
+        state['user'][name]['groups'] = {g['GroupName'] for g in iter_items(
+            iam.list_groups_for_user, 'Groups', prefetch=False, UserName=name)}
+
+    def fetch_group(name):
+        state['group'][name]['policies'] = attached(iam.list_attached_group_policies, GroupName=name)
+
+    def fetch_role(name):
+        role = state['role'][name]
+        role['policies'] = attached(iam.list_attached_role_policies, RoleName=name)
+        role['inline'] = {}
+        for policy_name in iter_items(iam.list_role_policies, 'PolicyNames', prefetch=False, RoleName=name):
+            response = iam.get_role_policy(RoleName=name, PolicyName=policy_name)
+            role['inline'][policy_name] = response['PolicyDocument']
+        if role.get('trust') is None:
+            role['trust'] = iam.get_role(RoleName=name)['Role']['AssumeRolePolicyDocument']
+
+    tasks = [(fetch_user, name) for name in state['user']]
+    tasks += [(fetch_group, name) for name in state['group']]
+    tasks += [(fetch_role, name) for name in state['role']]
+    if tasks:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks)))) as executor:
+            for future in [executor.submit(func, name) for func, name in tasks]:
+                future.result()
+    return state
+
+
+# Planning
+
+def plan_changes(spec, state, prune=False):
+    """
+    Compute the minimal list of IAM calls that makes the account match the spec
+
+    Args:
+        spec (dict): Desired state (see load_spec)
+        state (dict): Current state (see fetch_state)
+        prune (bool): Also detach policies, delete inline policies and leave groups not listed in the spec
+
+    Returns:
+        list: Changes as dicts {'action': boto3 method name, 'params': kwargs, 'depends_on': [indexes]}
+    """
+    changes = []
+    created = {}
+
+    def add(action, params, *entities):
+        depends_on = [created[e] for e in entities if e in created]
+        changes.append({'action': action, 'params': params, 'depends_on': depends_on})
+        return len(changes) - 1
+
+    # Creations first, so everything that follows can depend on them
+    for group in spec['groups']:
+        if group['name'] not in state['group']:
+            created[('group', group['name'])] = add('create_group', {'GroupName': group['name'],
+                                                                      'Path': group.get('path', '/')})
+    for user in spec['users']:
+        if user['name'] not in state['user']:
+            created[('user', user['name'])] = add('create_user', {'UserName': user['name'],
+                                                                   'Path': user.get('path', '/')})
+    for role in spec['roles']:
+        if role['name'] not in state['role']:
+            params = {
+                'RoleName': role['name'],
+                'AssumeRolePolicyDocument': _trust_policy_text(role),
+                'Path': role.get('path', '/')
+            }
+            if role.get('description'):
+                params['Description'] = role['description']
+            created[('role', role['name'])] = add('create_role', params)
+
+    for group in spec['groups']:
+        name = group['name']
+        current = state['group'].get(name, {}).get('policies', set())
+        for arn in sorted(set(group.get('policies', [])) - current):
+            add('attach_group_policy', {'GroupName': name, 'PolicyArn': arn}, ('group', name))
+        if prune:
+            for arn in sorted(current - set(group.get('policies', []))):
+                add('detach_group_policy', {'GroupName': name, 'PolicyArn': arn})
+
+    for user in spec['users']:
+        name = user['name']
+        current = state['user'].get(name, {})
+        policies = current.get('policies', set())
+        for arn in sorted(set(user.get('policies', [])) - policies):
+            add('attach_user_policy', {'UserName': name, 'PolicyArn': arn}, ('user', name))
+        groups = current.get('groups', set())
+        for group_name in sorted(set(user.get('groups', [])) - groups):
+            add('add_user_to_group', {'GroupName': group_name, 'UserName': name}, ('user', name), ('group', group_name))
+        if prune:
+            for arn in sorted(policies - set(user.get('policies', []))):
+                add('detach_user_policy', {'UserName': name, 'PolicyArn': arn})
+            for group_name in sorted(groups - set(user.get('groups', []))):
+                add('remove_user_from_group', {'GroupName': group_name, 'UserName': name})
+
+    for role in spec['roles']:
+        name = role['name']
+        current = state['role'].get(name)
+        if current is not None and current.get('trust') is not None:
+            trust = _trust_policy_text(role)
+            if _canonical(current['trust']) != _canonical(trust):
+                add('update_assume_role_policy', {'RoleName': name, 'PolicyDocument': trust})
+
+        policies = (current or {}).get('policies', set())
+        for arn in sorted(set(role.get('policies', [])) - policies):
+            add('attach_role_policy', {'RoleName': name, 'PolicyArn': arn}, ('role', name))
+
+        inline = (current or {}).get('inline', {})
+        for policy_name, document in sorted(role.get('inline_policies', {}).items()):
+            if policy_name not in inline or _canonical(inline[policy_name]) != _canonical(document):
+                add('put_role_policy', {'RoleName': name, 'PolicyName': policy_name,
+                                        'PolicyDocument': json.dumps(document)}, ('role', name))
+
+        if prune:
+            for arn in sorted(policies - set(role.get('policies', []))):
+                add('detach_role_policy', {'RoleName': name, 'PolicyArn': arn})
+            for policy_name in sorted(set(inline) - set(role.get('inline_policies', {}))):
+                add('delete_role_policy', {'RoleName': name, 'PolicyName': policy_name})
+
+    return changes
+
+
+def describe_change(change):
+    """One line summary of a change, e.g. '+ attach_role_policy MyRole arn:aws:iam::aws:policy/...'"""
+    action = change['action']
+    if action.startswith(('create_', 'attach_', 'add_', 'put_')):
+        symbol = _CREATE
+    elif action.startswith('update_'):
+        symbol = _UPDATE
+    else:
+        symbol = _DELETE
+    details = [str(value) for key, value in change['params'].items()
+               if key not in ('AssumeRolePolicyDocument', 'PolicyDocument', 'Path')]
+    return f"{symbol} {action} {' '.join(details)}"
+
+
+# Applying
+
+def _already_applied(action, error_code):
+    """True if a call failed only because its effect is already there (e.g. replaying a journaled job)"""
+    if action.startswith('create_'):
+        return error_code == 'EntityAlreadyExists'
+    return action.startswith(('delete_', 'detach_', 'remove_')) and error_code == 'NoSuchEntity'
+
+
+def _run_change(iam, change, journal=None, index=None):
+    if journal is not None:
+        journal.record_start(index)
+    try:
+        response = getattr(iam, change['action'])(**change['params'])
+        result = {'change': change, 'status': 'done', 'response': response, 'error': None}
+    except ClientError as e:
+        if journal is not None and _already_applied(change['action'], e.response['Error']['Code']):
+            result = {'change': change, 'status': 'done', 'response': None, 'error': None}
+        else:
+            result = {'change': change, 'status': 'failed', 'response': None, 'error': str(e)}
+    except BotoCoreError as e:
+        # A connection error or timeout fails this change (and its dependents), not the whole run
+        result = {'change': change, 'status': 'failed', 'response': None, 'error': f"{type(e).__name__}: {e}"}
+    if journal is not None:
+        journal.record_end(index, result['status'], result['error'])
+    return result
+
+
+def _update_inventory(inventory, result):
+    action = result['change']['action']
+    params = result['change']['params']
+    for kind, name_key in (('role', 'RoleName'), ('user', 'UserName'), ('group', 'GroupName')):
+        if action == f"create_{kind}" and result['response'] is not None:
+            inventory.record_response(kind, result['response'])
+        elif action == f"attach_{kind}_policy":
+            inventory.record_policy(kind, params[name_key], params['PolicyArn'])
+        elif action == f"detach_{kind}_policy":
+            inventory.forget_policy(kind, params[name_key], params['PolicyArn'])
+        elif action == f"delete_{kind}":
+            inventory.forget(kind, params[name_key])
+
+
+def apply_changes(changes, iam=None, max_workers=10, inventory=None, journal=None):
+    """
+    Run a plan with as many calls in flight as the dependencies allow
+
+    A change starts as soon as every change it depends on has succeeded; if one of them failed
+    it is skipped instead.
+
+    Args:
+        changes (list): Output of plan_changes
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+        max_workers (int): Maximum number of calls in flight
+        inventory (IAMInventory): Optional local cache updated with what was created/attached
+        journal (JobJournal): Optional aws_iam_journal journal; changes it records as done are not run
+            again (their results have 'response' None) and every call is journaled before and after
+
+    Returns:
+        list: One result dict per change, in plan order, with 'change', 'status' ('done', 'failed'
+              or 'skipped'), 'response' and 'error'
+    """
+    if not changes:
+        return []
+    if iam is None:
+        iam = get_iam_client()
+
+    results = [None] * len(changes)
+    waiting = [len(c['depends_on']) for c in changes]
+    dependents = [[] for _ in changes]
+    for index, change in enumerate(changes):
+        for dependency in change['depends_on']:
+            dependents[dependency].append(index)
+
+    def skip(index, reason):
+        for dependent in dependents[index]:
+            if results[dependent] is None:
+                results[dependent] = {'change': changes[dependent], 'status': 'skipped', 'response': None,
+                                      'error': reason}
+                skip(dependent, reason)
+
+    # Changes finished by an earlier run of a journaled job count as done without calling IAM
+    completed = journal.completed() if journal is not None else set()
+    for index in sorted(completed):
+        results[index] = {'change': changes[index], 'status': 'done', 'response': None, 'error': None}
+        for dependent in dependents[index]:
+            waiting[dependent] -= 1
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(changes)))) as executor:
+        pending = {executor.submit(_run_change, iam, c, journal, i): i for i, c in enumerate(changes)
+                   if waiting[i] == 0 and results[i] is None}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                result = future.result()
+                results[index] = result
+
+                if result['status'] != 'done':
+                    skip(index, f"depends on failed {describe_change(changes[index])}")
+                    continue
+                if inventory is not None:
+                    _update_inventory(inventory, result)
+                for dependent in dependents[index]:
+                    waiting[dependent] -= 1
+                    if waiting[dependent] == 0 and results[dependent] is None:
+                        pending[executor.submit(_run_change, iam, changes[dependent], journal,
+                                                dependent)] = dependent
+
+    return results
+
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan (and apply) an IAM spec file")
+    parser.add_argument('spec', help="Path to a .json or .yaml spec")
+    parser.add_argument('--apply', action='store_true', help="Run the planned changes")
+    parser.add_argument('--prune', action='store_true', help="Also remove policies and memberships not in the spec")
+    parser.add_argument('--workers', type=int, default=10, help="Calls in flight")
+    args = parser.parse_args()
+
+    try:
+        spec = load_spec(args.spec)
+        changes = plan_changes(spec, fetch_state(spec, max_workers=args.workers), prune=args.prune)
+    except (ValueError, ClientError) as e:
+        print(f"❌ Error: {e}")
+        exit(1)
+
+    if not changes:
+        print("✅ Nothing to do, IAM already matches the spec")
+        exit(0)
+
+    print(f"📋 Plan: {len(changes)} changes")
+    for change in changes:
+        print(f"   {describe_change(change)}")
+
+    changes, rejected = reject_invalid(changes)
+    if rejected:
+        print(f"\n❌ {len(rejected)} changes rejected by the pre-flight checks (not applied):")
+        print_rejected(rejected)
+
+    if args.apply and changes:
+        print("\n🚀 Applying...")
+        results = apply_changes(changes, max_workers=args.workers)
+        for result in results:
+            icon = '✅' if result['status'] == 'done' else '❌'
+            suffix = f" ({result['error']})" if result['error'] else ''
+            print(f"   {icon} {describe_change(result['change'])}{suffix}")
+        exit(1 if rejected or any(r['status'] != 'done' for r in results) else 0)
+    exit(1 if rejected else 0)
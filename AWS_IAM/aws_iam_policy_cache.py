@@ -0,0 +1,213 @@
+### Managed policy document cache
+### Keeps the documents of managed policies (e.g. arn:aws:iam::aws:policy/AmazonS3ReadOnlyAccess) on disk, so
+### audits and local permission checks (aws_iam_policy_eval) do not download them again and again.
+### A policy version never changes once published, so documents are stored by content (sha256 of the canonical
+### JSON) and every ARN only remembers its DefaultVersionId and which document each version is. Revalidating a
+### policy costs one get_policy call; get_policy_version is only called when the default version changed.
+### Usage: python aws_iam_policy_cache.py arn:aws:iam::aws:policy/AmazonS3ReadOnlyAccess ... [--refresh]
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from aws_iam_client import get_iam_client
+from aws_iam_credentials import CACHE_DIR, DiskCache
+from aws_iam_policy_eval import CompiledPolicySet
+
+POLICY_CACHE_DIR = os.path.join(CACHE_DIR, 'policies')
+
+# Seconds a cached default version is trusted before get_policy is asked again
+DEFAULT_MAX_AGE = 24 * 3600
+
+
+def _canonical(document):
+    return json.dumps(document, sort_keys=True, separators=(',', ':'))
+
+
+def _arn_key(policy_arn):
+    return 'arn-' + hashlib.sha256(policy_arn.encode('utf-8')).hexdigest()[:32]
+
+
+class PolicyDocumentCache:
+    """
+    Content-addressed cache of managed policy documents, in memory and under POLICY_CACHE_DIR
+
+    Args:
+        directory (str): Where the index and documents are stored (None keeps them in memory only)
+        max_age (float): Seconds before the default version of a cached policy is checked again
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+
+    Attributes:
+        hits, revalidations, downloads (int): Lookups answered from the cache, get_policy calls made and
+            documents downloaded
+    """
+
+    def __init__(self, directory=POLICY_CACHE_DIR, max_age=DEFAULT_MAX_AGE, iam=None):
+        self._disk = DiskCache(directory) if directory else None
+        self.max_age = max_age
+        self._iam = iam
+        self._index = {}
+        self._documents = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidations = 0
+        self.downloads = 0
+
+    @property
+    def iam(self):
+        if self._iam is None:
+            self._iam = get_iam_client()
+        return self._iam
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _entry(self, policy_arn):
+        """Index entry {'arn', 'default', 'checked_at', 'versions': {version: sha256}} or None"""
+        with self._lock:
+            entry = self._index.get(policy_arn)
+        if entry is None and self._disk is not None:
+            entry = self._disk.read(_arn_key(policy_arn))
+            if entry is not None:
+                with self._lock:
+                    self._index[policy_arn] = entry
+        return entry
+
+    def _save_entry(self, entry):
+        with self._lock:
+            self._index[entry['arn']] = entry
+        if self._disk is not None:
+            self._disk.write(_arn_key(entry['arn']), entry)
+
+    def _document(self, digest):
+        with self._lock:
+            document = self._documents.get(digest)
+        if document is None and self._disk is not None:
+            stored = self._disk.read(f"doc-{digest}")
+            document = stored['document'] if stored else None
+            if document is not None:
+                with self._lock:
+                    self._documents[digest] = document
+        return document
+
+    def _download(self, policy_arn, version_id):
+        response = self.iam.get_policy_version(PolicyArn=policy_arn, VersionId=version_id)
+        self._count('downloads')
+        document = response['PolicyVersion']['Document']
+        if isinstance(document, str):
+            # The raw API returns the document URL-encoded; boto3 usually decodes it already
+            document = json.loads(urllib.parse.unquote(document))
+        digest = hashlib.sha256(_canonical(document).encode('utf-8')).hexdigest()
+        with self._lock:
+            known = digest in self._documents
+            self._documents[digest] = document
+        if not known and self._disk is not None:
+            self._disk.write(f"doc-{digest}", {'document': document})
+        return digest, document
+
+    def get_version(self, policy_arn, version_id):
+        """Document of one version of a policy (versions are immutable, so a cached one is never revalidated)"""
+        entry = self._entry(policy_arn) or {'arn': policy_arn, 'default': None, 'checked_at': 0, 'versions': {}}
+        digest = entry['versions'].get(version_id)
+        document = self._document(digest) if digest else None
+        if document is not None:
+            self._count('hits')
+            return document
+        digest, document = self._download(policy_arn, version_id)
+        entry = dict(entry, versions=dict(entry['versions'], **{version_id: digest}))
+        self._save_entry(entry)
+        return document
+
+    def get(self, policy_arn, revalidate=None):
+        """
+        Document of the default version of a managed policy
+
+        Args:
+            policy_arn (str): Policy ARN
+            revalidate (bool): True to always ask get_policy, False to never, None to ask when older than max_age
+
+        Raises:
+            ClientError: NoSuchEntity if the policy does not exist
+        """
+        entry = self._entry(policy_arn)
+        if entry is not None and entry['default'] and revalidate is not True:
+            fresh = time.time() - entry['checked_at'] < self.max_age
+            digest = entry['versions'].get(entry['default'])
+            document = self._document(digest) if digest and (fresh or revalidate is False) else None
+            if document is not None:
+                self._count('hits')
+                return document
+
+        default = self.iam.get_policy(PolicyArn=policy_arn)['Policy']['DefaultVersionId']
+        self._count('revalidations')
+        entry = entry or {'arn': policy_arn, 'default': None, 'checked_at': 0, 'versions': {}}
+        digest = entry['versions'].get(default)
+        document = self._document(digest) if digest else None
+        if document is None:
+            digest, document = self._download(policy_arn, default)
+        self._save_entry(dict(entry, default=default, checked_at=time.time(),
+                              versions=dict(entry['versions'], **{default: digest})))
+        return document
+
+    def prefetch(self, policy_arns, revalidate=None, max_workers=10):
+        """
+        Make sure the documents of many policies are cached, fetching the missing or stale ones concurrently
+
+        Returns:
+            dict: ARN -> document (None for policies that do not exist)
+        """
+        def fetch(policy_arn):
+            try:
+                return policy_arn, self.get(policy_arn, revalidate)
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'NoSuchEntity':
+                    raise
+                return policy_arn, None
+
+        arns = list(dict.fromkeys(policy_arns))
+        if not arns:
+            return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(arns)))) as executor:
+            return dict(executor.map(fetch, arns))
+
+    def compiled(self, policy_arns, inline_policies=None, max_workers=10):
+        """
+        CompiledPolicySet (aws_iam_policy_eval) of managed policies plus optional inline documents
+
+        e.g. check what create_role_with_policies would grant before creating the role:
+            cache.compiled(policy_arns, inline_policies).evaluate('s3:GetObject', 'arn:aws:s3:::bucket/key')
+        """
+        documents = [d for d in self.prefetch(policy_arns, max_workers=max_workers).values() if d is not None]
+        return CompiledPolicySet(documents + list((inline_policies or {}).values()))
+
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch managed policy documents through the local cache")
+    parser.add_argument('arns', nargs='+', help="Managed policy ARNs")
+    parser.add_argument('--refresh', action='store_true', help="Check the default versions with IAM now")
+    args = parser.parse_args()
+
+    cache = PolicyDocumentCache()
+    start = time.perf_counter()
+    try:
+        documents = cache.prefetch(args.arns, revalidate=True if args.refresh else None)
+    except (ValueError, ClientError) as e:
+        print(f"❌ Error: {e}")
+        exit(1)
+
+    for arn, policy_document in documents.items():
+        if policy_document is None:
+            print(f"❌ {arn}: not found")
+        else:
+            print(f"📋 {arn}: {len(policy_document.get('Statement', []))} statements")
+    print(f"📊 {cache.hits} from cache, {cache.revalidations} revalidated, {cache.downloads} downloaded "
+          f"({time.perf_counter() - start:.2f}s)")
@@ -0,0 +1,280 @@
+### Offline IAM policy evaluation
+### Answers "can this principal do <action> on <resource>?" locally, without simulate_principal_policy.
+### Policy documents are compiled once: exact names go into sets, "prefix*" patterns into a startswith() tuple and
+### the remaining wildcards into one precompiled regex; statements are indexed by service ("s3", "ec2", ...) so a
+### query only looks at the statements that can match it. An explicit Deny always wins over an Allow.
+###
+### Limitations: Condition blocks and policy variables (${aws:username}) are not evaluated. To stay on the safe
+### side, Allow statements with a Condition or a policy variable are ignored, Deny statements with a Condition always
+### apply and in Deny statements a policy variable matches any value (as if it were a '*').
+
+import json
+import re
+from collections import OrderedDict, defaultdict
+
+ALLOW = 'allow'
+EXPLICIT_DENY = 'explicit-deny'
+IMPLICIT_DENY = 'implicit-deny'
+
+# Decisions kept by a PolicyEvaluator (least recently used ones are dropped first)
+MAX_CACHED_DECISIONS = 65536
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+# ${aws:username}, ${s3:prefix}... (and the ${*}, ${?}, ${$} escapes)
+_POLICY_VARIABLE = re.compile(r'\$\{[^}]*\}')
+
+
+def _glob_to_regex(pattern):
+    return re.escape(pattern).replace(r'\*', '.*').replace(r'\?', '.')
+
+
+class _PatternSet:
+    """A compiled set of IAM wildcard patterns ('*' and '?')"""
+
+    __slots__ = ('match_all', 'exact', 'prefixes', 'regex', 'ignore_case')
+
+    def __init__(self, patterns, ignore_case):
+        self.ignore_case = ignore_case
+        self.match_all = False
+        exact, prefixes, globs = set(), [], []
+        for pattern in patterns:
+            if ignore_case:
+                pattern = pattern.lower()
+            if pattern == '*':
+                self.match_all = True
+            elif '*' not in pattern and '?' not in pattern:
+                exact.add(pattern)
+            elif pattern.endswith('*') and '*' not in pattern[:-1] and '?' not in pattern:
+                prefixes.append(pattern[:-1])
+            else:
+                globs.append(_glob_to_regex(pattern))
+        self.exact = frozenset(exact)
+        self.prefixes = tuple(prefixes)
+        self.regex = re.compile('(?:' + '|'.join(globs) + r')\Z') if globs else None
+
+    def matches(self, value):
+        if self.match_all:
+            return True
+        if self.ignore_case:
+            value = value.lower()
+        if value in self.exact:
+            return True
+        if self.prefixes and value.startswith(self.prefixes):
+            return True
+        return self.regex is not None and self.regex.match(value) is not None
+
+
+class _Statement:
+    """One compiled policy statement"""
+
+    __slots__ = ('deny', 'actions', 'not_actions', 'resources', 'not_resources', 'has_condition', 'has_variables',
+                 'sid')
+
+    def __init__(self, statement):
+        self.sid = statement.get('Sid')
+        self.deny = statement.get('Effect') == 'Deny'
+        self.has_condition = bool(statement.get('Condition'))
+        self.has_variables = False
+
+        def patterns(key, ignore_case):
+            if key not in statement:
+                return None
+            values = [str(value) for value in _as_list(statement[key])]
+            if any('${' in value for value in values):
+                self.has_variables = True
+                # The variable's value is unknown: let it match anything
+                values = [_POLICY_VARIABLE.sub('*', value) for value in values]
+            return _PatternSet(values, ignore_case)
+
+        self.actions = patterns('Action', True)
+        self.not_actions = patterns('NotAction', True)
+        self.resources = patterns('Resource', False)
+        self.not_resources = patterns('NotResource', False)
+
+    def matches(self, action, resource):
+        if self.actions is not None:
+            if not self.actions.matches(action):
+                return False
+        elif self.not_actions is not None and self.not_actions.matches(action):
+            return False
+
+        if self.resources is not None:
+            return self.resources.matches(resource)
+        if self.not_resources is not None:
+            return not self.not_resources.matches(resource)
+        return True
+
+
+def _services_of(statement):
+    """Services a statement can apply to, or None when it may apply to any service"""
+    if 'Action' not in statement:
+        return None
+    services = set()
+    for action in _as_list(statement['Action']):
+        service = action.split(':', 1)[0].lower()
+        if '*' in service or '?' in service or '${' in service:
+            return None
+        services.add(service)
+    return services
+
+
+class CompiledPolicySet:
+    """
+    The compiled statements of every policy that applies to one principal
+
+    Args:
+        documents (list): Policy documents (dicts or JSON strings)
+    """
+
+    def __init__(self, documents):
+        self._by_service = defaultdict(list)
+        self._any_service = []
+        for document in documents:
+            if isinstance(document, str):
+                document = json.loads(document)
+            for raw in _as_list(document.get('Statement')):
+                statement = _Statement(raw)
+                if not statement.deny and (statement.has_condition or statement.has_variables):
+                    # Cannot prove the condition holds (or what the variable stands for), so the Allow is not counted
+                    continue
+                services = _services_of(raw)
+                if services is None:
+                    self._any_service.append(statement)
+                else:
+                    for service in services:
+                        self._by_service[service].append(statement)
+
+    def evaluate(self, action, resource='*'):
+        """Return ALLOW, EXPLICIT_DENY or IMPLICIT_DENY for one action on one resource"""
+        service = action.split(':', 1)[0].lower()
+        allowed = False
+        for statements in (self._by_service.get(service, ()), self._any_service):
+            for statement in statements:
+                if statement.matches(action, resource):
+                    if statement.deny:
+                        return EXPLICIT_DENY
+                    allowed = True
+        return ALLOW if allowed else IMPLICIT_DENY
+
+
+class PolicyEvaluator:
+    """
+    Evaluate batches of (principal, action, resource) queries against locally known policies
+
+    Principals are any names you choose (e.g. 'role/MyEC2Role'); add them with add_principal() or
+    build the evaluator from an IAMSnapshot with from_snapshot().
+
+    Args:
+        cache_size (int): Decisions remembered for repeated queries
+    """
+
+    def __init__(self, cache_size=MAX_CACHED_DECISIONS):
+        self._principals = {}
+        self._cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def add_principal(self, principal, documents):
+        """Compile the policy documents of a principal (replaces any earlier ones)"""
+        self._principals[principal] = CompiledPolicySet(documents)
+        self._cache.clear()
+
+    def principals(self):
+        return sorted(self._principals)
+
+    def evaluate(self, principal, action, resource='*'):
+        """Return ALLOW, EXPLICIT_DENY or IMPLICIT_DENY; unknown principals raise KeyError"""
+        key = (principal, action, resource)
+        decision = self._cache.get(key)
+        if decision is not None:
+            self._cache.move_to_end(key)
+            return decision
+        decision = self._principals[principal].evaluate(action, resource)
+        self._cache[key] = decision
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return decision
+
+    def evaluate_batch(self, queries):
+        """
+        Evaluate many queries at once
+
+        Args:
+            queries (iterable): (principal, action, resource) tuples
+
+        Returns:
+            list: One decision per query, in the same order
+        """
+        evaluate = self.evaluate
+        return [evaluate(principal, action, resource) for principal, action, resource in queries]
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        Build an evaluator for every role and user of an IAMSnapshot
+
+        Principals are named 'role/<name>' and 'user/<name>'. Managed policies missing from the
+        snapshot (e.g. taken with include_aws_managed=False) are skipped.
+        """
+        evaluator = cls()
+
+        def documents(managed_arns, inline):
+            docs = [snapshot.policies[arn]['document'] for arn in managed_arns
+                    if arn in snapshot.policies and snapshot.policies[arn]['document']]
+            return docs + list(inline.values())
+
+        for name, role in snapshot.roles.items():
+            evaluator.add_principal(f"role/{name}", documents(role['policies'], role['inline']))
+        for name, user in snapshot.users.items():
+            inline = dict(user['inline'])
+            for group_name in user['groups']:
+                for policy_name, document in snapshot.groups.get(group_name, {}).get('inline', {}).items():
+                    inline[f"{group_name}/{policy_name}"] = document
+            evaluator.add_principal(f"user/{name}", documents(snapshot.user_policies(name), inline))
+        return evaluator
+
+
+def check_policy(document, queries):
+    """
+    Check a single policy document before deploying it
+
+    Args:
+        document (dict): Policy document, e.g. an inline policy for create_role_with_policies
+        queries (list): (action, resource) tuples
+
+    Returns:
+        list: One decision per query
+    """
+    compiled = CompiledPolicySet([document])
+    return [compiled.evaluate(action, resource) for action, resource in queries]
+
+
+# Usage example
+if __name__ == "__main__":
+    custom_s3_policy = {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Action": [
+                    "s3:GetObject",
+                    "s3:PutObject"
+                ],
+                "Resource": "arn:aws:s3:::my-bucket/*"
+            }
+        ]
+    }
+
+    checks = [
+        ('s3:GetObject', 'arn:aws:s3:::my-bucket/reports/2024.csv'),
+        ('s3:DeleteObject', 'arn:aws:s3:::my-bucket/reports/2024.csv'),
+        ('s3:GetObject', 'arn:aws:s3:::other-bucket/file.txt'),
+    ]
+    for (action, resource), decision in zip(checks, check_policy(custom_s3_policy, checks)):
+        icon = '✅' if decision == ALLOW else '❌'
+        print(f"{icon} {action} on {resource}: {decision}")
@@ -0,0 +1,283 @@
+### EC2 roles ready to launch instances with
+### create_ec2_role only makes the role; instances need it inside an instance profile, and IAM is eventually
+### consistent: right after create_role the role can still look missing to add_role_to_instance_profile, and a new
+### profile can take seconds to show its role. provision_ec2_roles runs role -> policies + instance profile ->
+### "profile shows the role" for many roles in overlapping stages. Instead of sleeping, a ReadinessTracker checks
+### every pending role (or profile) that is due in one batch, with a backoff per item, and each role moves on the
+### moment it is visible. on_ready hands a finished role downstream (e.g. to aws_ec2.launch_fleet) right away.
+### Usage: python aws_iam_provision.py web-role worker-role ... [--policy arn:aws:iam::aws:policy/...]
+
+import argparse
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from aws_iam_client import get_iam_client
+from aws_iam_create_role import ensure_instance_profile
+from aws_iam_paginate import iter_items
+from aws_iam_templates import service_trust_policy_json
+from aws_iam_validate import validate_change
+
+# With this many items pending, one paginated listing is cheaper than a get call per item
+LIST_THRESHOLD = 25
+
+# Provisioning outcomes
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+
+class ReadinessTracker:
+    """
+    Waits for many resources to become visible, checking the due ones together
+
+    Args:
+        check_batch: Callable taking a list of keys and returning the set of those that are ready
+        interval (float): Seconds before the first check of a new key
+        max_interval (float): Longest wait between two checks of a key (the wait doubles until then)
+        timeout (float): Seconds a key may stay pending before poll() gives it up
+    """
+
+    def __init__(self, check_batch, interval=0.25, max_interval=5.0, timeout=120.0):
+        self._check_batch = check_batch
+        self.interval = interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self._pending = {}  # key -> [next check, current interval, deadline]
+        self.checks = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, key, delay=None):
+        """Start waiting for a key (again); its first check is `delay` (default: interval) seconds away"""
+        now = time.monotonic()
+        delay = self.interval if delay is None else delay
+        deadline = self._pending[key][2] if key in self._pending else now + self.timeout
+        self._pending[key] = [now + delay, max(delay, self.interval), deadline]
+
+    def seconds_to_next_check(self):
+        """Seconds until the earliest pending check is due (None if nothing is pending)"""
+        if not self._pending:
+            return None
+        return max(0.0, min(entry[0] for entry in self._pending.values()) - time.monotonic())
+
+    def poll(self):
+        """
+        Check every key that is due, in one batch
+
+        Returns:
+            tuple: (keys now ready, keys given up after the timeout); both are no longer tracked
+        """
+        now = time.monotonic()
+        due = [key for key, entry in self._pending.items() if entry[0] <= now]
+        if not due:
+            return [], []
+        self.checks += 1
+        ready = self._check_batch(due)
+        now = time.monotonic()
+        expired = []
+        for key in due:
+            if key in ready:
+                del self._pending[key]
+            elif now >= self._pending[key][2]:
+                del self._pending[key]
+                expired.append(key)
+            else:
+                entry = self._pending[key]
+                entry[1] = min(entry[1] * 2, self.max_interval)
+                entry[0] = now + entry[1]
+        return [key for key in due if key in ready], expired
+
+
+def visible_roles(iam, role_names, executor, path_prefix='/'):
+    """
+    Which of these roles IAM returns already (one listing for many, get_role calls for a few)
+
+    A check that fails (throttled, network error...) counts as "not visible yet": the tracker checks again later.
+    """
+    if len(role_names) >= LIST_THRESHOLD:
+        try:
+            listed = {role['RoleName'] for role in iter_items(iam.list_roles, 'Roles', PathPrefix=path_prefix,
+                                                              MaxItems=1000)}
+        except (ClientError, BotoCoreError):
+            return set()
+        return set(role_names) & listed
+
+    def exists(role_name):
+        try:
+            iam.get_role(RoleName=role_name)
+            return True
+        except (ClientError, BotoCoreError):
+            return False
+
+    return {name for name, found in zip(role_names, executor.map(exists, role_names)) if found}
+
+
+def profiles_with_roles(iam, profiles, executor):
+    """
+    Which instance profiles already show their role
+
+    Args:
+        profiles (dict): Instance profile name -> role name it should carry
+
+    Like visible_roles, a failed check only means "not ready yet".
+    """
+    names = list(profiles)
+    if len(names) >= LIST_THRESHOLD:
+        try:
+            listed = {p['InstanceProfileName']: [r['RoleName'] for r in p['Roles']]
+                      for p in iter_items(iam.list_instance_profiles, 'InstanceProfiles', MaxItems=1000)}
+        except (ClientError, BotoCoreError):
+            return set()
+        return {name for name in names if profiles[name] in listed.get(name, [])}
+
+    def shows_role(profile_name):
+        try:
+            profile = iam.get_instance_profile(InstanceProfileName=profile_name)['InstanceProfile']
+        except (ClientError, BotoCoreError):
+            return False
+        return profiles[profile_name] in [role['RoleName'] for role in profile.get('Roles', [])]
+
+    return {name for name, ready in zip(names, executor.map(shows_role, names)) if ready}
+
+
+def provision_ec2_roles(role_names, policy_arns=None, path='/', description="Role for EC2 instances",
+                        max_workers=10, timeout=120.0, iam=None, inventory=None, on_ready=None):
+    """
+    Create EC2 roles with their policies and instance profiles, and wait until IAM shows each of them
+
+    Args:
+        role_names (list): Roles to provision (existing roles and profiles are reused)
+        policy_arns (list): Managed policies to attach to every role
+        path (str): Path of the new roles
+        description (str): Description of the new roles
+        max_workers (int): IAM calls in flight
+        timeout (float): Seconds a role may take to become visible before it is given up
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+        inventory (IAMInventory): Optional local cache updated with the created roles
+        on_ready: Optional callable(role_name, result) called as soon as a role's instance profile is usable
+
+    Returns:
+        dict: role name -> {'status': 'ready' | 'failed', 'role_arn', 'instance_profile_arn', 'error', 'seconds'}
+    """
+    if iam is None:
+        iam = get_iam_client()
+    start = time.monotonic()
+    trust_policy = service_trust_policy_json('ec2.amazonaws.com')
+    results = {name: {'status': None, 'role_arn': None, 'instance_profile_arn': None, 'error': None,
+                      'seconds': None} for name in dict.fromkeys(role_names)}
+
+    def fail(name, error):
+        results[name].update(status=STATUS_FAILED, error=error, seconds=time.monotonic() - start)
+
+    def create(name):
+        params = {'RoleName': name, 'AssumeRolePolicyDocument': trust_policy, 'Path': path,
+                  'Description': description}
+        try:
+            response = iam.create_role(**params)
+            if inventory is not None:
+                inventory.record_response('role', response)
+            return response['Role']['Arn']
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'EntityAlreadyExists':
+                raise
+            return None
+
+    def configure(name):
+        for policy_arn in policy_arns or []:
+            iam.attach_role_policy(RoleName=name, PolicyArn=policy_arn)
+            if inventory is not None:
+                inventory.record_policy('role', name, policy_arn)
+        return ensure_instance_profile(name, iam=iam)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        roles = ReadinessTracker(lambda names: visible_roles(iam, names, executor, path), timeout=timeout)
+        profiles = ReadinessTracker(lambda names: profiles_with_roles(iam, {n: n for n in names}, executor),
+                                    timeout=timeout)
+        futures = {}
+        for name in results:
+            problems = validate_change({'action': 'create_role', 'params': {
+                'RoleName': name, 'AssumeRolePolicyDocument': trust_policy, 'Path': path}})
+            if problems:
+                fail(name, '; '.join(problems))
+            else:
+                futures[executor.submit(create, name)] = ('create', name)
+
+        while futures or roles or profiles:
+            waits = [s for s in (roles.seconds_to_next_check(), profiles.seconds_to_next_check()) if s is not None]
+            if futures:
+                done, _ = wait(futures, timeout=min(waits) if waits else None, return_when=FIRST_COMPLETED)
+            else:
+                done = ()
+                time.sleep(min(waits))
+
+            for future in done:
+                stage, name = futures.pop(future)
+                try:
+                    value = future.result()
+                except ClientError as e:
+                    if (stage == 'configure' and e.response['Error']['Code'] == 'NoSuchEntity'
+                            and time.monotonic() - start < timeout):
+                        # The role (or its new profile) is not visible to every IAM call yet: wait again
+                        roles.add(name, delay=roles.interval * 2)
+                    else:
+                        fail(name, str(e))
+                    continue
+                except BotoCoreError as e:
+                    fail(name, f"{type(e).__name__}: {e}")
+                    continue
+                if stage == 'create':
+                    results[name]['role_arn'] = value
+                    roles.add(name)
+                else:
+                    results[name]['instance_profile_arn'] = value['arn']
+                    profiles.add(name)
+
+            ready, expired = roles.poll()
+            for name in ready:
+                futures[executor.submit(configure, name)] = ('configure', name)
+            for name in expired:
+                fail(name, f"role not visible after {timeout:.0f}s")
+
+            ready, expired = profiles.poll()
+            for name in ready:
+                results[name].update(status=STATUS_READY, seconds=time.monotonic() - start)
+                if on_ready is not None:
+                    on_ready(name, results[name])
+            for name in expired:
+                fail(name, f"instance profile does not show the role after {timeout:.0f}s")
+
+    for name, result in results.items():
+        if result['status'] == STATUS_READY and result['role_arn'] is None:
+            # Existing roles were reused: their ARN is only looked up now (left None if that fails)
+            try:
+                result['role_arn'] = iam.get_role(RoleName=name)['Role']['Arn']
+            except (ClientError, BotoCoreError):
+                pass
+    return results
+
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create EC2 roles and instance profiles, ready to launch with")
+    parser.add_argument('roles', nargs='+', help="Role names (the instance profiles get the same names)")
+    parser.add_argument('--policy', action='append', default=[], help="Managed policy ARN to attach (repeatable)")
+    parser.add_argument('--path', default='/', help="Path of the new roles")
+    parser.add_argument('--workers', type=int, default=10, help="IAM calls in flight")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Seconds to wait for a role to be visible")
+    args = parser.parse_args()
+
+    try:
+        provisioned = provision_ec2_roles(
+            args.roles, args.policy, args.path, max_workers=args.workers, timeout=args.timeout,
+            on_ready=lambda name, result: print(f"✅ {name} ready ({result['seconds']:.1f}s)"))
+    except (ValueError, ClientError, BotoCoreError) as e:
+        print(f"❌ Error: {e}")
+        exit(1)
+
+    failed = {name: r for name, r in provisioned.items() if r['status'] != STATUS_READY}
+    for role, result in failed.items():
+        print(f"❌ {role}: {result['error']}")
+    print(f"📊 {len(provisioned) - len(failed)}/{len(provisioned)} roles ready to launch instances with")
+    exit(1 if failed else 0)
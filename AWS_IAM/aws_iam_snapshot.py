@@ -0,0 +1,227 @@
+### Account-wide IAM snapshot
+### Pulls every user, group, role and managed policy with a handful of paginated get_account_authorization_details
+### calls (instead of thousands of per-entity calls) and indexes them in memory, e.g. "roles using policy X",
+### "users in group Y" or "roles trusting principal Z". Snapshots can be saved to a (gzipped) JSON file and
+### loaded again without calling AWS.
+### Usage: python aws_iam_snapshot.py snapshot.json.gz
+
+import gzip
+import json
+import sys
+import time
+from collections import defaultdict
+
+from aws_iam_client import get_iam_client
+from aws_iam_paginate import iter_pages
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def _attached_arns(detail):
+    return [p['PolicyArn'] for p in detail.get('AttachedManagedPolicies', [])]
+
+
+def _inline_documents(detail, list_key):
+    return {p['PolicyName']: p['PolicyDocument'] for p in detail.get(list_key, [])}
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def trusted_principals(trust_policy):
+    """
+    Return every principal allowed to assume a role, e.g. 'ec2.amazonaws.com' or 'arn:aws:iam::123456789012:root'
+    """
+    if isinstance(trust_policy, str):
+        trust_policy = json.loads(trust_policy)
+    principals = set()
+    for statement in _as_list((trust_policy or {}).get('Statement', [])):
+        if statement.get('Effect') != 'Allow':
+            continue
+        principal = statement.get('Principal', {})
+        if principal == '*':
+            principals.add('*')
+            continue
+        for values in principal.values():
+            principals.update(_as_list(values))
+    return principals
+
+
+class IAMSnapshot:
+    """
+    In-memory copy of an account's IAM configuration with lookup indexes
+
+    Attributes:
+        users (dict): name -> {'arn', 'path', 'groups', 'policies', 'inline'}
+        groups (dict): name -> {'arn', 'path', 'policies', 'inline'}
+        roles (dict): name -> {'arn', 'path', 'trust', 'policies', 'inline', 'instance_profiles'}
+        policies (dict): arn -> {'name', 'path', 'default_version', 'attachment_count', 'document'}
+        taken_at (float): Unix time the snapshot was taken
+    """
+
+    def __init__(self, users=None, groups=None, roles=None, policies=None, taken_at=None):
+        self.users = users or {}
+        self.groups = groups or {}
+        self.roles = roles or {}
+        self.policies = policies or {}
+        self.taken_at = taken_at or time.time()
+        self._build_indexes()
+
+    def _build_indexes(self):
+        self._policy_users = defaultdict(set)
+        self._policy_groups = defaultdict(set)
+        self._policy_roles = defaultdict(set)
+        self._group_members = defaultdict(set)
+        self._principal_roles = defaultdict(set)
+
+        for name, user in self.users.items():
+            for arn in user['policies']:
+                self._policy_users[arn].add(name)
+            for group_name in user['groups']:
+                self._group_members[group_name].add(name)
+        for name, group in self.groups.items():
+            for arn in group['policies']:
+                self._policy_groups[arn].add(name)
+        for name, role in self.roles.items():
+            for arn in role['policies']:
+                self._policy_roles[arn].add(name)
+            for principal in trusted_principals(role['trust']):
+                self._principal_roles[principal].add(name)
+
+    # Queries
+
+    def roles_using_policy(self, policy_arn):
+        return sorted(self._policy_roles.get(policy_arn, ()))
+
+    def users_using_policy(self, policy_arn, include_groups=True):
+        """Users with the policy attached directly (and, by default, through one of their groups)"""
+        users = set(self._policy_users.get(policy_arn, ()))
+        if include_groups:
+            for group_name in self._policy_groups.get(policy_arn, ()):
+                users |= self._group_members.get(group_name, set())
+        return sorted(users)
+
+    def groups_using_policy(self, policy_arn):
+        return sorted(self._policy_groups.get(policy_arn, ()))
+
+    def users_in_group(self, group_name):
+        return sorted(self._group_members.get(group_name, ()))
+
+    def roles_trusting(self, principal):
+        """Roles whose trust policy allows a principal (service, account root ARN, role ARN or '*')"""
+        return sorted(self._principal_roles.get(principal, ()))
+
+    def user_policies(self, user_name):
+        """Every managed policy ARN that applies to a user, directly or through groups"""
+        user = self.users[user_name]
+        arns = set(user['policies'])
+        for group_name in user['groups']:
+            arns.update(self.groups.get(group_name, {}).get('policies', ()))
+        return sorted(arns)
+
+    def unused_policies(self):
+        """Managed policies in the snapshot that nothing is attached to"""
+        used = set(self._policy_users) | set(self._policy_groups) | set(self._policy_roles)
+        return sorted(arn for arn in self.policies if arn not in used)
+
+    # Saving and loading
+
+    def to_dict(self):
+        return {
+            'version': SNAPSHOT_FORMAT_VERSION,
+            'taken_at': self.taken_at,
+            'users': self.users,
+            'groups': self.groups,
+            'roles': self.roles,
+            'policies': self.policies,
+        }
+
+    def save(self, file_path):
+        """Write the snapshot as compact JSON (gzipped when the name ends with .gz)"""
+        data = json.dumps(self.to_dict(), separators=(',', ':'), default=str).encode('utf-8')
+        opener = gzip.open if file_path.endswith('.gz') else open
+        with opener(file_path, 'wb') as f:
+            f.write(data)
+
+    @classmethod
+    def load(cls, file_path):
+        """Read a snapshot written by save()"""
+        opener = gzip.open if file_path.endswith('.gz') else open
+        with opener(file_path, 'rb') as f:
+            data = json.loads(f.read())
+        if data.get('version') != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {data.get('version')}")
+        return cls(data['users'], data['groups'], data['roles'], data['policies'], data['taken_at'])
+
+
+def take_snapshot(iam=None, include_aws_managed=True, page_size=1000):
+    """
+    Build an IAMSnapshot from paginated get_account_authorization_details calls
+
+    Args:
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+        include_aws_managed (bool): Also download the AWS managed policies (the biggest part of the response)
+        page_size (int): Items per call (IAM allows up to 1000)
+    """
+    if iam is None:
+        iam = get_iam_client()
+
+    sections = ['User', 'Group', 'Role', 'LocalManagedPolicy']
+    if include_aws_managed:
+        sections.append('AWSManagedPolicy')
+
+    users, groups, roles, policies = {}, {}, {}, {}
+    for page in iter_pages(iam.get_account_authorization_details, Filter=sections, MaxItems=page_size):
+        for detail in page.get('UserDetailList', []):
+            users[detail['UserName']] = {
+                'arn': detail['Arn'],
+                'path': detail['Path'],
+                'groups': detail.get('GroupList', []),
+                'policies': _attached_arns(detail),
+                'inline': _inline_documents(detail, 'UserPolicyList'),
+            }
+        for detail in page.get('GroupDetailList', []):
+            groups[detail['GroupName']] = {
+                'arn': detail['Arn'],
+                'path': detail['Path'],
+                'policies': _attached_arns(detail),
+                'inline': _inline_documents(detail, 'GroupPolicyList'),
+            }
+        for detail in page.get('RoleDetailList', []):
+            roles[detail['RoleName']] = {
+                'arn': detail['Arn'],
+                'path': detail['Path'],
+                'trust': detail.get('AssumeRolePolicyDocument'),
+                'policies': _attached_arns(detail),
+                'inline': _inline_documents(detail, 'RolePolicyList'),
+                'instance_profiles': [p['InstanceProfileName'] for p in detail.get('InstanceProfileList', [])],
+            }
+        for detail in page.get('Policies', []):
+            default = next((v for v in detail.get('PolicyVersionList', []) if v.get('IsDefaultVersion')), None)
+            policies[detail['Arn']] = {
+                'name': detail['PolicyName'],
+                'path': detail['Path'],
+                'default_version': detail.get('DefaultVersionId'),
+                'attachment_count': detail.get('AttachmentCount', 0),
+                'document': default['Document'] if default else None,
+            }
+
+    return IAMSnapshot(users, groups, roles, policies)
+
+
+# Main program
+if __name__ == "__main__":
+    output_path = sys.argv[1] if len(sys.argv) > 1 else 'iam_snapshot.json.gz'
+
+    print("📸 Taking IAM snapshot...")
+    start = time.perf_counter()
+    try:
+        snapshot = take_snapshot()
+    except ValueError as e:
+        print(f"❌ Configuration error: {e}")
+        exit(1)
+
+    snapshot.save(output_path)
+    print(f"✅ {len(snapshot.users)} users, {len(snapshot.groups)} groups, {len(snapshot.roles)} roles and "
+          f"{len(snapshot.policies)} policies saved to {output_path} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,201 @@
+### Bulk role teardown
+### IAM refuses to delete a role that still has managed policies attached, inline policies or instance profiles.
+### The dependencies of every role are listed first (paginated, all roles and listings concurrently), then the
+### teardown is planned as aws_iam_plan changes: every detach / delete / remove step of every role runs in
+### parallel, and each delete_role starts as soon as the steps of its own role are done. All calls share the
+### throttled IAM client, so a big teardown slows down instead of failing when IAM throttles.
+### Usage: python aws_iam_teardown.py RoleA RoleB ... [--dry-run]
+###        python aws_iam_teardown.py --path /ci/ --match 'ci-*' [--keep-instance-profiles] [--dry-run]
+###        python aws_iam_teardown.py RoleA RoleB --journal teardown.journal    (run again to resume)
+###        python aws_iam_teardown.py --journal teardown.journal                (resume without listing roles)
+
+import argparse
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from aws_iam_client import get_iam_client
+from aws_iam_create_role import iter_roles
+from aws_iam_journal import JobJournal
+from aws_iam_paginate import iter_items
+from aws_iam_plan import apply_changes, describe_change
+
+
+def find_roles(path_prefix='/', pattern='*', iam=None):
+    """
+    Names of the roles under a path whose name matches a glob pattern, e.g. find_roles('/ci/', 'ci-*')
+
+    Service-linked roles (path /aws-service-role/) are never returned: only their AWS service can delete them.
+    """
+    return [role['RoleName'] for role in iter_roles(path_prefix, iam=iam)
+            if fnmatch.fnmatchcase(role['RoleName'], pattern) and not role['Path'].startswith('/aws-service-role/')]
+
+
+def discover_dependencies(role_names, iam=None, max_workers=10):
+    """
+    List what has to go before each role can be deleted
+
+    Returns:
+        dict: role name -> {'managed': [policy ARNs], 'inline': [policy names], 'instance_profiles': [names]},
+              or None for roles that do not exist
+    """
+    if iam is None:
+        iam = get_iam_client()
+
+    listings = {
+        'managed': lambda name: [p['PolicyArn'] for p in iter_items(
+            iam.list_attached_role_policies, 'AttachedPolicies', prefetch=False, RoleName=name)],
+        'inline': lambda name: list(iter_items(iam.list_role_policies, 'PolicyNames', prefetch=False,
+                                               RoleName=name)),
+        'instance_profiles': lambda name: [p['InstanceProfileName'] for p in iter_items(
+            iam.list_instance_profiles_for_role, 'InstanceProfiles', prefetch=False, RoleName=name)],
+    }
+
+    def fetch(task):
+        name, kind = task
+        try:
+            return name, kind, listings[kind](name)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'NoSuchEntity':
+                raise
+            return name, kind, None
+
+    tasks = [(name, kind) for name in dict.fromkeys(role_names) for kind in listings]
+    dependencies = {name: {} for name in dict.fromkeys(role_names)}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks) or 1))) as executor:
+        for name, kind, items in executor.map(fetch, tasks):
+            if dependencies[name] is not None:
+                dependencies[name] = None if items is None else dict(dependencies[name], **{kind: items})
+    return dependencies
+
+
+def plan_teardown(dependencies, delete_instance_profiles=True):
+    """
+    Turn discovered dependencies into aws_iam_plan changes
+
+    Args:
+        dependencies (dict): Output of discover_dependencies (missing roles are left out)
+        delete_instance_profiles (bool): Also delete the instance profiles the roles are removed from
+
+    Returns:
+        list: Changes {'action', 'params', 'depends_on'}; each delete_role depends on the steps of its role
+    """
+    changes = []
+
+    def add(action, params, depends_on=()):
+        changes.append({'action': action, 'params': params, 'depends_on': list(depends_on)})
+        return len(changes) - 1
+
+    for role_name, found in dependencies.items():
+        if found is None:
+            continue
+        steps = [add('detach_role_policy', {'RoleName': role_name, 'PolicyArn': arn}) for arn in found['managed']]
+        steps += [add('delete_role_policy', {'RoleName': role_name, 'PolicyName': policy_name})
+                  for policy_name in found['inline']]
+        for profile_name in found['instance_profiles']:
+            removed = add('remove_role_from_instance_profile', {'InstanceProfileName': profile_name,
+                                                                'RoleName': role_name})
+            steps.append(removed)
+            if delete_instance_profiles:
+                # An instance profile holds one role, so it is empty once this one is removed
+                add('delete_instance_profile', {'InstanceProfileName': profile_name}, [removed])
+        add('delete_role', {'RoleName': role_name}, steps)
+    return changes
+
+
+def teardown_roles(role_names, dry_run=False, delete_instance_profiles=True, max_workers=10, iam=None,
+                   inventory=None, journal=None):
+    """
+    Delete many roles and everything attached to them
+
+    Args:
+        role_names (list): Roles to delete
+        dry_run (bool): Only discover and plan; nothing is changed
+        delete_instance_profiles (bool): Also delete the roles' instance profiles
+        max_workers (int): IAM calls in flight
+        iam: Optional IAM client (defaults to the shared client from the .env credentials)
+        inventory (IAMInventory): Optional local cache updated with the deleted roles
+        journal (JobJournal): Optional aws_iam_journal journal. If it already holds a teardown, that plan is
+            resumed as journaled (role_names is ignored): planning again from what is left would not match it
+
+    Returns:
+        dict: {'roles': {name: 'deleted' | 'failed' | 'missing' | 'planned'}, 'changes', 'results'}
+    """
+    if iam is None:
+        iam = get_iam_client()
+
+    if journal is not None and journal.changes is not None:
+        changes = journal.changes
+        roles = {c['params']['RoleName']: 'planned' for c in changes if c['action'] == 'delete_role'}
+    else:
+        dependencies = discover_dependencies(role_names, iam, max_workers)
+        changes = plan_teardown(dependencies, delete_instance_profiles)
+        roles = {name: 'missing' if found is None else 'planned' for name, found in dependencies.items()}
+    if dry_run:
+        return {'roles': roles, 'changes': changes, 'results': []}
+
+    if journal is not None and journal.changes is None:
+        journal.start_job(changes)
+    results = apply_changes(changes, iam, max_workers, inventory, journal=journal)
+    for result in results:
+        if result['change']['action'] == 'delete_role':
+            name = result['change']['params']['RoleName']
+            roles[name] = 'deleted' if result['status'] == 'done' else 'failed'
+    return {'roles': roles, 'changes': changes, 'results': results}
+
+
+def print_teardown(teardown, dry_run=False):
+    if dry_run:
+        print(f"📋 Teardown plan: {len(teardown['changes'])} calls")
+        for change in teardown['changes']:
+            print(f"   {describe_change(change)}")
+    else:
+        for result in teardown['results']:
+            if result['status'] != 'done':
+                print(f"   ❌ {describe_change(result['change'])} ({result['status']}: {result['error']})")
+
+    counts = {}
+    for status in teardown['roles'].values():
+        counts[status] = counts.get(status, 0) + 1
+    print(f"📊 {len(teardown['roles'])} roles: " + ', '.join(f"{n} {status}" for status, n in sorted(counts.items())))
+
+
+# Main program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete IAM roles with their policies and instance profiles")
+    parser.add_argument('roles', nargs='*', help="Role names")
+    parser.add_argument('--path', help="Select the roles under this path")
+    parser.add_argument('--match', default='*', help="Glob pattern the selected role names must match")
+    parser.add_argument('--keep-instance-profiles', action='store_true', help="Only remove the roles from them")
+    parser.add_argument('--dry-run', action='store_true', help="Show the calls without making them")
+    parser.add_argument('--workers', type=int, default=10, help="IAM calls in flight")
+    parser.add_argument('--journal', help="Journal file: record the teardown, or resume the one it holds")
+    args = parser.parse_args()
+
+    if not args.roles and not args.path and args.match == '*' and not args.journal:
+        parser.error("give role names, or select roles with --path and/or --match")
+
+    teardown_journal = JobJournal(args.journal) if args.journal else None
+    try:
+        names = list(args.roles)
+        resuming = teardown_journal is not None and teardown_journal.changes is not None
+        if resuming:
+            print(f"🚀 Resuming teardown {teardown_journal.job_id} from {args.journal}")
+        elif args.path or args.match != '*':
+            names += find_roles(args.path or '/', args.match)
+        if not names and not resuming:
+            print("✅ No roles match")
+            exit(0)
+        teardown_result = teardown_roles(names, dry_run=args.dry_run, max_workers=args.workers,
+                                         delete_instance_profiles=not args.keep_instance_profiles,
+                                         journal=teardown_journal)
+    except (ValueError, ClientError) as e:
+        print(f"❌ Error: {e}")
+        exit(1)
+    finally:
+        if teardown_journal is not None:
+            teardown_journal.close()
+
+    print_teardown(teardown_result, args.dry_run)
+    exit(1 if 'failed' in teardown_result['roles'].values() else 0)
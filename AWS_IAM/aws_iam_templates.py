@@ -0,0 +1,185 @@
+### Policy document templates
+### Trust and permission policies that only differ by a service principal, an account id or a bucket are
+### serialized once: a template keeps its compact JSON text split around the {{placeholders}}, and rendering
+### only joins the parts with the JSON-escaped values (memoized per set of values). Creating roles in bulk then
+### never rebuilds and json.dumps the same dict again, and every script sends byte-identical documents.
+### Register more with register_template(name, document); placeholders may only appear inside JSON strings.
+
+import json
+import re
+import threading
+
+# Rendered texts kept per template (distinct parameter sets)
+MAX_RENDERED = 4096
+
+_PLACEHOLDER = re.compile(r'\{\{(\w+)\}\}')
+
+
+class PolicyTemplate:
+    """
+    A policy document with {{name}} placeholders, serialized once
+
+    Args:
+        name (str): Registry name
+        document (dict): Policy document, e.g. {"Principal": {"Service": "{{service}}"}, ...}
+    """
+
+    def __init__(self, name, document):
+        self.name = name
+        # Literal text and placeholder names alternate: [text, name, text, name, ..., text]
+        self._parts = _PLACEHOLDER.split(json.dumps(document, separators=(',', ':')))
+        self.parameters = tuple(dict.fromkeys(self._parts[1::2]))
+        self._rendered = {}
+        self._lock = threading.Lock()
+
+    def render(self, **values):
+        """
+        Return the document as compact JSON text, ready for AssumeRolePolicyDocument / PolicyDocument
+
+        Raises:
+            ValueError: If a placeholder has no value
+        """
+        key = tuple(values.get(name) for name in self.parameters)
+        text = self._rendered.get(key)
+        if text is not None:
+            return text
+
+        missing = [name for name in self.parameters if values.get(name) is None]
+        if missing:
+            raise ValueError(f"Template '{self.name}' needs a value for {', '.join(missing)}")
+        text = ''.join(part if i % 2 == 0 else json.dumps(str(values[part]))[1:-1]
+                       for i, part in enumerate(self._parts))
+        with self._lock:
+            if len(self._rendered) < MAX_RENDERED:
+                self._rendered[key] = text
+        return text
+
+    def document(self, **values):
+        """Return the document as a new dict"""
+        return json.loads(self.render(**values))
+
+
+TEMPLATES = {}
+
+
+def register_template(name, document):
+    """Add (or replace) a template in the registry and return it"""
+    template = PolicyTemplate(name, document)
+    TEMPLATES[name] = template
+    return template
+
+
+def get_template(name):
+    """
+    Raises:
+        ValueError: If no template has this name
+    """
+    template = TEMPLATES.get(name)
+    if template is None:
+        raise ValueError(f"Unknown policy template '{name}' (templates: {', '.join(sorted(TEMPLATES))})")
+    return template
+
+
+def render(name, **values):
+    """Compact JSON of a registered template, e.g. render('service-trust', service='ec2.amazonaws.com')"""
+    return get_template(name).render(**values)
+
+
+# Trust policies
+
+register_template('service-trust', {
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": {
+                "Service": "{{service}}"
+            },
+            "Action": "sts:AssumeRole"
+        }
+    ]
+})
+
+register_template('account-trust', {
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": {
+                "AWS": "arn:aws:iam::{{account_id}}:root"
+            },
+            "Action": "sts:AssumeRole"
+        }
+    ]
+})
+
+register_template('account-trust-external-id', {
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": {
+                "AWS": "arn:aws:iam::{{account_id}}:root"
+            },
+            "Action": "sts:AssumeRole",
+            "Condition": {
+                "StringEquals": {
+                    "sts:ExternalId": "{{external_id}}"
+                }
+            }
+        }
+    ]
+})
+
+# Inline policies
+
+register_template('s3-object-read-write', {
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Action": [
+                "s3:GetObject",
+                "s3:PutObject"
+            ],
+            "Resource": "arn:aws:s3:::{{bucket}}/*"
+        }
+    ]
+})
+
+register_template('s3-bucket-read', {
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Action": "s3:ListBucket",
+            "Resource": "arn:aws:s3:::{{bucket}}"
+        },
+        {
+            "Effect": "Allow",
+            "Action": "s3:GetObject",
+            "Resource": "arn:aws:s3:::{{bucket}}/*"
+        }
+    ]
+})
+
+
+def service_trust_policy(service_principal):
+    """Trust policy (dict) letting an AWS service, e.g. ec2.amazonaws.com, assume a role"""
+    return TEMPLATES['service-trust'].document(service=service_principal)
+
+
+def service_trust_policy_json(service_principal):
+    """Same as service_trust_policy, as the pre-serialized JSON text"""
+    return TEMPLATES['service-trust'].render(service=service_principal)
+
+
+def account_trust_policy(account_id, external_id=None):
+    """Trust policy (dict) letting another AWS account assume a role (optionally requiring an ExternalId)"""
+    return json.loads(account_trust_policy_json(account_id, external_id))
+
+
+def account_trust_policy_json(account_id, external_id=None):
+    if external_id:
+        return TEMPLATES['account-trust-external-id'].render(account_id=account_id, external_id=external_id)
+    return TEMPLATES['account-trust'].render(account_id=account_id)
@@ -0,0 +1,204 @@
+### Adaptive rate limiting and throttling-aware retries for the AWS clients
+### IAM enforces account-wide request limits; when many threads call it at once the extra requests come back as
+### "Throttling" errors. Every client built by aws_iam_client goes through a ThrottledClient, so all calls of a
+### service share one AdaptiveRateLimiter: a token bucket that halves its rate when AWS throttles and slowly
+### grows it back while calls succeed. Throttled and transient failures are retried with jittered backoff.
+
+import random
+import threading
+import time
+
+# Error codes that mean "slow down"
+THROTTLE_CODES = frozenset([
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottled',
+    'RequestThrottledException', 'TooManyRequestsException', 'RequestLimitExceeded', 'SlowDown'
+])
+
+# Error codes worth a retry without changing the rate
+TRANSIENT_CODES = frozenset(['ServiceUnavailable', 'InternalFailure', 'InternalError', 'RequestTimeout'])
+
+# Client attributes that are not API calls and are returned untouched
+_PASSTHROUGH = frozenset(['meta', 'exceptions', 'get_paginator', 'get_waiter', 'can_paginate', 'waiter_names'])
+
+# Callables notified as listener(service_name, operation_name, reason) before every retry
+_retry_listeners = []
+
+
+def add_retry_listener(listener):
+    """Get told about every retry ('throttle', 'transient' or 'connection'), e.g. to count them"""
+    if listener not in _retry_listeners:
+        _retry_listeners.append(listener)
+
+
+def remove_retry_listener(listener):
+    if listener in _retry_listeners:
+        _retry_listeners.remove(listener)
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate adapts to throttling (additive increase, multiplicative decrease)
+
+    Args:
+        rate (float): Starting requests per second
+        min_rate (float): The rate never goes below this
+        max_rate (float): The rate never goes above this
+        burst (float): Tokens that can pile up while idle
+        decrease_factor (float): Rate multiplier applied on a throttle
+        increase (float): Requests/sec added per second of throttle-free traffic at the current rate
+        cooldown (float): Seconds after a decrease during which further throttles do not decrease again
+    """
+
+    def __init__(self, rate=20.0, min_rate=0.5, max_rate=100.0, burst=20.0, decrease_factor=0.5,
+                 increase=10.0, cooldown=1.0):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.decrease_factor = decrease_factor
+        self.increase = increase
+        self.cooldown = cooldown
+        self.throttles = 0
+        self.successes = 0
+        self._rate = rate
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        """Current allowed requests per second"""
+        return self._rate
+
+    def stats(self):
+        return {'rate': self._rate, 'throttles': self.throttles, 'successes': self.successes}
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        with self._lock:
+            self._refill(time.monotonic())
+            # Reserve the token now (the balance may go negative) and wait for it outside the lock
+            self._tokens -= 1
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self._refill(now)
+                self._rate = max(self.min_rate, self._rate * self.decrease_factor)
+                self._last_decrease = now
+
+    def on_success(self):
+        with self._lock:
+            self.successes += 1
+            self._rate = min(self.max_rate, self._rate + self.increase / self._rate)
+
+
+class ThrottledClient:
+    """
+    Wraps a boto3 client (or a stand-in) so every API call is rate limited and retried
+
+    Args:
+        client: The client to wrap
+        limiter (AdaptiveRateLimiter): Limiter shared by every caller of the service
+        service_name (str): Name reported to the retry listeners
+        max_attempts (int): Attempts per call, including the first one
+        base_delay (float): Backoff before the first retry (doubles on each attempt, with full jitter)
+        max_delay (float): Longest backoff between two attempts
+    """
+
+    def __init__(self, client, limiter, service_name='iam', max_attempts=8, base_delay=0.2, max_delay=20.0):
+        self._client = client
+        self.limiter = limiter
+        self.service_name = service_name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @property
+    def wrapped_client(self):
+        return self._client
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name in _PASSTHROUGH or name.startswith('_') or not callable(attribute):
+            return attribute
+
+        meta = getattr(self._client, 'meta', None)
+        operation_name = getattr(meta, 'method_to_api_mapping', {}).get(name, name)
+
+        def call(*args, **kwargs):
+            return self._call(attribute, operation_name, args, kwargs)
+
+        call.__name__ = name
+        call.__doc__ = attribute.__doc__
+        return call
+
+    def _backoff(self, attempt):
+        time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt))))
+
+    def _call(self, operation, operation_name, args, kwargs):
+        # Imported here so importing this module does not load botocore (see aws_iam_client)
+        from botocore.exceptions import ClientError, HTTPClientError
+        from botocore.exceptions import ConnectionError as BotoConnectionError
+
+        for attempt in range(self.max_attempts):
+            last_attempt = attempt == self.max_attempts - 1
+            self.limiter.acquire()
+            try:
+                response = operation(*args, **kwargs)
+            except ClientError as e:
+                code = e.response.get('Error', {}).get('Code')
+                if code in THROTTLE_CODES:
+                    self.limiter.on_throttle()
+                    reason = 'throttle'
+                elif code in TRANSIENT_CODES:
+                    reason = 'transient'
+                else:
+                    raise
+                if last_attempt:
+                    raise
+            except (BotoConnectionError, HTTPClientError):
+                if last_attempt:
+                    raise
+                reason = 'connection'
+            else:
+                self.limiter.on_success()
+                return response
+
+            for listener in list(_retry_listeners):
+                listener(self.service_name, operation_name, reason)
+            self._backoff(attempt)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(service_name):
+    """Return the limiter shared by every client of a service (created on first use)"""
+    with _limiters_lock:
+        limiter = _limiters.get(service_name)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter()
+            _limiters[service_name] = limiter
+        return limiter
+
+
+def set_rate_limiter(service_name, limiter):
+    """Replace the limiter of a service for clients created afterwards (e.g. to start faster or slower)"""
+    with _limiters_lock:
+        _limiters[service_name] = limiter
+
+
+def throttled(client, service_name='iam', **retry_options):
+    """Wrap a client with the shared limiter of a service"""
+    return ThrottledClient(client, get_rate_limiter(service_name), service_name, **retry_options)
@@ -0,0 +1,331 @@
+### Pre-flight validation of IAM calls
+### Checks names, paths, descriptions, policy ARNs and policy documents (JSON structure, Effect / Action /
+### Principal / Resource syntax, size limits) plus the per-entity quotas a batch would exceed, all locally.
+### Bulk jobs run reject_invalid() first, so a bad item is reported up front instead of costing a throttled
+### round trip (or failing halfway through a job, after the items before it were created).
+### Usage: python aws_iam_validate.py spec.json          (spec format of aws_iam_plan)
+###        python aws_iam_validate.py --policy policy.json [--trust]
+
+import argparse
+import json
+import re
+
+# IAM limits (https://docs.aws.amazon.com/IAM/latest/UserGuide/reference_iam-quotas.html);
+# policy sizes are in characters, white space not counted
+MAX_TRUST_POLICY_CHARS = 2048
+MAX_MANAGED_POLICY_CHARS = 6144
+MAX_INLINE_CHARS = {'role': 10240, 'user': 2048, 'group': 5120}  # all inline policies of one entity
+MAX_NAME_LENGTH = {'user': 64, 'role': 64, 'group': 128, 'policy': 128, 'instance-profile': 128}
+MAX_PATH_LENGTH = 512
+MAX_DESCRIPTION_LENGTH = 1000
+# Default quotas (both can be raised through Service Quotas: raise these to match)
+MAX_MANAGED_POLICIES_PER_ENTITY = 10
+MAX_GROUPS_PER_USER = 10
+
+POLICY_VERSIONS = ('2012-10-17', '2008-10-17')
+
+_NAME = re.compile(r'^[\w+=,.@-]+$', re.ASCII)
+_PATH = re.compile(r'^/(?:[\x21-\x7e]+/)?$')
+# Action names are case-insensitive in IAM (S3:GetObject is s3:GetObject)
+_ACTION = re.compile(r'^(?:\*|[A-Za-z0-9-]+:[A-Za-z0-9*?]+)$')
+_POLICY_ARN = re.compile(r'^arn:aws(?:-cn|-us-gov)?:iam::(?:aws|\d{12}):policy/(?:[\x21-\x7e]+/)?[\w+=,.@-]+$',
+                         re.ASCII)
+_AWS_PRINCIPAL = re.compile(r'^(?:\*|\d{12}|arn:aws(?:-cn|-us-gov)?:(?:iam|sts)::\d{12}:'
+                            r'(?:root|(?:user|role|assumed-role|federated-user)/\S+))$', re.ASCII)
+_SERVICE_PRINCIPAL = re.compile(r'^[a-z0-9.-]+\.amazonaws\.com(?:\.cn)?$')
+_FEDERATED_PRINCIPAL = re.compile(r'^(?:arn:aws(?:-cn|-us-gov)?:iam::\d{12}:(?:saml-provider|oidc-provider)/\S+'
+                                  r'|[a-z0-9.-]+\.[a-z]{2,}(?:/\S*)?)$', re.ASCII)
+_PRINCIPAL_CHECKS = {'AWS': _AWS_PRINCIPAL, 'Service': _SERVICE_PRINCIPAL, 'Federated': _FEDERATED_PRINCIPAL,
+                     'CanonicalUser': re.compile(r'^[0-9a-f]{64}$')}
+
+# Entity kind and name parameter of the calls validate_change knows
+_TARGETS = {
+    'user': 'UserName', 'group': 'GroupName', 'role': 'RoleName', 'instance_profile': 'InstanceProfileName',
+}
+
+
+def _as_list(value):
+    return value if isinstance(value, list) else [value]
+
+
+def policy_size(document):
+    """Characters IAM counts for a policy document (str or dict): everything but white space"""
+    text = document if isinstance(document, str) else json.dumps(document, separators=(',', ':'),
+                                                                  ensure_ascii=False)
+    return sum(1 for c in text if not c.isspace())
+
+
+def validate_name(kind, name):
+    """Problems (list of str) with the name of a user, role, group, policy or instance-profile"""
+    limit = MAX_NAME_LENGTH[kind]
+    if not isinstance(name, str) or not name:
+        return [f"{kind} name is missing"]
+    problems = []
+    if len(name) > limit:
+        problems.append(f"{kind} name '{name[:20]}...' is longer than {limit} characters")
+    if not _NAME.fullmatch(name):
+        problems.append(f"{kind} name '{name}' may only contain letters, digits and +=,.@_-")
+    return problems
+
+
+def validate_path(path):
+    if not isinstance(path, str) or len(path) > MAX_PATH_LENGTH or not _PATH.fullmatch(path):
+        return [f"path '{path}' must be '/' or start and end with '/' (at most {MAX_PATH_LENGTH} characters)"]
+    return []
+
+
+def _validate_principal(principal):
+    if principal == '*':
+        return []
+    if not isinstance(principal, dict) or not principal:
+        return ["Principal must be '*' or an object like {\"Service\": \"ec2.amazonaws.com\"}"]
+    problems = []
+    for principal_type, values in principal.items():
+        check = _PRINCIPAL_CHECKS.get(principal_type)
+        if check is None:
+            problems.append(f"unknown principal type '{principal_type}'")
+            continue
+        for value in _as_list(values):
+            if not isinstance(value, str) or not check.fullmatch(value):
+                problems.append(f"invalid {principal_type} principal '{value}'")
+    return problems
+
+
+def _validate_statement(statement, kind, number):
+    where = f"statement {number}"
+    if not isinstance(statement, dict):
+        return [f"{where} is not an object"]
+    problems = []
+    if statement.get('Effect') not in ('Allow', 'Deny'):
+        problems.append(f"{where}: Effect must be 'Allow' or 'Deny'")
+
+    action_key = 'Action' if 'Action' in statement else 'NotAction'
+    actions = statement.get(action_key)
+    if not actions:
+        problems.append(f"{where}: Action is missing")
+    else:
+        for action in _as_list(actions):
+            if not isinstance(action, str) or not _ACTION.fullmatch(action):
+                problems.append(f"{where}: invalid action '{action}'")
+            elif kind == 'trust' and action_key == 'Action' and not action.lower().startswith(('sts:', '*')):
+                problems.append(f"{where}: a trust policy can only allow sts: actions, not '{action}'")
+
+    principal_key = 'Principal' if 'Principal' in statement else 'NotPrincipal'
+    resource_key = 'Resource' if 'Resource' in statement else 'NotResource'
+    if kind == 'trust':
+        if principal_key not in statement:
+            problems.append(f"{where}: Principal is missing")
+        else:
+            problems += [f"{where}: {p}" for p in _validate_principal(statement[principal_key])]
+    else:
+        if principal_key in statement:
+            problems.append(f"{where}: identity policies cannot have a Principal")
+        if not statement.get(resource_key):
+            problems.append(f"{where}: Resource is missing")
+        else:
+            for resource in _as_list(statement[resource_key]):
+                if not isinstance(resource, str) or (resource != '*' and not resource.startswith('arn:')):
+                    problems.append(f"{where}: resource '{resource}' must be '*' or an ARN")
+
+    condition = statement.get('Condition')
+    if condition is not None and not (isinstance(condition, dict)
+                                      and all(isinstance(c, dict) for c in condition.values())):
+        problems.append(f"{where}: Condition must map operators to {{key: value}} objects")
+    return problems
+
+
+def validate_policy_document(document, kind='identity', max_chars=None):
+    """
+    Check a policy document without calling IAM
+
+    Args:
+        document (str | dict): JSON text or parsed document
+        kind (str): 'trust' (a role's AssumeRolePolicyDocument) or 'identity' (managed or inline policy)
+        max_chars (int): Size limit (default: 2048 for trust policies, 6144 otherwise)
+
+    Returns:
+        list: Problems found, empty if the document looks valid
+    """
+    if isinstance(document, str):
+        if '{{' in document:
+            return ["document still contains a {{placeholder}}"]
+        try:
+            parsed = json.loads(document)
+        except ValueError as e:
+            return [f"document is not valid JSON ({e})"]
+    else:
+        parsed = document
+    if not isinstance(parsed, dict):
+        return ["document must be a JSON object"]
+
+    problems = []
+    if parsed.get('Version') not in POLICY_VERSIONS:
+        problems.append(f"Version must be one of {', '.join(POLICY_VERSIONS)}")
+    statements = parsed.get('Statement')
+    if not statements:
+        problems.append("Statement is missing")
+    else:
+        for number, statement in enumerate(_as_list(statements), 1):
+            problems += _validate_statement(statement, kind, number)
+
+    if max_chars is None:
+        max_chars = MAX_TRUST_POLICY_CHARS if kind == 'trust' else MAX_MANAGED_POLICY_CHARS
+    size = policy_size(document)
+    if size > max_chars:
+        problems.append(f"document is {size} characters, the limit is {max_chars}")
+    return problems
+
+
+def validate_change(change):
+    """
+    Check one call of an aws_iam_plan change list ({'action', 'params'}) on its own
+
+    Returns:
+        list: Problems found, empty if the call looks valid
+    """
+    action, params = change['action'], change['params']
+    problems = []
+    for kind, name_key in _TARGETS.items():
+        if name_key in params or action.endswith(f"_{kind}"):
+            problems += validate_name(kind.replace('_', '-'), params.get(name_key))
+    if 'PolicyName' in params:
+        problems += validate_name('policy', params['PolicyName'])
+    if 'Path' in params:
+        problems += validate_path(params['Path'])
+    if len(params.get('Description') or '') > MAX_DESCRIPTION_LENGTH:
+        problems.append(f"description is longer than {MAX_DESCRIPTION_LENGTH} characters")
+    if 'PolicyArn' in params and not _POLICY_ARN.fullmatch(str(params['PolicyArn'])):
+        problems.append(f"invalid policy ARN '{params['PolicyArn']}'")
+
+    if action == 'create_role':
+        problems += validate_policy_document(params.get('AssumeRolePolicyDocument'), 'trust')
+    elif action == 'update_assume_role_policy':
+        problems += validate_policy_document(params.get('PolicyDocument'), 'trust')
+    elif action.startswith('put_') and action.endswith('_policy'):
+        kind = action[len('put_'):-len('_policy')]
+        problems += validate_policy_document(params.get('PolicyDocument'), 'identity', MAX_INLINE_CHARS.get(kind))
+    elif action == 'create_policy':
+        problems += validate_policy_document(params.get('PolicyDocument'), 'identity')
+    return problems
+
+
+def validate_changes(changes):
+    """
+    Check a whole batch: every call on its own, plus what only shows across calls (the same entity
+    created twice, more managed policies or groups than the quota, inline policies too big together)
+
+    Only the calls of the batch are counted: policies and groups the entities already have are not.
+
+    Returns:
+        dict: change index -> list of problems, for the invalid changes only
+    """
+    problems = {}
+
+    def flag(index, problem):
+        problems.setdefault(index, []).append(problem)
+
+    created = set()
+    managed = {}
+    groups = {}
+    inline = {}
+    for index, change in enumerate(changes):
+        for problem in validate_change(change):
+            flag(index, problem)
+
+        action, params = change['action'], change['params']
+        if action == 'create_policy':
+            kind, target = 'policy', ('policy', params.get('PolicyName'))
+        else:
+            kind = next((k for k, key in _TARGETS.items() if key in params), None)
+            target = (kind, params.get(_TARGETS.get(kind, '')))
+        if kind is None:
+            # Calls that name no entity (e.g. create_policy_version) are not counted across the batch
+            continue
+        if action.startswith('create_'):
+            if target in created:
+                flag(index, f"{kind} '{target[1]}' is created twice")
+            created.add(target)
+        elif action.startswith('attach_'):
+            managed[target] = managed.get(target, 0) + 1
+            if managed[target] > MAX_MANAGED_POLICIES_PER_ENTITY:
+                flag(index, f"{kind} '{target[1]}' would have more than {MAX_MANAGED_POLICIES_PER_ENTITY} "
+                            f"managed policies")
+        elif action == 'add_user_to_group':
+            user = params.get('UserName')
+            groups[user] = groups.get(user, 0) + 1
+            if groups[user] > MAX_GROUPS_PER_USER:
+                flag(index, f"user '{user}' would be in more than {MAX_GROUPS_PER_USER} groups")
+        elif action.startswith('put_') and kind in MAX_INLINE_CHARS and 'PolicyDocument' in params:
+            inline[target] = inline.get(target, 0) + policy_size(params['PolicyDocument'])
+            if inline[target] > MAX_INLINE_CHARS[kind]:
+                flag(index, f"inline policies of {kind} '{target[1]}' would exceed {MAX_INLINE_CHARS[kind]} "
+                            f"characters")
+    return problems
+
+
+def reject_invalid(changes):
+    """
+    Drop the invalid changes of a batch, and the changes that depend on them, before anything runs
+
+    Returns:
+        tuple: (valid changes with their depends_on renumbered, rejected [{'change', 'problems'}] in plan order)
+    """
+    problems = validate_changes(changes)
+    if not problems:
+        return changes, []
+
+    dependents = [[] for _ in changes]
+    for index, change in enumerate(changes):
+        for dependency in change.get('depends_on', []):
+            dependents[dependency].append(index)
+    stack = list(problems)
+    while stack:
+        index = stack.pop()
+        for dependent in dependents[index]:
+            if dependent not in problems:
+                problems[dependent] = [f"depends on a rejected {changes[index]['action']}"]
+                stack.append(dependent)
+
+    kept = [index for index in range(len(changes)) if index not in problems]
+    renumber = {old: new for new, old in enumerate(kept)}
+    valid = [dict(changes[old], depends_on=[renumber[d] for d in changes[old].get('depends_on', [])])
+             for old in kept]
+    rejected = [{'change': changes[index], 'problems': problems[index]} for index in sorted(problems)]
+    return valid, rejected
+
+
+def print_rejected(rejected):
+    for item in rejected:
+        change = item['change']
+        names = ' '.join(str(v) for k, v in change['params'].items() if k.endswith('Name') or k == 'PolicyArn')
+        print(f"   ❌ {change['action']} {names}: {'; '.join(item['problems'])}")
+
+
+# Main program
+if __name__ == "__main__":
+    from aws_iam_journal import bulk_changes
+    from aws_iam_plan import load_spec
+
+    parser = argparse.ArgumentParser(description="Validate an IAM spec or policy document without calling AWS")
+    parser.add_argument('file', help="Spec file (aws_iam_plan format), or a policy document with --policy")
+    parser.add_argument('--policy', action='store_true', help="The file is a policy document")
+    parser.add_argument('--trust', action='store_true', help="The policy document is a trust policy")
+    args = parser.parse_args()
+
+    try:
+        if args.policy:
+            with open(args.file, encoding='utf-8') as f:
+                found = validate_policy_document(f.read(), 'trust' if args.trust else 'identity')
+            for problem in found:
+                print(f"   ❌ {problem}")
+            print("✅ Policy document is valid" if not found else f"📊 {len(found)} problems")
+            exit(1 if found else 0)
+        batch = bulk_changes(load_spec(args.file))
+    except (ValueError, OSError) as e:
+        print(f"❌ Error: {e}")
+        exit(1)
+
+    _, rejected_changes = reject_invalid(batch)
+    print_rejected(rejected_changes)
+    print(f"📊 {len(batch) - len(rejected_changes)}/{len(batch)} calls valid")
+    exit(1 if rejected_changes else 0)
@@ -4,7 +4,7 @@
 # Script: create_iam_group.sh
 # Purpose: Create a new IAM group in AWS
 # Requirements:
-#   - AWS CLI installed
+#   - Python 3 with boto3 and python-dotenv (calls go through aws_iam_daemon.py)
 #   - A .env file located ONE LEVEL ABOVE this script
 # -------------------------------------------
 
@@ -26,8 +26,11 @@ fi
 # STEP 2: Set IAM group name
 GROUP_NAME="Developers"
 
+# IAM calls go through the warm aws_iam_daemon.py (started on first use) with the credentials loaded above
+IAM_CALL="python3 $(dirname "$0")/aws_iam_daemon_client.py"
+
 echo "🔧 Creating IAM group named: $GROUP_NAME ..."
-aws iam create-group --group-name "$GROUP_NAME" --profile david_admin
+$IAM_CALL create_group GroupName="$GROUP_NAME" --query Group.Arn
 
 # STEP 3: Done
 echo "✅ Done! IAM group '$GROUP_NAME' has been created (if it didn't already exist)."
@@ -17,7 +17,10 @@ else
 fi
 
 # Use AWS_DEFAULT_REGION from env or default to us-east-2
-AWS_DEFAULT_REGION=${AWS_DEFAULT_REGION:-us-east-2}
+export AWS_DEFAULT_REGION=${AWS_DEFAULT_REGION:-us-east-2}
+
+# IAM calls go through the warm aws_iam_daemon.py (started on first use) instead of a new aws CLI process each
+IAM_CALL="python3 $(dirname "$0")/aws_iam_daemon_client.py"
 
 # User name to create (you can update this or make it a parameter)
 USER_NAME="testuser123"
@@ -28,18 +31,18 @@ echo "Region: $AWS_DEFAULT_REGION"
 echo "User to create: $USER_NAME"
 echo ""
 
-# Check if AWS CLI is installed
-if ! command -v aws &> /dev/null; then
-    echo "❌ Error: AWS CLI is not installed."
-    echo "Please install it first: https://aws.amazon.com/cli/"
+# Check if Python is installed
+if ! command -v python3 &> /dev/null; then
+    echo "❌ Error: Python 3 is not installed."
+    echo "Please install it first, then run: pip install boto3 python-dotenv"
     exit 1
 fi
 
 # Check if AWS credentials are configured
 echo "🔐 Checking AWS credentials..."
-if aws sts get-caller-identity &> /dev/null; then
+if caller_arn=$($IAM_CALL get_caller_identity --service sts --query Arn 2> /dev/null); then
     echo "✅ AWS credentials are valid"
-    aws sts get-caller-identity --query 'Arn' --output text
+    echo "$caller_arn"
     echo ""
 else
     echo "❌ Error: AWS credentials are not configured or invalid."
@@ -51,24 +54,29 @@ fi
 echo "👤 Creating user '$USER_NAME'..."
 
 # Try creating the user and capture error if any
-error_output=$(aws iam create-user --user-name "$USER_NAME" --region "$AWS_DEFAULT_REGION" 2>&1)
+output=$($IAM_CALL create_user UserName="$USER_NAME" --query User 2>&1)
 exit_code=$?
 
 if [ $exit_code -eq 0 ]; then
     echo "✅ Success! User '$USER_NAME' has been created!"
     echo ""
     echo "📋 User Details:"
-    aws iam get-user --user-name "$USER_NAME" --query 'User.[UserName,UserId,CreateDate,Arn]' --output table
+    # The create_user response already has every field: read them from its JSON instead of calling IAM again
+    for field in UserName UserId CreateDate Arn; do
+        if [[ "$output" =~ \"$field\":\ \"([^\"]*)\" ]]; then
+            echo "   - $field: ${BASH_REMATCH[1]}"
+        fi
+    done
 else
-    if [[ "$error_output" == *"EntityAlreadyExists"* ]]; then
+    if [[ "$output" == *"EntityAlreadyExists"* ]]; then
         echo "❌ Error: User '$USER_NAME' already exists!"
-    elif [[ "$error_output" == *"InvalidClientTokenId"* ]]; then
+    elif [[ "$output" == *"InvalidClientTokenId"* ]]; then
         echo "❌ Error: Your AWS credentials are invalid."
-    elif [[ "$error_output" == *"AccessDenied"* ]]; then
+    elif [[ "$output" == *"AccessDenied"* ]]; then
         echo "❌ Error: You don't have permission to create users."
     else
         echo "❌ Error: Something went wrong:"
-        echo "$error_output"
+        echo "$output"
     fi
     exit $exit_code
 fi
@@ -0,0 +1,55 @@
+### Shared fixtures of the AWS_IAM tests
+### The modules live flat in AWS_IAM and import each other by name, so that folder goes on sys.path.
+### Every test runs against the in-process FakeIAMClient: nothing here calls AWS.
+
+import os
+import sys
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_iam_fake import FakeIAMClient  # noqa: E402
+
+
+class RecordingIAM:
+    """
+    Wraps a FakeIAMClient: remembers the order calls succeeded in and fails chosen actions
+
+    Args:
+        iam (FakeIAMClient): Client the calls go to
+        failures (dict): Action -> how many of its calls fail with ServiceFailure before it works again
+    """
+
+    def __init__(self, iam, failures=None):
+        self.iam = iam
+        self.failures = dict(failures or {})
+        self.order = []
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        method = getattr(self.iam, name)
+
+        def call(**params):
+            with self._lock:
+                if self.failures.get(name):
+                    self.failures[name] -= 1
+                    raise ClientError({'Error': {'Code': 'ServiceFailure', 'Message': 'injected'}}, name)
+            response = method(**params)
+            with self._lock:
+                self.order.append(name)
+            return response
+        return call
+
+
+@pytest.fixture
+def iam():
+    return FakeIAMClient()
+
+
+@pytest.fixture
+def recording_iam():
+    """Factory: recording_iam(failures=None, **FakeIAMClient options) -> RecordingIAM"""
+    return lambda failures=None, **options: RecordingIAM(FakeIAMClient(**options), failures)
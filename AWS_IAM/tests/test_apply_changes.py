@@ -0,0 +1,71 @@
+### Dependency scheduling of plans (aws_iam_plan.apply_changes)
+
+from botocore.exceptions import EndpointConnectionError
+
+from aws_iam_fake import FakeIAMClient
+from aws_iam_plan import apply_changes
+from aws_iam_templates import service_trust_policy_json
+
+S3_READ_ONLY = 'arn:aws:iam::aws:policy/AmazonS3ReadOnlyAccess'
+
+
+def role_plan():
+    return [
+        {'action': 'create_role', 'params': {'RoleName': 'app', 'AssumeRolePolicyDocument':
+                                             service_trust_policy_json('ec2.amazonaws.com')}, 'depends_on': []},
+        {'action': 'attach_role_policy', 'params': {'RoleName': 'app', 'PolicyArn': S3_READ_ONLY}, 'depends_on': [0]},
+        {'action': 'create_group', 'params': {'GroupName': 'devs'}, 'depends_on': []},
+        {'action': 'create_user', 'params': {'UserName': 'alice'}, 'depends_on': []},
+        {'action': 'add_user_to_group', 'params': {'GroupName': 'devs', 'UserName': 'alice'}, 'depends_on': [2, 3]},
+    ]
+
+
+def test_changes_run_after_their_dependencies(recording_iam):
+    iam = recording_iam(latency=0.01, jitter=0.01)
+    results = apply_changes(role_plan(), iam=iam, max_workers=5)
+
+    assert [r['status'] for r in results] == ['done'] * 5
+    assert iam.order.index('create_role') < iam.order.index('attach_role_policy')
+    assert iam.order.index('add_user_to_group') > max(iam.order.index('create_group'), iam.order.index('create_user'))
+    assert iam.iam.role_managed_policies['app'] == {S3_READ_ONLY}
+    assert 'alice' in iam.iam.group_members['devs']
+
+
+def test_independent_changes_run_concurrently():
+    iam = FakeIAMClient(latency=0.05)
+    changes = [{'action': 'create_user', 'params': {'UserName': f"user{i}"}, 'depends_on': []} for i in range(10)]
+
+    results = apply_changes(changes, iam=iam, max_workers=10)
+
+    assert all(r['status'] == 'done' for r in results)
+    assert len(iam.users) == 10
+
+
+def test_failed_change_skips_its_dependents_only(recording_iam):
+    iam = recording_iam({'create_group': 1})
+    results = apply_changes(role_plan(), iam=iam, max_workers=5)
+
+    assert [r['status'] for r in results] == ['done', 'done', 'failed', 'done', 'skipped']
+    assert 'depends on failed' in results[4]['error']
+    assert 'add_user_to_group' not in iam.order
+
+
+def test_empty_plan():
+    assert apply_changes([], iam=FakeIAMClient()) == []
+
+
+def test_connection_error_fails_one_change_only(iam, monkeypatch):
+    create_user = iam.create_user
+
+    def flaky_create_user(UserName, **params):
+        if UserName == 'alice':
+            raise EndpointConnectionError(endpoint_url='https://iam.amazonaws.com/')
+        return create_user(UserName=UserName, **params)
+
+    monkeypatch.setattr(iam, 'create_user', flaky_create_user)
+    changes = role_plan() + [{'action': 'create_user', 'params': {'UserName': 'bob'}, 'depends_on': []}]
+    results = apply_changes(changes, iam=iam, max_workers=5)
+
+    assert [r['status'] for r in results] == ['done', 'done', 'done', 'failed', 'skipped', 'done']
+    assert results[3]['error'].startswith('EndpointConnectionError')
+    assert 'bob' in iam.users
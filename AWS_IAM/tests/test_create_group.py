@@ -0,0 +1,59 @@
+### Group membership reconcile (aws_iam_create_group)
+
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from aws_iam_create_group import reconcile_group_memberships
+
+
+def make_groups(iam):
+    for group_name in ('devs', 'ops', 'audit'):
+        iam.create_group(GroupName=group_name)
+    for user_name in ('alice', 'bob', 'carol'):
+        iam.create_user(UserName=user_name)
+    iam.add_user_to_group(GroupName='devs', UserName='carol')
+
+
+def test_reconcile_adds_and_prunes(iam):
+    make_groups(iam)
+    result = reconcile_group_memberships({'devs': ['alice', 'bob'], 'missing': ['alice']}, prune=True, iam=iam)
+
+    assert result['groups']['devs'] == {'added': ['alice', 'bob'], 'removed': ['carol'], 'unchanged': 0, 'failed': []}
+    assert result['missing_groups'] == ['missing']
+    assert iam.group_members['devs'] == {'alice', 'bob'}
+
+
+def test_unreadable_groups_fail_alone(iam, monkeypatch):
+    make_groups(iam)
+    get_group = iam.get_group
+
+    def flaky_get_group(GroupName, **params):
+        if GroupName == 'ops':
+            raise ClientError({'Error': {'Code': 'ServiceFailure', 'Message': 'injected'}}, 'GetGroup')
+        if GroupName == 'audit':
+            raise EndpointConnectionError(endpoint_url='https://iam.amazonaws.com/')
+        return get_group(GroupName=GroupName, **params)
+
+    monkeypatch.setattr(iam, 'get_group', flaky_get_group)
+    result = reconcile_group_memberships({'devs': ['alice'], 'ops': ['bob'], 'audit': ['bob']}, iam=iam)
+
+    assert list(result['groups']) == ['devs']
+    assert sorted(result['failed_groups']) == ['audit', 'ops']
+    assert result['failed_groups']['audit'].startswith('EndpointConnectionError')
+    assert 'alice' in iam.group_members['devs']
+
+
+def test_connection_error_fails_one_membership(iam, monkeypatch):
+    make_groups(iam)
+    add_user_to_group = iam.add_user_to_group
+
+    def flaky_add_user_to_group(GroupName, UserName):
+        if UserName == 'bob':
+            raise EndpointConnectionError(endpoint_url='https://iam.amazonaws.com/')
+        return add_user_to_group(GroupName=GroupName, UserName=UserName)
+
+    monkeypatch.setattr(iam, 'add_user_to_group', flaky_add_user_to_group)
+    result = reconcile_group_memberships({'devs': ['alice', 'bob', 'carol']}, iam=iam)
+
+    assert result['groups']['devs'] == {'added': ['alice'], 'removed': [], 'unchanged': 1, 'failed': ['bob']}
+    failed = [c for c in result['changes'] if c['status'] == 'failed']
+    assert failed[0]['error'].startswith('EndpointConnectionError')
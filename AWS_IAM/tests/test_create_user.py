@@ -0,0 +1,28 @@
+### Bulk user creation (aws_iam_create_user)
+
+from botocore.exceptions import EndpointConnectionError
+
+from aws_iam_create_user import USER_ALREADY_EXISTS, USER_CREATED, USER_FAILED, create_aws_users_bulk
+
+
+def test_bulk_creation_reports_every_user(iam):
+    iam.create_user(UserName='bob')
+    results = create_aws_users_bulk(['alice', 'bob', {'user_name': 'carol', 'path': '/ops/'}], iam=iam)
+
+    assert [r['status'] for r in results] == [USER_CREATED, USER_ALREADY_EXISTS, USER_CREATED]
+    assert iam.users['carol']['Path'] == '/ops/'
+
+
+def test_connection_errors_fail_one_user_only(iam, monkeypatch):
+    create_user = iam.create_user
+
+    def flaky_create_user(UserName, **params):
+        if UserName == 'bob':
+            raise EndpointConnectionError(endpoint_url='https://iam.amazonaws.com/')
+        return create_user(UserName=UserName, **params)
+
+    monkeypatch.setattr(iam, 'create_user', flaky_create_user)
+    results = create_aws_users_bulk(['alice', 'bob', 'carol'], iam=iam)
+
+    assert [r['status'] for r in results] == [USER_CREATED, USER_FAILED, USER_CREATED]
+    assert results[1]['error'].startswith('EndpointConnectionError')
@@ -0,0 +1,117 @@
+### Journal replay, resume and torn writes (aws_iam_journal)
+
+import json
+
+import pytest
+
+from aws_iam_journal import JOURNAL_DONE, JOURNAL_STARTED, JobJournal, run_job
+
+
+def user_changes(*names):
+    return [{'action': 'create_user', 'params': {'UserName': name, 'Path': '/'}, 'depends_on': []}
+            for name in names]
+
+
+def test_run_job_journals_every_call(tmp_path, iam):
+    path = str(tmp_path / 'job.journal')
+    job = run_job(path, user_changes('alice', 'bob'), iam=iam, fsync=False)
+
+    assert [r['status'] for r in job['results']] == ['done', 'done']
+    assert set(iam.users) == {'alice', 'bob'}
+    with JobJournal(path, fsync=False) as journal:
+        assert journal.job_id == job['job_id']
+        assert journal.completed() == {0, 1}
+        assert journal.summary() == {'done': 2, 'failed': 0, 'interrupted': 0, 'pending': 0}
+
+
+def test_resume_runs_only_unfinished_changes(tmp_path, iam):
+    path = str(tmp_path / 'job.journal')
+    with JobJournal(path, fsync=False) as journal:
+        journal.start_job(user_changes('alice', 'bob', 'carol'))
+        journal.record_start(0)
+        journal.record_end(0, JOURNAL_DONE)
+        journal.record_start(1)
+    # alice finished; bob was created but the run died before its outcome was journaled
+    iam.create_user(UserName='alice')
+    iam.create_user(UserName='bob')
+    calls = iam.calls
+
+    job = run_job(path, iam=iam, fsync=False)
+
+    assert job['replayed'] == 2
+    assert [r['status'] for r in job['results']] == ['done', 'done', 'done']
+    assert job['results'][0]['response'] is None
+    assert iam.calls - calls == 2
+    assert set(iam.users) == {'alice', 'bob', 'carol'}
+    with JobJournal(path, fsync=False) as journal:
+        assert journal.completed() == {0, 1, 2}
+
+
+def test_replay_tracks_interrupted_calls(tmp_path):
+    path = str(tmp_path / 'job.journal')
+    with JobJournal(path, fsync=False) as journal:
+        journal.start_job(user_changes('alice', 'bob'))
+        journal.record_start(0)
+
+    with JobJournal(path, fsync=False) as journal:
+        assert journal.status == {0: JOURNAL_STARTED}
+        assert journal.summary() == {'done': 0, 'failed': 0, 'interrupted': 1, 'pending': 1}
+
+
+def test_torn_last_line_is_cut_off(tmp_path):
+    path = str(tmp_path / 'job.journal')
+    with JobJournal(path, fsync=False) as journal:
+        journal.start_job(user_changes('alice'))
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"t":"end","i":0,"sta')
+
+    with JobJournal(path, fsync=False) as journal:
+        assert journal.status == {}
+        journal.record_start(0)
+
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [r['t'] for r in records] == ['job', 'start']
+
+
+def test_last_line_without_newline_is_torn(tmp_path):
+    path = str(tmp_path / 'job.journal')
+    with JobJournal(path, fsync=False) as journal:
+        journal.start_job(user_changes('alice'))
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"t":"end","i":0,"status":"done","error":null,"at":0}')
+
+    with JobJournal(path, fsync=False) as journal:
+        assert journal.status == {}
+        journal.record_start(0)
+
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line)['t'] for line in f] == ['job', 'start']
+
+
+def test_corrupted_line_before_the_end_is_an_error(tmp_path):
+    path = str(tmp_path / 'job.journal')
+    with JobJournal(path, fsync=False) as journal:
+        journal.start_job(user_changes('alice'))
+        journal.record_start(0)
+    with open(path, encoding='utf-8') as f:
+        lines = f.readlines()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines([lines[0][:10] + '\n', lines[1]])
+
+    with pytest.raises(ValueError, match='line 1 is corrupted'):
+        JobJournal(path, fsync=False)
+
+
+def test_journal_refuses_another_job(tmp_path):
+    path = str(tmp_path / 'job.journal')
+    with JobJournal(path, fsync=False) as journal:
+        journal.start_job(user_changes('alice'))
+        journal.start_job(user_changes('alice'))
+        with pytest.raises(ValueError, match='holds another job'):
+            journal.start_job(user_changes('bob'))
+
+
+def test_nothing_to_resume(tmp_path, iam):
+    with pytest.raises(ValueError, match='no job to resume'):
+        run_job(str(tmp_path / 'empty.journal'), iam=iam, fsync=False)
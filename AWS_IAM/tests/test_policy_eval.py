@@ -0,0 +1,55 @@
+### Offline policy evaluation (aws_iam_policy_eval)
+
+from aws_iam_policy_eval import ALLOW, EXPLICIT_DENY, IMPLICIT_DENY, PolicyEvaluator, check_policy
+
+S3_READ = {'Version': '2012-10-17', 'Statement': [
+    {'Effect': 'Allow', 'Action': ['s3:Get*', 's3:List*'], 'Resource': '*'},
+    {'Effect': 'Deny', 'Action': 's3:GetObject', 'Resource': 'arn:aws:s3:::secrets/*'},
+]}
+
+
+def test_decisions():
+    evaluator = PolicyEvaluator()
+    evaluator.add_principal('role/reader', [S3_READ])
+
+    assert evaluator.evaluate_batch([
+        ('role/reader', 's3:GetObject', 'arn:aws:s3:::data/file'),
+        ('role/reader', 's3:GetObject', 'arn:aws:s3:::secrets/key'),
+        ('role/reader', 's3:PutObject', 'arn:aws:s3:::data/file'),
+    ]) == [ALLOW, EXPLICIT_DENY, IMPLICIT_DENY]
+
+
+def test_cache_keeps_the_most_recent_decisions():
+    evaluator = PolicyEvaluator(cache_size=2)
+    evaluator.add_principal('role/reader', [S3_READ])
+
+    evaluator.evaluate('role/reader', 's3:GetObject')
+    evaluator.evaluate('role/reader', 's3:ListBucket')
+    evaluator.evaluate('role/reader', 's3:GetObject')
+    evaluator.evaluate('role/reader', 's3:PutObject')
+
+    assert list(evaluator._cache) == [('role/reader', 's3:GetObject', '*'), ('role/reader', 's3:PutObject', '*')]
+
+
+def test_new_policies_clear_the_cache():
+    evaluator = PolicyEvaluator()
+    evaluator.add_principal('role/reader', [S3_READ])
+    assert evaluator.evaluate('role/reader', 's3:PutObject') == IMPLICIT_DENY
+
+    evaluator.add_principal('role/reader', [{'Version': '2012-10-17',
+                                             'Statement': [{'Effect': 'Allow', 'Action': 's3:*', 'Resource': '*'}]}])
+    assert evaluator.evaluate('role/reader', 's3:PutObject') == ALLOW
+
+
+def test_policy_variables_stay_on_the_safe_side():
+    document = {'Version': '2012-10-17', 'Statement': [
+        {'Effect': 'Allow', 'Action': 's3:*', 'Resource': 'arn:aws:s3:::home/*'},
+        {'Effect': 'Deny', 'Action': 's3:DeleteObject', 'Resource': 'arn:aws:s3:::home/${aws:username}/*'},
+        {'Effect': 'Allow', 'Action': 's3:PutObject', 'Resource': 'arn:aws:s3:::shared/${aws:username}/*'},
+    ]}
+
+    assert check_policy(document, [
+        ('s3:DeleteObject', 'arn:aws:s3:::home/alice/x'),
+        ('s3:GetObject', 'arn:aws:s3:::home/alice/x'),
+        ('s3:PutObject', 'arn:aws:s3:::shared/alice/x'),
+    ]) == [EXPLICIT_DENY, ALLOW, IMPLICIT_DENY]
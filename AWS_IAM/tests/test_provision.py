@@ -0,0 +1,55 @@
+### EC2 role provisioning with batched readiness checks (aws_iam_provision)
+
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from aws_iam_fake import FakeIAMClient
+from aws_iam_provision import STATUS_FAILED, STATUS_READY, provision_ec2_roles
+
+S3_READ_ONLY = 'arn:aws:iam::aws:policy/AmazonS3ReadOnlyAccess'
+
+
+def test_roles_become_ready_despite_eventual_consistency():
+    iam = FakeIAMClient(visibility_delay=0.05)
+    ready = []
+    results = provision_ec2_roles(['web', 'worker'], [S3_READ_ONLY], iam=iam, timeout=5,
+                                  on_ready=lambda name, result: ready.append(name))
+
+    assert {name: r['status'] for name, r in results.items()} == {'web': STATUS_READY, 'worker': STATUS_READY}
+    assert sorted(ready) == ['web', 'worker']
+    assert iam.role_managed_policies['web'] == {S3_READ_ONLY}
+    assert all(r['role_arn'] and r['instance_profile_arn'] for r in results.values())
+
+
+def test_failing_readiness_checks_are_retried(monkeypatch):
+    iam = FakeIAMClient()
+    get_role = iam.get_role
+    errors = [ClientError({'Error': {'Code': 'Throttling', 'Message': 'slow down'}}, 'GetRole'),
+              EndpointConnectionError(endpoint_url='https://iam.amazonaws.com/')]
+
+    def flaky_get_role(RoleName):
+        if errors:
+            raise errors.pop(0)
+        return get_role(RoleName=RoleName)
+
+    monkeypatch.setattr(iam, 'get_role', flaky_get_role)
+    results = provision_ec2_roles(['web'], iam=iam, timeout=10)
+
+    assert results['web']['status'] == STATUS_READY
+    assert not errors
+
+
+def test_connection_error_fails_one_role_only(monkeypatch):
+    iam = FakeIAMClient()
+    create_role = iam.create_role
+
+    def flaky_create_role(RoleName, **params):
+        if RoleName == 'worker':
+            raise EndpointConnectionError(endpoint_url='https://iam.amazonaws.com/')
+        return create_role(RoleName=RoleName, **params)
+
+    monkeypatch.setattr(iam, 'create_role', flaky_create_role)
+    results = provision_ec2_roles(['web', 'worker'], iam=iam, timeout=5)
+
+    assert results['web']['status'] == STATUS_READY
+    assert results['worker']['status'] == STATUS_FAILED
+    assert results['worker']['error'].startswith('EndpointConnectionError')
@@ -0,0 +1,108 @@
+### Parallel role teardown and its journaled resume (aws_iam_teardown)
+
+import json
+
+from aws_iam_journal import JobJournal
+from aws_iam_teardown import discover_dependencies, plan_teardown, teardown_roles
+from aws_iam_templates import service_trust_policy_json
+
+S3_READ_ONLY = 'arn:aws:iam::aws:policy/AmazonS3ReadOnlyAccess'
+CLOUDWATCH_AGENT = 'arn:aws:iam::aws:policy/CloudWatchAgentServerPolicy'
+INLINE = json.dumps({'Version': '2012-10-17',
+                     'Statement': [{'Effect': 'Allow', 'Action': 's3:GetObject', 'Resource': '*'}]})
+
+
+def make_role(iam, name):
+    """A role IAM would refuse to delete as is: managed and inline policies and an instance profile"""
+    iam.create_role(RoleName=name, AssumeRolePolicyDocument=service_trust_policy_json('ec2.amazonaws.com'))
+    iam.attach_role_policy(RoleName=name, PolicyArn=S3_READ_ONLY)
+    iam.attach_role_policy(RoleName=name, PolicyArn=CLOUDWATCH_AGENT)
+    iam.put_role_policy(RoleName=name, PolicyName='read', PolicyDocument=INLINE)
+    iam.create_instance_profile(InstanceProfileName=name)
+    iam.add_role_to_instance_profile(InstanceProfileName=name, RoleName=name)
+
+
+def test_plan_orders_delete_role_after_its_steps(iam):
+    make_role(iam, 'web')
+    changes = plan_teardown(discover_dependencies(['web', 'gone'], iam))
+
+    delete_role = next(i for i, c in enumerate(changes) if c['action'] == 'delete_role')
+    steps = [i for i, c in enumerate(changes)
+             if c['action'] in ('detach_role_policy', 'delete_role_policy', 'remove_role_from_instance_profile')]
+    assert len(steps) == 4
+    assert sorted(changes[delete_role]['depends_on']) == steps
+    profile = next(c for c in changes if c['action'] == 'delete_instance_profile')
+    assert changes[profile['depends_on'][0]]['action'] == 'remove_role_from_instance_profile'
+
+
+def test_teardown_deletes_roles_and_dependencies(recording_iam):
+    iam = recording_iam(latency=0.005, jitter=0.005)
+    for name in ('web', 'worker', 'batch'):
+        make_role(iam.iam, name)
+
+    teardown = teardown_roles(['web', 'worker', 'batch', 'gone'], iam=iam, max_workers=8)
+
+    assert teardown['roles'] == {'web': 'deleted', 'worker': 'deleted', 'batch': 'deleted', 'gone': 'missing'}
+    assert not iam.iam.roles and not iam.iam.instance_profiles
+    assert all(r['status'] == 'done' for r in teardown['results'])
+
+
+def test_dry_run_changes_nothing(iam):
+    make_role(iam, 'web')
+    teardown = teardown_roles(['web'], dry_run=True, iam=iam)
+
+    assert teardown['roles'] == {'web': 'planned'}
+    assert teardown['results'] == []
+    assert 'web' in iam.roles
+
+
+def test_failed_step_keeps_the_role(recording_iam):
+    iam = recording_iam({'delete_role_policy': 1})
+    make_role(iam.iam, 'web')
+
+    teardown = teardown_roles(['web'], iam=iam)
+
+    assert teardown['roles'] == {'web': 'failed'}
+    assert 'delete_role' not in iam.order
+    assert 'web' in iam.iam.roles
+
+
+def test_resume_uses_the_journaled_plan(tmp_path, recording_iam):
+    path = str(tmp_path / 'teardown.journal')
+    iam = recording_iam({'delete_role': 1})
+    make_role(iam.iam, 'web')
+    make_role(iam.iam, 'worker')
+
+    with JobJournal(path, fsync=False) as journal:
+        first = teardown_roles(['web', 'worker'], iam=iam, journal=journal)
+    # Every step ran, but one delete_role failed: listing the role again would plan nothing but delete_role
+    assert sorted(first['roles'].values()) == ['deleted', 'failed']
+    planned = first['changes']
+
+    with JobJournal(path, fsync=False) as journal:
+        calls = len(iam.order)
+        resumed = teardown_roles([], iam=iam, journal=journal)
+
+    assert resumed['changes'] == planned
+    assert resumed['roles'] == {'web': 'deleted', 'worker': 'deleted'}
+    assert iam.order[calls:] == ['delete_role']
+    assert not iam.iam.roles and not iam.iam.instance_profiles
+
+
+def test_resume_after_an_interrupted_step(tmp_path, iam):
+    path = str(tmp_path / 'teardown.journal')
+    make_role(iam, 'web')
+    changes = plan_teardown(discover_dependencies(['web'], iam))
+    detach = next(i for i, c in enumerate(changes) if c['action'] == 'detach_role_policy')
+    with JobJournal(path, fsync=False) as journal:
+        journal.start_job(changes)
+        journal.record_start(detach)
+    # The call went through, but the run stopped before its outcome was journaled
+    iam.detach_role_policy(**changes[detach]['params'])
+
+    with JobJournal(path, fsync=False) as journal:
+        resumed = teardown_roles(['web'], iam=iam, journal=journal)
+
+    assert resumed['roles'] == {'web': 'deleted'}
+    assert all(r['status'] == 'done' for r in resumed['results'])
+    assert 'web' not in iam.roles
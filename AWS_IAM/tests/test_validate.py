@@ -0,0 +1,132 @@
+### Local pre-flight checks (aws_iam_validate)
+
+import json
+
+import pytest
+
+from aws_iam_templates import account_trust_policy_json, service_trust_policy_json
+from aws_iam_validate import (MAX_GROUPS_PER_USER, MAX_MANAGED_POLICIES_PER_ENTITY, reject_invalid, validate_change,
+                              validate_changes, validate_name, validate_path, validate_policy_document)
+
+READ_OBJECTS = {'Version': '2012-10-17',
+                'Statement': [{'Effect': 'Allow', 'Action': 's3:GetObject', 'Resource': 'arn:aws:s3:::bucket/*'}]}
+
+
+@pytest.mark.parametrize('name', ['alice', 'ci-deploy_role', 'a+b=c,d.e@f', 'x' * 64])
+def test_valid_names(name):
+    assert validate_name('user', name) == []
+
+
+@pytest.mark.parametrize('name', ['', None, 'has space', 'slash/name', 'alié', 'ｆｕｌｌ', 'digits٣', 'bob\n',
+                                  'x' * 65])
+def test_invalid_names(name):
+    assert validate_name('user', name)
+
+
+def test_name_limits_depend_on_kind():
+    assert validate_name('group', 'g' * 128) == []
+    assert validate_name('role', 'r' * 128)
+
+
+@pytest.mark.parametrize('path, valid', [('/', True), ('/teams/dev/', True), ('teams/', False), ('/teams', False),
+                                         ('/a b/', False), ('/' + 'p' * 511, False), ('/ok/\n', False)])
+def test_paths(path, valid):
+    assert (validate_path(path) == []) == valid
+
+
+def test_templates_are_valid_trust_policies():
+    assert validate_policy_document(service_trust_policy_json('ec2.amazonaws.com'), 'trust') == []
+    assert validate_policy_document(account_trust_policy_json('123456789012', 'external-id'), 'trust') == []
+
+
+@pytest.mark.parametrize('principal', [{'Service': 'ec2'}, {'AWS': '12345'}, {'AWS': '١٢٣٤٥٦٧٨٩٠١٢'},
+                                       {'Unknown': 'x'}, 'everyone'])
+def test_invalid_trust_principals(principal):
+    document = {'Version': '2012-10-17',
+                'Statement': [{'Effect': 'Allow', 'Principal': principal, 'Action': 'sts:AssumeRole'}]}
+    assert validate_policy_document(document, 'trust')
+
+
+def test_trust_policy_only_allows_sts_actions():
+    document = json.loads(service_trust_policy_json('ec2.amazonaws.com'))
+    document['Statement'][0]['Action'] = 's3:GetObject'
+    assert any('sts:' in p for p in validate_policy_document(document, 'trust'))
+
+
+def test_action_prefixes_are_case_insensitive():
+    document = json.loads(json.dumps(READ_OBJECTS))
+    document['Statement'][0]['Action'] = ['S3:GetObject', 'IAM:ListRoles']
+    assert validate_policy_document(document) == []
+    trust = json.loads(service_trust_policy_json('ec2.amazonaws.com'))
+    trust['Statement'][0]['Action'] = 'STS:AssumeRole'
+    assert validate_policy_document(trust, 'trust') == []
+
+
+def test_identity_policies():
+    assert validate_policy_document(READ_OBJECTS) == []
+    assert validate_policy_document(json.dumps(READ_OBJECTS)) == []
+    assert validate_policy_document('{"Version": "2012-10-17", "Statement": [{{placeholder}}]}')
+    assert validate_policy_document('not json')
+    assert validate_policy_document({'Version': '2012-10-17', 'Statement': [{'Effect': 'Allow', 'Action': 's3:*'}]})
+    with_principal = json.loads(json.dumps(READ_OBJECTS))
+    with_principal['Statement'][0]['Principal'] = '*'
+    assert validate_policy_document(with_principal)
+
+
+def test_policy_size_limit():
+    statement = {'Effect': 'Allow', 'Action': 's3:GetObject', 'Resource': 'arn:aws:s3:::' + 'b' * 6200}
+    problems = validate_policy_document({'Version': '2012-10-17', 'Statement': [statement]})
+    assert any('limit is 6144' in p for p in problems)
+
+
+def test_validate_change_checks_arns_and_documents():
+    assert validate_change({'action': 'attach_role_policy',
+                            'params': {'RoleName': 'app', 'PolicyArn': 'arn:aws:iam::aws:policy/ReadOnlyAccess'}}) == []
+    assert validate_change({'action': 'attach_role_policy',
+                            'params': {'RoleName': 'app', 'PolicyArn': 'arn:aws:iam::aws:policy/Réad'}})
+    assert validate_change({'action': 'create_role',
+                            'params': {'RoleName': 'app', 'AssumeRolePolicyDocument': json.dumps(READ_OBJECTS)}})
+
+
+def create_policy(name):
+    return {'action': 'create_policy', 'params': {'PolicyName': name, 'PolicyDocument': json.dumps(READ_OBJECTS)},
+            'depends_on': []}
+
+
+def test_different_policies_are_not_duplicates():
+    assert validate_changes([create_policy('read'), create_policy('write')]) == {}
+
+
+def test_duplicate_creations():
+    changes = [create_policy('read'), create_policy('read'),
+               {'action': 'create_user', 'params': {'UserName': 'alice'}},
+               {'action': 'create_user', 'params': {'UserName': 'alice'}}]
+    assert sorted(validate_changes(changes)) == [1, 3]
+
+
+def test_quotas_across_the_batch():
+    attach = [{'action': 'attach_role_policy', 'params': {'RoleName': 'app',
+                                                          'PolicyArn': f"arn:aws:iam::aws:policy/Policy{i}"}}
+              for i in range(MAX_MANAGED_POLICIES_PER_ENTITY + 1)]
+    assert list(validate_changes(attach)) == [MAX_MANAGED_POLICIES_PER_ENTITY]
+
+    join = [{'action': 'add_user_to_group', 'params': {'GroupName': f"group{i}", 'UserName': 'alice'}}
+            for i in range(MAX_GROUPS_PER_USER + 1)]
+    assert list(validate_changes(join)) == [MAX_GROUPS_PER_USER]
+
+
+def test_reject_invalid_drops_dependents_and_renumbers():
+    changes = [
+        {'action': 'create_user', 'params': {'UserName': 'alice', 'Path': 'no-slashes'}, 'depends_on': []},
+        {'action': 'create_group', 'params': {'GroupName': 'devs'}, 'depends_on': []},
+        {'action': 'add_user_to_group', 'params': {'GroupName': 'devs', 'UserName': 'alice'}, 'depends_on': [0, 1]},
+        {'action': 'attach_group_policy', 'params': {'GroupName': 'devs',
+                                                     'PolicyArn': 'arn:aws:iam::aws:policy/ReadOnlyAccess'},
+         'depends_on': [1]},
+    ]
+    valid, rejected = reject_invalid(changes)
+
+    assert [c['action'] for c in valid] == ['create_group', 'attach_group_policy']
+    assert valid[1]['depends_on'] == [0]
+    assert [r['change']['action'] for r in rejected] == ['create_user', 'add_user_to_group']
+    assert rejected[1]['problems'] == ['depends on a rejected create_user']
@@ -1,12 +1,103 @@
-import boto3
+import argparse
+import contextlib
 import json
-from botocore.exceptions import ClientError
+import os
+import shlex
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# The shared client factory lives next to the IAM scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'AWS_IAM'))
+
+from aws_iam_client import get_credentials, get_iam_client, prewarm
+from aws_iam_inventory import open_inventory
+from aws_iam_templates import service_trust_policy_json
+from aws_iam_throttle import THROTTLE_CODES
+from aws_iam_validate import validate_change
+
+# Status values written by the session mode
+STATUS_CREATED = 'created'
+STATUS_ALREADY_EXISTS = 'already-exists'
+STATUS_FAILED = 'failed'
+STATUS_INVALID = 'invalid'
+
+# Session command -> (entity kind, IAM method, name parameter, usage)
+SESSION_COMMANDS = {
+    'create-user': ('user', 'create_user', 'UserName', 'create-user <name> [path]'),
+    'create-group': ('group', 'create_group', 'GroupName', 'create-group <name> [path]'),
+    'create-role': ('role', 'create_role', 'RoleName', 'create-role <name> <service principal> [path]'),
+}
+
+
+def open_console_inventory(access_key_id, secret_access_key, aws_region):
+    """Open the local inventory; if it cannot be opened, the context yields None and IAM is asked directly"""
+    try:
+        return open_inventory(access_key_id, secret_access_key, aws_region)
+    except (sqlite3.Error, OSError):
+        return contextlib.nullcontext()
+
+
+def cached_exists(inventory, kind, name):
+    """
+    Ask the local inventory whether an entity exists
+
+    Only a fresh listing answers: listing a whole kind again costs more than one create call, whose
+    EntityAlreadyExists tells just as well. Any inventory error counts as a cache miss.
+
+    Returns:
+        True or False, or None when the inventory cannot answer (the create call then tells)
+    """
+    if inventory is None:
+        return None
+    try:
+        return inventory.exists(kind, name)
+    except (sqlite3.Error, OSError):
+        return None
+
+
+def refresh_inventory(inventory, kinds=('user', 'group', 'role')):
+    """List again the kinds whose cached listing is stale; on errors the listing stays stale (a cache miss)"""
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    if inventory is None:
+        return
+    for kind in kinds:
+        try:
+            inventory.refresh((kind,))
+        except (sqlite3.Error, OSError, ClientError, BotoCoreError):
+            pass
+
+
+def record_created(inventory, kind, response):
+    """Add a created entity to the local inventory; a failing inventory never fails the command"""
+    if inventory is None:
+        return
+    try:
+        inventory.record_response(kind, response)
+    except (sqlite3.Error, OSError):
+        inventory_invalidate(inventory, kind)
+
+
+def inventory_invalidate(inventory, kind):
+    """Mark the cached listing of `kind` as stale, ignoring inventory errors"""
+    if inventory is None:
+        return
+    try:
+        inventory.invalidate(kind)
+    except (sqlite3.Error, OSError):
+        pass
 
 
 def aim_operation_console():
+    # Load the AWS SDK in the background while the user reads the menu and types
+    prewarm()
     print("Welcome To The Console From AIM Service in AWS what do you want to do Today? Select:"
           "\n1. To Create a New User \n2. To Create a New Group \n3. To Create a New Role")
     response = int(input())
+    from botocore.exceptions import ClientError
+
     if response == 1:
         new_user = input("Please enter the name of the new User: ").title()
         access_key_id = input("Enter your AWS Access Key Id: ")
@@ -18,16 +109,18 @@ def aim_operation_console():
             return None
 
         try:
-            # Connect to AWS
-            iam = boto3.client(
-                'iam',
-                aws_access_key_id=access_key_id,
-                aws_secret_access_key=secret_access_key,
-                region_name=aws_region
-            )
+            # Connect to AWS (clients are shared per access key and region)
+            iam = get_iam_client(access_key_id, secret_access_key, aws_region)
+
+            # A fresh local inventory answers "already exists" without a create call
+            with open_console_inventory(access_key_id, secret_access_key, aws_region) as inventory:
+                if cached_exists(inventory, 'user', new_user):
+                    print(f"❌ Error: User '{new_user}' already exists!")
+                    return None
 
-            # Create the user
-            response = iam.create_user(UserName=new_user)
+                # Create the user
+                response = iam.create_user(UserName=new_user)
+                record_created(inventory, 'user', response)
 
             # Success message
             print(f"✅ Success! User '{new_user}' has been created!")
@@ -46,6 +139,10 @@ def aim_operation_console():
                 print("❌ Error: Your AWS credentials are invalid. Check your .env file.")
             elif error_code == 'AccessDenied':
                 print("❌ Error: You don't have permission to create users.")
+            elif error_code in THROTTLE_CODES:
+                print("❌ Error: AWS is still throttling requests after several retries. Try again later.")
+            elif error_code == 'LimitExceeded':
+                print("❌ Error: Your account reached its IAM users quota.")
             else:
                 print(f"❌ Error: Something went wrong - {error}")
     elif response == 2:
@@ -63,17 +160,18 @@ def aim_operation_console():
             return None
 
         try:
-            # Connect to AWS
-            iam = boto3.client(
-                'iam',
-                aws_access_key_id=access_key_id,
-                aws_secret_access_key=secret_access_key,
-                region_name=aws_region
-            )
-
-            response = iam.create_group(
-                GroupName=new_group
-            )
+            # Connect to AWS (clients are shared per access key and region)
+            iam = get_iam_client(access_key_id, secret_access_key, aws_region)
+
+            with open_console_inventory(access_key_id, secret_access_key, aws_region) as inventory:
+                if cached_exists(inventory, 'group', new_group):
+                    print(f"Group '{new_group}' already exists")
+                    return None
+
+                response = iam.create_group(
+                    GroupName=new_group
+                )
+                record_created(inventory, 'group', response)
 
             print(f"✓ Group '{new_group}' created successfully")
             print(f"Group ARN: {response['Group']['Arn']}")
@@ -87,6 +185,10 @@ def aim_operation_console():
                 print(f"Invalid credentials. Check your AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY")
             elif error_code == 'AccessDenied':
                 print(f"Access denied. Check your IAM permissions")
+            elif error_code in THROTTLE_CODES:
+                print("IAM is still throttling requests after several retries. Try again later")
+            elif error_code == 'LimitExceeded':
+                print("Your account reached its IAM groups quota")
             else:
                 print(f"Error creating group: {e}")
             return None
@@ -100,40 +202,34 @@ def aim_operation_console():
         aws_region = input("Choose The region where the new Role will be created: ")
         service_principal = input("Insert service prinicipal")
 
-        # Define trust policy
-        trust_policy = {
-            "Version": "2012-10-17",
-            "Statement": [
-                {
-                    "Effect": "Allow",
-                    "Principal": {
-                        "Service": service_principal
-                    },
-                    "Action": "sts:AssumeRole"
-                }
-            ]
-        }
+        # Define trust policy (pre-serialized template)
+        trust_policy = service_trust_policy_json(service_principal)
         if not access_key_id or not secret_access_key:
             print("❌ Error: Please make sure AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY are inserted")
             return None
 
         try:
-            # Connect to AWS
-            iam = boto3.client(
-                'iam',
-                aws_access_key_id=access_key_id,
-                aws_secret_access_key=secret_access_key,
-                region_name=aws_region
-            )
+            # Connect to AWS (clients are shared per access key and region)
+            iam = get_iam_client(access_key_id, secret_access_key, aws_region)
 
             # Create role parameters
             params = {
                 'RoleName': new_role,
-                'AssumeRolePolicyDocument': json.dumps(trust_policy)
+                'AssumeRolePolicyDocument': trust_policy
             }
+            problems = validate_change({'action': 'create_role', 'params': params})
+            if problems:
+                print(f"❌ Invalid role: {'; '.join(problems)}")
+                return None
+
+            with open_console_inventory(access_key_id, secret_access_key, aws_region) as inventory:
+                if cached_exists(inventory, 'role', new_role):
+                    print(f"❌ Role '{new_role}' already exists")
+                    return None
 
-            # Create the role
-            response = iam.create_role(**params)
+                # Create the role
+                response = iam.create_role(**params)
+                record_created(inventory, 'role', response)
 
             print(f"✅ Role '{new_role}' created successfully!")
             print(f"ARN: {response['Role']['Arn']}")
@@ -141,11 +237,190 @@ def aim_operation_console():
             return response
 
         except ClientError as e:
-            print(f"❌ Error creating role: {e}")
+            error_code = e.response['Error']['Code']
+            if error_code in THROTTLE_CODES:
+                print("❌ IAM is still throttling requests after several retries. Try again later")
+            elif error_code == 'LimitExceeded':
+                print("❌ Your account reached its IAM roles quota")
+            else:
+                print(f"❌ Error creating role: {e}")
             return None
 
     return None
 
 
+def parse_command(line):
+    """Split a session line into (command, args); returns None for blank lines and # comments"""
+    words = shlex.split(line, comments=True)
+    if not words:
+        return None
+    return words[0].lower(), words[1:]
+
+
+def run_command(iam, inventory, command, args):
+    """
+    Run one session command
+
+    Returns:
+        dict: {'command', 'name', 'status', 'arn', 'error'}
+    """
+    from botocore.exceptions import ClientError
+
+    result = {'command': command, 'name': args[0] if args else None, 'status': STATUS_INVALID,
+              'arn': None, 'error': None}
+    if command not in SESSION_COMMANDS:
+        result['error'] = f"Unknown command, use one of: {', '.join(SESSION_COMMANDS)}"
+        return result
+
+    kind, method, name_param, usage = SESSION_COMMANDS[command]
+    min_args, max_args = (2, 3) if kind == 'role' else (1, 2)
+    if not min_args <= len(args) <= max_args:
+        result['error'] = f"Usage: {usage}"
+        return result
+
+    params = {name_param: args[0], 'Path': args[min_args] if len(args) > min_args else '/'}
+    if kind == 'role':
+        params['AssumeRolePolicyDocument'] = service_trust_policy_json(args[1])
+
+    # Bad names, paths or principals are reported without spending an IAM call
+    problems = validate_change({'action': method, 'params': params})
+    if problems:
+        result['error'] = '; '.join(problems)
+        return result
+
+    if cached_exists(inventory, kind, args[0]):
+        try:
+            result['arn'] = (inventory.get(kind, args[0]) or {}).get('arn')
+        except (sqlite3.Error, OSError):
+            pass
+        result['status'] = STATUS_ALREADY_EXISTS
+        return result
+
+    try:
+        response = getattr(iam, method)(**params)
+        record_created(inventory, kind, response)
+        result['status'] = STATUS_CREATED
+        result['arn'] = response[kind.title()]['Arn']
+    except ClientError as e:
+        error_code = e.response['Error']['Code']
+        if error_code == 'EntityAlreadyExists':
+            result['status'] = STATUS_ALREADY_EXISTS
+            inventory_invalidate(inventory, kind)
+        else:
+            result['status'] = STATUS_FAILED
+            result['error'] = f"{error_code}: {e.response['Error'].get('Message', '')}"
+    except Exception as e:
+        result['status'] = STATUS_FAILED
+        result['error'] = str(e)
+    return result
+
+
+def run_session(lines, iam, inventory=None, max_workers=10, output=sys.stdout):
+    """
+    Run a stream of session commands with one client and inventory
+
+    Commands are started as soon as their line is read. Commands on different entities run
+    concurrently; commands on the same entity run in the order they were given. One JSON line
+    per command is written to `output` as soon as it finishes (use 'line' to match them up).
+    A stale inventory listing is refreshed once, when the first command creating that kind runs, so
+    the rest of a long batch is checked locally.
+
+    Args:
+        lines (iterable): Command lines, e.g. an open batch file or sys.stdin
+        iam: IAM client shared by every command
+        inventory (IAMInventory): Optional local cache checked before calling IAM
+        max_workers (int): Maximum number of commands in flight
+        output: File the result lines are written to
+
+    Returns:
+        list: The result dicts, in input order
+    """
+    write_lock = threading.Lock()
+    previous = {}
+    refresh_locks = {kind: threading.Lock() for kind, _, _, _ in SESSION_COMMANDS.values()}
+    refreshed = set()
+
+    def ensure_listed(command):
+        kind = SESSION_COMMANDS[command][0]
+        with refresh_locks[kind]:
+            if kind not in refreshed:
+                refresh_inventory(inventory, (kind,))
+                refreshed.add(kind)
+
+    def run(line_number, command, args, earlier, parse_error=None):
+        # Only commands on the same entity wait for each other; they were submitted first, so they are running
+        if earlier is not None:
+            wait([earlier])
+        if parse_error:
+            outcome = {'command': command, 'name': None, 'status': STATUS_INVALID, 'arn': None, 'error': parse_error}
+        else:
+            if inventory is not None and command in SESSION_COMMANDS:
+                ensure_listed(command)
+            outcome = run_command(iam, inventory, command, args)
+        result = {'line': line_number, **outcome}
+        with write_lock:
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+        return result
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for line_number, line in enumerate(lines, 1):
+            parse_error = None
+            try:
+                parsed = parse_command(line)
+            except ValueError as e:
+                parsed, parse_error = (line.strip(), []), str(e)
+            if parsed is None:
+                continue
+            command, args = parsed
+            key = (SESSION_COMMANDS.get(command, (command,))[0], args[0] if args else None)
+            future = executor.submit(run, line_number, command, args, previous.get(key), parse_error)
+            previous[key] = future
+            futures.append(future)
+
+    return [future.result() for future in futures]
+
+
+def session_mode(argv=None):
+    """
+    Long-lived, scriptable mode: read commands from a batch file or stdin, one per line
+
+        create-user alice
+        create-group Developers /teams/
+        create-role AppRole ec2.amazonaws.com
+
+    The credentials come from the .env file (or the environment) and are used for the whole session.
+
+    Returns:
+        int: Exit code, 1 if any command failed or was invalid
+    """
+    parser = argparse.ArgumentParser(prog='command_controller.py --session',
+                                     description="Run IAM console commands from a batch file or stdin")
+    parser.add_argument('batch_file', nargs='?', help="File with one command per line (default: stdin)")
+    parser.add_argument('--region', help="Region (default: AWS_DEFAULT_REGION from .env)")
+    parser.add_argument('--workers', type=int, default=10, help="Commands run concurrently")
+    args = parser.parse_args(argv)
+
+    access_key_id, secret_access_key, aws_region = get_credentials()
+    if not access_key_id or not secret_access_key:
+        print("❌ Error: Please make sure AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY are in your .env file",
+              file=sys.stderr)
+        return 1
+    aws_region = args.region or aws_region
+
+    iam = get_iam_client(access_key_id, secret_access_key, aws_region)
+    with open_console_inventory(access_key_id, secret_access_key, aws_region) as inventory:
+        if args.batch_file:
+            with open(args.batch_file) as f:
+                results = run_session(f, iam, inventory, args.workers)
+        else:
+            results = run_session(sys.stdin, iam, inventory, args.workers)
+
+    return 1 if any(r['status'] in (STATUS_FAILED, STATUS_INVALID) for r in results) else 0
+
+
 if __name__ == "__main__":
+    if sys.argv[1:2] == ['--session']:
+        sys.exit(session_mode(sys.argv[2:]))
     aim_operation_console()